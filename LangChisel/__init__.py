@@ -1,4 +1,6 @@
 from .compile import *
+from .instrument import *
 from .interpret import *
 from .lex import *
+from .parallel import *
 from .parse import *
\ No newline at end of file
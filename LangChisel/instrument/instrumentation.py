@@ -0,0 +1,284 @@
+import importlib
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Callable
+
+from LangChisel.parse import CFGrammar, CFProduction, CFSymbol
+from LangChisel.parse.syntax_tree_traversal import iter_preorder
+
+
+class StageStats:
+    def __init__(self) -> None:
+        """What was recorded of one stage of the pipeline (one instrumented function), over all its calls"""
+        self.calls = 0
+        self.seconds = 0.0  # wall time, in total
+        self.tokens = 0  # the number of tokens (or lexemes) the stage produced or consumed, in total
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def __repr__(self) -> str:
+        return f"(StageStats: {self.calls} calls, {self.seconds:.6f}s, {self.tokens} tokens, {self.tokens_per_second:.0f} tokens/s)"
+
+
+class PipelineStats:
+    def __init__(self) -> None:
+        """The counters recorded while the pipeline is instrumented (see Instrumentation)"""
+        self.stages: dict[str, StageStats] = {}  # the name of each instrumented function that was called -> its stats
+        # each scan for a lexeme runs every pattern of its lexer at once (in one automaton), so it is an attempt of each of them
+        self.attempts_by_pattern: Counter[re.Pattern] = Counter()
+        # the number of scans each pattern won (the longest match, or the earliest pattern of those tied), by the pattern itself, so
+        # patterns sharing a tag are told apart (a StreamLexer scans a lexeme again if it could have gone on into the next chunk)
+        self.matches_by_pattern: Counter[re.Pattern] = Counter()
+        self.expansions: Counter[CFProduction] = Counter()  # the number of times each production was expanded by a parse
+        self.max_stack_depth = 0  # the most symbols on the parse stack at once, over every parse
+        # (stage name, start, duration, thread, arguments shown in a trace) of each call, with times in seconds from time.perf_counter
+        self.events: list[tuple[str, float, float, int, dict]] = []
+
+    def record(self, name: str, start: float, duration: float, tokens: int) -> None:
+        """adds a call of the stage name that started at start (from time.perf_counter) and took duration seconds, over tokens tokens"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        stage.calls += 1
+        stage.seconds += duration
+        stage.tokens += tokens
+        self.events.append((name, start, duration, threading.get_ident(), {"tokens": tokens}))
+
+    def chrome_trace(self) -> dict:
+        """the calls recorded, as a Chrome trace-event document (viewable in chrome://tracing or Perfetto)"""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "cat": "LangChisel",
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": thread,
+                    "args": args,
+                }
+                for name, start, duration, thread, args in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_chrome_trace(self, path: str | os.PathLike) -> None:
+        """writes the calls recorded to path as a Chrome trace-event JSON file"""
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+    def __repr__(self) -> str:
+        lines = [f"(PipelineStats: max stack depth {self.max_stack_depth})"]
+        lines.extend(f"    {name}: {stage}" for name, stage in self.stages.items())
+        return "\n".join(lines)
+
+
+def _count_none(arguments: dict, result: object) -> int:
+    return 0
+
+
+def _count_result(arguments: dict, result: object) -> int:
+    return len(result)
+
+
+def _count_tokens(arguments: dict, result: object) -> int:
+    return len(arguments["tokens"])
+
+
+def _timed(name: str, tokens_of: Callable[[dict, object], int]) -> Callable[[Callable, PipelineStats], Callable]:
+    """a factory of variants of a function that record each call as the stage name, counting tokens_of(arguments, result) tokens, where
+    arguments maps the function's parameter names to the arguments of the call (however they were passed)"""
+
+    def variant_of(function: Callable, stats: PipelineStats) -> Callable:
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def variant(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            duration = time.perf_counter() - start
+            stats.record(name, start, duration, tokens_of(signature.bind(*args, **kwargs).arguments, result))
+            return result
+
+        return variant
+
+    return variant_of
+
+
+def _scan_variant(function: Callable, stats: PipelineStats) -> Callable:
+    """a variant of CompiledLexer._scan or _scan_bytes (that every way of lexing in this process goes through) counting attempts and
+    matches by pattern"""
+
+    @wraps(function)
+    def scan(self, string, pos, end):
+        result = function(self, string, pos, end)
+        stats.attempts_by_pattern.update(self.patterns)
+        if result[0] >= 0:
+            stats.matches_by_pattern[self.patterns[result[1]]] += 1
+        return result
+
+    return scan
+
+
+def _replay_stack_depth(derivation: list[CFProduction], grammar: CFGrammar) -> int:
+    """the deepest the parse stack gets in a left-most derivation, replaying it one production at a time"""
+    non_terminals = {production.from_symbol for production in grammar.productions}
+    stack: list[CFSymbol] = [grammar.end_of_string, grammar.start_symbol]
+    deepest = len(stack)
+    for production in derivation:
+        while stack[-1] not in non_terminals:
+            stack.pop()  # matched terminals (and epsilon)
+        stack.pop()
+        stack.extend(reversed(production.to_sequence))
+        deepest = max(deepest, len(stack))
+    return deepest
+
+
+def _tree_derivation(root, grammar: CFGrammar) -> list[CFProduction]:
+    """the left-most derivation a syntax tree (SyntaxNode or SyntaxTreeNode) was parsed by: the production of each node with children,
+    in preorder"""
+    by_sides = {(production.from_symbol, tuple(production.to_sequence)): production for production in grammar.productions}
+    return [
+        by_sides[node.symbol, tuple(child.symbol for child in children)]
+        for node in iter_preorder(root)
+        if (children := node.children)
+    ]
+
+
+def _count_derivation(stats: PipelineStats, derivation: list[CFProduction], grammar: CFGrammar) -> None:
+    stats.expansions.update(derivation)
+    stats.max_stack_depth = max(stats.max_stack_depth, _replay_stack_depth(derivation, grammar))
+
+
+def _derivation_variant(function: Callable, stats: PipelineStats) -> Callable:
+    timed = _timed("get_LL1_derivation_seq", _count_tokens)(function, stats)
+
+    @wraps(function)
+    def get_LL1_derivation_seq(tokens, grammar, parse_table, line_index=None):
+        derivation = timed(tokens, grammar, parse_table, line_index)
+        # the parse itself runs as it always does, and the counters are worked out from its result (the same for either driver)
+        _count_derivation(stats, derivation, grammar)
+        return derivation
+
+    return get_LL1_derivation_seq
+
+
+def _tree_variant(name: str) -> Callable[[Callable, PipelineStats], Callable]:
+    """a factory of variants of a single pass tree builder, working the counters out from the tree as from a derivation"""
+
+    def variant_of(function: Callable, stats: PipelineStats) -> Callable:
+        timed = _timed(name, _count_tokens)(function, stats)
+
+        @wraps(function)
+        def parse_tree(tokens, grammar, parse_table, line_index=None):
+            tree = timed(tokens, grammar, parse_table, line_index)
+            _count_derivation(stats, _tree_derivation(getattr(tree, "root", tree), grammar), grammar)
+            return tree
+
+        return parse_tree
+
+    return variant_of
+
+
+# (module, function or Class.method, factory of its instrumented variant)
+_INSTRUMENTED: list[tuple[str, str, Callable[[Callable, PipelineStats], Callable]]] = [
+    ("LangChisel.lex.compiled_lexer", "CompiledLexer._scan", _scan_variant),
+    ("LangChisel.lex.compiled_lexer", "CompiledLexer._scan_bytes", _scan_variant),
+    ("LangChisel.lex.greedy_backtrack_lexer", "find_lexemes", _timed("find_lexemes", _count_result)),
+    ("LangChisel.lex.greedy_backtrack_lexer", "construct_tokens", _timed("construct_tokens", _count_result)),
+    ("LangChisel.parse.ll1_parser", "extract_LL1_first_sets", _timed("extract_LL1_first_sets", _count_none)),
+    ("LangChisel.parse.ll1_parser", "extract_LL1_follow_sets", _timed("extract_LL1_follow_sets", _count_none)),
+    ("LangChisel.parse.ll1_parser", "build_LL1_table", _timed("build_LL1_table", _count_none)),
+    ("LangChisel.parse.ll1_parser", "get_LL1_derivation_seq", _derivation_variant),
+    ("LangChisel.parse.ll1_parser", "generate_syntax_tree_symbols", _timed("generate_syntax_tree_symbols", _count_none)),
+    ("LangChisel.parse.ll1_parser", "tokenise_syntax_tree_terminals", _timed("tokenise_syntax_tree_terminals", _count_tokens)),
+    ("LangChisel.parse.syntax_tree_builder", "parse_syntax_tree", _tree_variant("parse_syntax_tree")),
+    ("LangChisel.parse.syntax_tree_builder", "parse_compact_syntax_tree", _tree_variant("parse_compact_syntax_tree")),
+    ("LangChisel.lex.token_buffer", "TokenBuffer.from_source", _timed("TokenBuffer.from_source", _count_result)),
+    ("LangChisel.parallel.split_lexer", "lex_parallel", _timed("lex_parallel", _count_result)),
+]
+
+_lock = threading.Lock()
+_active: list["Instrumentation"] = []
+
+
+class Instrumentation:
+    def __init__(self, stats: PipelineStats | None = None) -> None:
+        """Instruments the lexing and parsing pipeline while enabled (or entered, as a context manager, giving the stats)
+
+        Each of find_lexemes, construct_tokens, TokenBuffer.from_source, lex_parallel, the LL(1) analysis functions,
+        get_LL1_derivation_seq and the tree building functions is swapped for a variant that records its calls, in its own module and in
+        every LangChisel module that binds it (e.g. a package re-exporting it), and swapped back on exit. So are the scans of
+        CompiledLexer, which count attempts and matches by pattern for every way of lexing in this process (lexing done in worker
+        processes, e.g. the chunks of lex_parallel, is timed as a whole but not counted). The functions themselves never check whether
+        they are instrumented, so when disabled there is nothing to pay.
+
+        Only LangChisel's own modules are rewritten: a name bound outside of them (e.g. by "from LangChisel.lex import find_lexemes" in
+        your own module), or in a local variable, a default argument or an attribute of an object, keeps the uninstrumented function.
+        Call through the package (LangChisel.lex.find_lexemes) to have such calls recorded.
+
+        Args:
+            stats (PipelineStats | None): the stats to add to, e.g. to keep counting across several instrumented runs (new stats if None)
+        """
+        self.stats = stats if stats is not None else PipelineStats()
+        self._swapped: list[tuple[object, str, object]] = []  # (module or class, name, original) of each swap made
+
+    def __enter__(self) -> PipelineStats:
+        self.enable()
+        return self.stats
+
+    def __exit__(self, *exc_info) -> None:
+        self.disable()
+
+    def enable(self) -> None:
+        """swaps the instrumented variants in (only one Instrumentation can be enabled at a time)"""
+        with _lock:
+            if _active:
+                raise RuntimeError("The pipeline is already instrumented")
+            _active.append(self)
+            variants = {}
+            for module_name, path, factory in _INSTRUMENTED:
+                module = importlib.import_module(module_name)
+                if "." in path:
+                    # a method, which only its class binds
+                    class_name, name = path.split(".")
+                    owner = getattr(module, class_name)
+                    original = owner.__dict__[name]
+                    if isinstance(original, classmethod):
+                        variant = classmethod(factory(original.__func__, self.stats))
+                    else:
+                        variant = factory(original, self.stats)
+                    setattr(owner, name, variant)
+                    self._swapped.append((owner, name, original))
+                else:
+                    original = getattr(module, path)
+                    variants[id(original)] = (original, factory(original, self.stats))
+            for module_name, module in list(sys.modules.items()):
+                if module_name != "LangChisel" and not module_name.startswith("LangChisel."):
+                    continue
+                for name, value in list(vars(module).items()):
+                    swap = variants.get(id(value))
+                    if swap is not None and swap[0] is value:
+                        setattr(module, name, swap[1])
+                        self._swapped.append((module, name, value))
+
+    def disable(self) -> None:
+        """swaps the originals back"""
+        with _lock:
+            if self not in _active:
+                return
+            for owner, name, original in reversed(self._swapped):
+                setattr(owner, name, original)
+            self._swapped.clear()
+            _active.remove(self)
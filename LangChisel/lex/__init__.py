@@ -1,2 +1,8 @@
+from .compiled_lexer import *
 from .greedy_backtrack_lexer import *
-from .token import *
\ No newline at end of file
+from .incremental_lexer import *
+from .mapped_lexer import *
+from .source_position import *
+from .streaming_lexer import *
+from .token import *
+from .token_buffer import *
\ No newline at end of file
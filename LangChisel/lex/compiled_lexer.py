@@ -0,0 +1,371 @@
+import re
+from typing import Iterator
+
+try:
+    from re import _compiler as _sre_compile
+    from re import _constants as _sre_constants
+    from re import _parser as _sre_parse
+except ImportError:  # python < 3.11
+    import sre_compile as _sre_compile
+    import sre_constants as _sre_constants
+    import sre_parse as _sre_parse
+
+from .token import *
+
+
+# parse tree opcodes that consume exactly one character
+_CHAR_OPS = {
+    _sre_constants.LITERAL,
+    _sre_constants.NOT_LITERAL,
+    _sre_constants.ANY,
+    _sre_constants.IN,
+    _sre_constants.CATEGORY,
+}
+_REPEAT_OPS = {_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT}
+
+
+class _UnsupportedPattern(Exception):
+    """raised when a pattern uses a construct (anchors, lookarounds, backreferences...) the DFA cannot express"""
+
+
+class _NFA:
+    def __init__(self) -> None:
+        """A Thompson NFA over every pattern of a lexer, where each accepting state remembers the index of its pattern"""
+        self.char_edges: list[list[tuple[int, int]]] = []  # state -> [(charset index, target state)]
+        self.epsilon_edges: list[list[int]] = []  # state -> [target state]
+        self.accepts: list[int] = []  # state -> pattern index, or -1 if not accepting
+        self.charsets: list[re.Pattern] = []  # single character patterns used to test an edge
+        self._charset_ids: dict[tuple[int, str], int] = {}
+
+    def new_state(self) -> int:
+        self.char_edges.append([])
+        self.epsilon_edges.append([])
+        self.accepts.append(-1)
+        return len(self.accepts) - 1
+
+    def add_pattern(self, pattern: re.Pattern, index: int, start: int) -> None:
+        """adds the language of a compiled pattern to the NFA, starting from the given state"""
+        if not isinstance(pattern.pattern, str):
+            raise _UnsupportedPattern()
+        parsed = _sre_parse.parse(pattern.pattern, pattern.flags)
+        end = self._build_sequence(parsed, parsed.state.flags, start)
+        self.accepts[end] = index
+
+    def _charset(self, item: tuple, flags: int) -> int:
+        # each single character item is compiled on its own, so membership follows re's own semantics (flags, unicode categories...)
+        key = (flags, repr(item))
+        if key not in self._charset_ids:
+            subpattern = _sre_parse.SubPattern(_sre_parse.State(), [item])
+            self._charset_ids[key] = len(self.charsets)
+            self.charsets.append(_sre_compile.compile(subpattern, flags))
+        return self._charset_ids[key]
+
+    def _build_sequence(self, items, flags: int, state: int) -> int:
+        for item in items:
+            state = self._build_item(item, flags, state)
+        return state
+
+    def _build_item(self, item: tuple, flags: int, state: int) -> int:
+        op, av = item
+        if op in _CHAR_OPS:
+            target = self.new_state()
+            self.char_edges[state].append((self._charset(item, flags), target))
+            return target
+
+        if op is _sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, items = av
+            return self._build_sequence(items, (flags | add_flags) & ~del_flags, state)
+
+        if op is _sre_constants.BRANCH:
+            end = self.new_state()
+            for alternative in av[1]:
+                alternative_start = self.new_state()
+                self.epsilon_edges[state].append(alternative_start)
+                alternative_end = self._build_sequence(alternative, flags, alternative_start)
+                self.epsilon_edges[alternative_end].append(end)
+            return end
+
+        if op in _REPEAT_OPS:
+            # greediness only changes which match re prefers, not which strings fully match
+            min_count, max_count, items = av
+            for _ in range(min_count):
+                state = self._build_sequence(items, flags, state)
+            if max_count is _sre_constants.MAXREPEAT:
+                loop = self.new_state()
+                self.epsilon_edges[state].append(loop)
+                body_end = self._build_sequence(items, flags, loop)
+                self.epsilon_edges[body_end].append(loop)
+                return loop
+            end = self.new_state()
+            self.epsilon_edges[state].append(end)
+            for _ in range(max_count - min_count):
+                state = self._build_sequence(items, flags, state)
+                self.epsilon_edges[state].append(end)
+            return end
+
+        raise _UnsupportedPattern()
+
+
+class _DFAState:
+    __slots__ = ("nfa_states", "transitions", "accept", "extendable")
+
+    def __init__(self, nfa_states: frozenset[int], accept: int, extendable: bool) -> None:
+        self.nfa_states = nfa_states
+        self.transitions: dict[str, "_DFAState"] = {}
+        self.accept = accept  # index of the first pattern accepting here, or -1
+        self.extendable = extendable  # False if no character can ever leave this state
+
+
+_DEAD = _DFAState(frozenset(), -1, False)
+
+_ASCII_CHARS = tuple(chr(byte) for byte in range(0x80))
+
+
+def _utf8_width(lead_byte: int) -> int:
+    """the number of bytes in a UTF-8 encoded character starting with lead_byte, or 0 if it cannot start one"""
+    if 0xC0 <= lead_byte < 0xE0:
+        return 2
+    if 0xE0 <= lead_byte < 0xF0:
+        return 3
+    if 0xF0 <= lead_byte < 0xF8:
+        return 4
+    return 0
+
+
+class CompiledLexer:
+    def __init__(self, pattern_to_type: dict[re.Pattern, TokenTag]) -> None:
+        """A lexer compiled once from a mapping of regex patterns to token tags, finding the longest lexeme at each position in a single left to right scan
+
+        All patterns are combined into one automaton whose states are built lazily as characters are seen, so each character is examined
+        once per lexeme instead of once per candidate substring. When two patterns match a lexeme of the same length, the pattern that comes
+        first in the mapping wins, exactly as with check_for_match.
+
+        Patterns using constructs that have no DFA equivalent (anchors, lookarounds, backreferences, possessive repeats) fall back to the
+        original greedy backtracking search for the whole lexer.
+
+        Args:
+            pattern_to_type (dict[re.Pattern, TokenTag]): a dictionary containing mappings of regex patterns that identify a lexeme and their respective tokens
+        """
+        self.patterns: tuple[re.Pattern, ...] = tuple(pattern_to_type.keys())
+        self.tags: tuple[TokenTag, ...] = tuple(pattern_to_type.values())
+
+        self._nfa = _NFA()
+        self._states: dict[frozenset[int], _DFAState] = {}
+        try:
+            nfa_start = self._nfa.new_state()
+            for index, pattern in enumerate(self.patterns):
+                pattern_start = self._nfa.new_state()
+                self._nfa.epsilon_edges[nfa_start].append(pattern_start)
+                self._nfa.add_pattern(pattern, index, pattern_start)
+        except _UnsupportedPattern:
+            self._nfa = None
+            self._start = None
+        else:
+            self._start = self._dfa_state(self._closure([nfa_start]))
+
+    @property
+    def uses_dfa(self) -> bool:
+        """whether the lexer runs on its automaton, rather than the backtracking fallback"""
+        return self._start is not None
+
+    def __reduce__(self):
+        # automaton states are rebuilt lazily, so only the patterns need to travel (e.g. to worker processes)
+        return (CompiledLexer, (dict(zip(self.patterns, self.tags)),))
+
+    def _closure(self, nfa_states) -> frozenset[int]:
+        closure = set(nfa_states)
+        to_visit = list(nfa_states)
+        while to_visit:
+            for target in self._nfa.epsilon_edges[to_visit.pop()]:
+                if target not in closure:
+                    closure.add(target)
+                    to_visit.append(target)
+        return frozenset(closure)
+
+    def _dfa_state(self, nfa_states: frozenset[int]) -> _DFAState:
+        if not nfa_states:
+            return _DEAD
+        state = self._states.get(nfa_states)
+        if state is None:
+            accepting = [self._nfa.accepts[s] for s in nfa_states if self._nfa.accepts[s] >= 0]
+            extendable = any(self._nfa.char_edges[s] for s in nfa_states)
+            state = _DFAState(nfa_states, min(accepting, default=-1), extendable)
+            self._states[nfa_states] = state
+        return state
+
+    def _transition(self, state: _DFAState, char: str) -> _DFAState:
+        """computes (and caches) the state reached from the given state by reading char"""
+        charsets = self._nfa.charsets
+        targets = [
+            target
+            for nfa_state in state.nfa_states
+            for charset, target in self._nfa.char_edges[nfa_state]
+            if charsets[charset].match(char)
+        ]
+        next_state = self._dfa_state(self._closure(targets))
+        state.transitions[char] = next_state
+        return next_state
+
+    def _scan(self, string, pos: int, end: int) -> tuple[int, int, bool]:
+        """finds the longest lexeme starting at pos, without reading past end
+
+        Returns:
+            (int, int, bool): the end of the lexeme (-1 if none), the index of its pattern, and whether reading past end could still
+            have produced a longer lexeme
+        """
+        if self._start is None:
+            return self._backtrack_scan(string, pos, end)
+
+        state = self._start
+        match_end = -1
+        accept = -1
+        i = pos
+        while i < end:
+            char = string[i]
+            next_state = state.transitions.get(char)
+            if next_state is None:
+                next_state = self._transition(state, char)
+            if next_state is _DEAD:
+                return match_end, accept, False
+            state = next_state
+            i += 1
+            if state.accept >= 0:
+                match_end = i
+                accept = state.accept
+                if not state.extendable:
+                    return match_end, accept, False
+        return match_end, accept, True
+
+    def _scan_bytes(self, buffer, pos: int, end: int) -> tuple[int, int, bool]:
+        """the equivalent of _scan over a UTF-8 encoded buffer (bytes, mmap, memoryview...), with byte positions"""
+        if self._start is None:
+            text = str(buffer[pos:end], "utf-8")
+            match_end, accept, may_extend = self._backtrack_scan(text, 0, len(text))
+            if match_end >= 0:
+                match_end = pos + len(text[:match_end].encode("utf-8"))
+            return match_end, accept, may_extend
+
+        state = self._start
+        match_end = -1
+        accept = -1
+        i = pos
+        while i < end:
+            byte = buffer[i]
+            if byte < 0x80:
+                char = _ASCII_CHARS[byte]
+                width = 1
+            else:
+                # only multi-byte characters are decoded, from a slice of their own few bytes
+                width = _utf8_width(byte)
+                if width == 0:
+                    return match_end, accept, False
+                if i + width > end:
+                    return match_end, accept, True
+                char = str(buffer[i : i + width], "utf-8")
+            next_state = state.transitions.get(char)
+            if next_state is None:
+                next_state = self._transition(state, char)
+            if next_state is _DEAD:
+                return match_end, accept, False
+            state = next_state
+            i += width
+            if state.accept >= 0:
+                match_end = i
+                accept = state.accept
+                if not state.extendable:
+                    return match_end, accept, False
+        return match_end, accept, True
+
+    def _scan_extent(self, string: str, pos: int, end: int) -> int:
+        """the position one past the last character the scan for a lexeme at pos reads, or end + 1 if it needed to read past end"""
+        if self._start is None:
+            return end + 1  # the backtracking search reads everything
+
+        state = self._start
+        i = pos
+        while i < end:
+            char = string[i]
+            next_state = state.transitions.get(char)
+            if next_state is None:
+                next_state = self._transition(state, char)
+            i += 1
+            if next_state is _DEAD:
+                return i
+            state = next_state
+            if state.accept >= 0 and not state.extendable:
+                return i
+        return end + 1
+
+    def _backtrack_scan(self, string, pos: int, end: int) -> tuple[int, int, bool]:
+        # the original search, trying every candidate lexeme from longest to shortest
+        back = end
+        while back > pos:
+            substring = string[pos:back]
+            for index, regex in enumerate(self.patterns):
+                if regex.fullmatch(substring):
+                    return back, index, True
+            back -= 1
+        return -1, -1, True
+
+    def longest_match(self, string: str, pos: int = 0) -> tuple[int, TokenTag] | None:
+        """finds the longest lexeme of string starting at pos
+
+        Returns:
+            (int, TokenTag) | None: the end position of the lexeme and its token tag, or None if no pattern matches at pos
+        """
+        match_end, accept, _ = self._scan(string, pos, len(string))
+        if match_end < 0:
+            return None
+        return match_end, self.tags[accept]
+
+    def iter_lexemes(self, string: str) -> Iterator[tuple[str, TokenTag]]:
+        """Identifies lexemes in messy text one at a time, stopping at the first position no pattern matches
+
+        Args:
+            string (str): the text to search for lexemes
+
+        Yields:
+            (str, TokenTag): a substring lexeme and the associated token tag
+        """
+        tags = self.tags
+        front = 0
+        end = len(string)
+        while front < end:
+            match_end, accept, _ = self._scan(string, front, end)
+            if match_end < 0:
+                return
+            yield string[front:match_end], tags[accept]
+            front = match_end
+
+    def iter_lexeme_spans(self, source, start: int = 0, end: int | None = None) -> Iterator[tuple[int, int, TokenTag]]:
+        """Identifies lexemes by their position in the source, without copying any of its text
+
+        Args:
+            source (str | bytes-like): the text to search for lexemes, either a str or a UTF-8/ASCII encoded buffer such as bytes, an mmap or a memoryview
+            start (int): the position to start lexing from
+            end (int | None): the position to stop lexing at, defaults to the end of the source
+
+        Yields:
+            (int, int, TokenTag): the start and end offsets of a lexeme (character offsets for a str, byte offsets otherwise) and its token tag
+        """
+        scan = self._scan if isinstance(source, str) else self._scan_bytes
+        tags = self.tags
+        front = start
+        end = len(source) if end is None else end
+        while front < end:
+            match_end, accept, _ = scan(source, front, end)
+            if match_end < 0:
+                return
+            yield front, match_end, tags[accept]
+            front = match_end
+
+    def find_lexemes(self, string: str) -> list[tuple[str, TokenTag]]:
+        """Identifies lexemes in messy text
+
+        Args:
+            string (str): the text to search for lexemes
+
+        Returns:
+            list[(str, TokenTag)]: a list of substring lexemes and the associated token tags
+        """
+        return list(self.iter_lexemes(string))
@@ -1,5 +1,7 @@
 import re
+from functools import lru_cache
 from typing import Callable
+from .compiled_lexer import *
 from .token import *
 
 
@@ -24,34 +26,29 @@ def check_for_match(
 def find_lexemes(
     string: str, pattern_to_type: dict[re.Pattern, TokenTag]
 ) -> list[(str, TokenTag)]:
-    """Identifies Lexemes in messy text
+    """Identifies Lexemes in messy text, taking the longest lexeme at each position (ties go to the earliest pattern)
 
     Args:
         string str: the text to search for lexemes
+        pattern_to_type (dict[re.Pattern, TokenType]): a dictionary containing mappings of regex patterns that identify a lexeme and their respective tokens
 
     Returns
         list[(str, TokenType)]: a list of substring lexemes and the associated token types
     """
-    foundLexemes: list[(str, TokenTag)] = []
-    front = 0
-    back = len(string)
-    while back > front:
-        substring = string[front:back]
-        lexeme = check_for_match(substring, pattern_to_type)
-        if lexeme:
-            foundLexemes.append((substring, lexeme))
-            front = back
-            back = len(string)
-        else:
-            back -= 1
-    return foundLexemes
+    return _compiled_lexer(tuple(pattern_to_type.items())).find_lexemes(string)
+
+
+@lru_cache(maxsize=32)
+def _compiled_lexer(pattern_items: tuple[tuple[re.Pattern, TokenTag], ...]) -> CompiledLexer:
+    # callers usually pass the same mapping on every call, so the compiled lexer is kept around
+    return CompiledLexer(dict(pattern_items))
 
 
 def construct_tokens(
     lexemes: list[(str, TokenTag)],
     type_to_extractor: dict[TokenTag, Callable[[str], any]],
 ) -> list[Token]:
-    """takes a list of lexemes and turns them into tokens
+    """takes a list of lexemes and turns them into tokens, each token's offset assumes the lexemes are contiguous from the start of their source (as find_lexemes gives them)
 
     Args:
         lexemes (list[(str, TokenType)]): a list of substring lexemes and the associated token types
@@ -61,7 +58,9 @@ def construct_tokens(
         list[Token]: a list of tokens
     """
     tokens: list[Token] = []
+    offset = 0
     for [substring, lexeme_type] in lexemes:
         extractor = type_to_extractor.get(lexeme_type)
-        tokens.append(Token(lexeme_type, extractor(substring) if extractor else None))
+        tokens.append(Token(lexeme_type, extractor(substring) if extractor else None, offset))
+        offset += len(substring)
     return tokens
@@ -0,0 +1,189 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from math import isqrt
+
+from .compiled_lexer import *
+from .token import *
+from .token_buffer import TokenBuffer, _UNEXTRACTED
+
+# the fewest shift segments a buffer keeps before merging them (see relex)
+_MIN_SHIFT_LIMIT = 16
+
+
+class TextEdit:
+    def __init__(self, offset: int, deleted_length: int, inserted_text: str) -> None:
+        """A single edit of a text: deleted_length characters are removed at offset, and inserted_text is put in their place
+
+        Args:
+            offset (int): the position of the edit in the text before the edit
+            deleted_length (int): the number of characters removed
+            inserted_text (str): the text inserted at offset
+        """
+        self.offset = offset
+        self.deleted_length = deleted_length
+        self.inserted_text = inserted_text
+
+    def __repr__(self) -> str:
+        return f"(TextEdit: {self.offset}, -{self.deleted_length}, +{self.inserted_text!r})"
+
+    @property
+    def delta(self) -> int:
+        """how far text after the edit moves"""
+        return len(self.inserted_text) - self.deleted_length
+
+    def apply(self, text: str) -> str:
+        return text[: self.offset] + self.inserted_text + text[self.offset + self.deleted_length :]
+
+
+def _extend_reaches(lexer: CompiledLexer, tokens: TokenBuffer, offset: int) -> None:
+    """records how far the scans up to the tokens not yet recorded read, scanning them again until one read past offset"""
+    if tokens._reaches is None:
+        tokens._reaches = array(tokens._starts.typecode)
+    reaches = tokens._reaches
+    source = tokens.source
+    end = len(source)
+    index = len(reaches)
+    reach = reaches[index - 1] + tokens._delta(index - 1) if index else 0
+    while index < len(tokens.tag_ids) and reach <= offset:
+        reach = max(reach, lexer._scan_extent(source, tokens.start(index), end))
+        reaches.append(reach - tokens._delta(index))
+        index += 1
+
+
+def _restart_index(lexer: CompiledLexer, tokens: TokenBuffer, offset: int) -> int:
+    """the earliest token whose scan (or the scan of a token before it) read past offset, or the number of tokens if none did"""
+    reaches = tokens._reaches
+    if reaches is None or not reaches or reaches[-1] + tokens._delta(len(reaches) - 1) <= offset:
+        _extend_reaches(lexer, tokens, offset)
+        reaches = tokens._reaches
+    # reaches never decrease, so the first segment that read past offset holds the token, which is found in it by bisection
+    bounds = [0, *tokens._shift_indexes, len(reaches)]
+    deltas = [0, *tokens._shift_deltas]
+    for segment, delta in enumerate(deltas):
+        low, high = bounds[segment], min(bounds[segment + 1], len(reaches))
+        if low < high and reaches[high - 1] + delta > offset:
+            return bisect_right(reaches, offset - delta, low, high)
+    return len(tokens.tag_ids)
+
+
+def relex(
+    tokens: TokenBuffer,
+    edit: TextEdit,
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+) -> TokenBuffer:
+    """Re-lexes a str source after an edit, reusing every token the edit cannot have changed
+
+    Lexing restarts at the earliest token whose scan read any of the edited text, and stops as soon as a new token starts where an old
+    token (shifted by the edit) started, since from there on maximal munch gives the same tokens again. The tokens in between are spliced
+    into the buffer's columns in place. The offsets of the tokens after them are not rewritten: the edit's shift starts a new shift
+    segment of the buffer, and only the indexes and shifts of the segments after it move. The shortest segments are merged once there
+    are more than about the square root of the number of tokens, so the work done on offsets stays far below the size of the source.
+
+    How far each scan read is recorded in the buffer as a running maximum, so the restart point is found by bisection even when a scan
+    read across many later tokens (e.g. an unterminated string). It is recorded the first time it is needed, by scanning the tokens up
+    to the edit again.
+
+    Args:
+        tokens (TokenBuffer): the complete (unfiltered) lexer output for the source before the edit, updated in place
+        edit (TextEdit): the edit made to the source
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): the compiled lexer, or the mapping of regex patterns, the tokens were lexed with
+
+    Returns:
+        TokenBuffer: the same buffer, holding the tokens of the edited source, equal to lexing it from scratch
+    """
+    lexer = pattern_to_type if isinstance(pattern_to_type, CompiledLexer) else CompiledLexer(pattern_to_type)
+    old_source: str = tokens.source
+    new_source = edit.apply(old_source)
+    edit_start = edit.offset
+    old_edit_end = edit.offset + edit.deleted_length
+    new_edit_end = edit.offset + len(edit.inserted_text)
+    delta = edit.delta
+    restart = _restart_index(lexer, tokens, edit_start)
+    starts, ends, reaches, tag_ids = tokens._starts, tokens._ends, tokens._reaches, tokens.tag_ids
+    token_count = len(tag_ids)
+    known = len(reaches)
+
+    def old_reach(index: int) -> int:
+        return reaches[index] + tokens._delta(index)
+
+    front = tokens.start(restart) if restart < token_count else (tokens.end(token_count - 1) if token_count else 0)
+    # where the old tokens stopped (they may stop before the end of the source if lexing hit an unmatched character)
+    old_stop = tokens.end(token_count - 1) if token_count else 0
+
+    # the new tokens join the segment before them, so their offsets are stored as much too early as its own
+    stored_delta = tokens._delta(restart - 1) if restart else 0
+    new_tag_ids = array(tag_ids.typecode)
+    new_starts = array(starts.typecode)
+    new_ends = array(ends.typecode)
+    new_reaches = array(reaches.typecode)
+    tag_id_of = [tag.id for tag in lexer.tags]
+    resync = token_count
+    old_index = restart
+    new_length = len(new_source)
+    reach = old_reach(restart - 1) if restart > 0 else 0
+    while True:
+        if front >= new_edit_end:
+            old_front = front - delta
+            while old_index < token_count and tokens.start(old_index) < old_front:
+                old_index += 1
+            if old_front >= old_edit_end and (
+                (old_index < token_count and tokens.start(old_index) == old_front)
+                or (old_index == token_count and old_front == old_stop)
+            ):
+                resync = old_index
+                break
+        if front >= new_length:
+            break
+        match_end, accept, _ = lexer._scan(new_source, front, new_length)
+        if match_end < 0:
+            break
+        reach = max(reach, lexer._scan_extent(new_source, front, new_length))
+        new_tag_ids.append(tag_id_of[accept])
+        new_starts.append(front - stored_delta)
+        new_ends.append(match_end - stored_delta)
+        new_reaches.append(reach - stored_delta)
+        front = match_end
+
+    # the reaches of the old tokens after the resync point only move by the edit once they pass both what the new tokens read and what
+    # the replaced tokens read; until then they are worked out again, scanning the tokens no earlier reach accounts for (and those not
+    # recorded yet are left to be recorded when needed)
+    replaced_reach = old_reach(resync - 1) if 0 < resync <= known else 0
+    fixed_until = resync
+    while fixed_until < known:
+        reach_before = old_reach(fixed_until)
+        if reach_before > replaced_reach:
+            if reach_before + delta > reach:
+                break
+        else:
+            reach = max(reach, lexer._scan_extent(new_source, tokens.start(fixed_until) + delta, new_length))
+        new_reaches.append(reach - tokens._delta(fixed_until) - delta)
+        fixed_until += 1
+
+    # the tokens from the resync point on move by the edit: the segments over them are renumbered and shifted, and one starts where
+    # they now start unless the segment before already shifts them as far
+    shift_indexes, shift_deltas = tokens._shift_indexes, tokens._shift_deltas
+    resync_delta = tokens._delta(resync) + delta if resync < token_count else stored_delta
+    index_shift = restart + len(new_tag_ids) - resync
+    low = bisect_left(shift_indexes, restart)
+    high = bisect_right(shift_indexes, resync)
+    later_indexes = array(shift_indexes.typecode, [index + index_shift for index in shift_indexes[high:]])
+    later_deltas = array(shift_deltas.typecode, [later_delta + delta for later_delta in shift_deltas[high:]])
+    if resync_delta != stored_delta:
+        later_indexes.insert(0, resync + index_shift)
+        later_deltas.insert(0, resync_delta)
+    shift_indexes[low:] = later_indexes
+    shift_deltas[low:] = later_deltas
+
+    starts[restart:resync] = new_starts
+    ends[restart:resync] = new_ends
+    reaches[restart : min(fixed_until, known)] = new_reaches
+    tag_ids[restart:resync] = new_tag_ids
+    # values already extracted for untouched tokens stay valid
+    if tokens._values is not None and restart < len(tokens._values):
+        tokens._values[restart:resync] = [_UNEXTRACTED] * len(new_tag_ids)
+
+    tokens.source = new_source
+    tokens._line_index = None
+    tokens._limit_shifts(max(_MIN_SHIFT_LIMIT, isqrt(len(tag_ids))))
+    return tokens
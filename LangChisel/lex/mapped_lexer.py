@@ -0,0 +1,78 @@
+import mmap
+import re
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from .compiled_lexer import *
+from .token import *
+
+
+@contextmanager
+def map_source_file(path: str) -> Iterator[mmap.mmap | bytes]:
+    """Maps a source file read-only into memory, so it can be lexed without reading it first
+
+    Args:
+        path (str): the path of an ASCII or UTF-8 encoded source file
+
+    Yields:
+        mmap.mmap | bytes: a read-only buffer over the file (an empty bytes object for an empty file, which cannot be mapped)
+    """
+    with open(path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def source_text(source, start: int, end: int, encoding: str = "utf-8") -> str:
+    """copies the text between two offsets of a source (a str, or an encoded buffer)"""
+    if isinstance(source, str):
+        return source[start:end]
+    return str(source[start:end], encoding)
+
+
+def find_lexeme_spans(
+    source, pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag]
+) -> list[tuple[int, int, TokenTag]]:
+    """Identifies lexemes by offset rather than by substring, so no text is copied while lexing
+
+    Args:
+        source (str | bytes-like): the text to search for lexemes, either a str or a UTF-8/ASCII encoded buffer (bytes, mmap, memoryview)
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+
+    Returns:
+        list[(int, int, TokenTag)]: the start and end offset of each lexeme (in characters for a str, in bytes otherwise) and its token tag
+    """
+    lexer = pattern_to_type if isinstance(pattern_to_type, CompiledLexer) else CompiledLexer(pattern_to_type)
+    return list(lexer.iter_lexeme_spans(source))
+
+
+def construct_tokens_from_spans(
+    source,
+    spans: list[tuple[int, int, TokenTag]],
+    type_to_extractor: dict[TokenTag, Callable[[str], any]],
+    encoding: str = "utf-8",
+) -> list[Token]:
+    """takes a list of lexeme spans and turns them into tokens, only copying the text of lexemes whose tag has an extractor
+
+    Args:
+        source (str | bytes-like): the text the spans were found in
+        spans (list[(int, int, TokenTag)]): the start and end offset of each lexeme and its token tag
+        type_to_extractor (dict[TokenTag, Callable[[str], any]]): a mapping of TokenTag to a lambda that can be used to extract data from said TokenTag
+        encoding (str): the encoding of a buffer source
+
+    Returns:
+        list[Token]: a list of tokens
+    """
+    tokens: list[Token] = []
+    for start, end, lexeme_type in spans:
+        extractor = type_to_extractor.get(lexeme_type)
+        tokens.append(
+            Token(lexeme_type, extractor(source_text(source, start, end, encoding)) if extractor else None, start)
+        )
+    return tokens
@@ -0,0 +1,40 @@
+from array import array
+from bisect import bisect_right
+
+
+class LineIndex:
+    def __init__(self, source) -> None:
+        """Turns offsets into a source into line and column numbers
+
+        The start of every line is only found the first time a position is asked for (e.g. to report an error), after which each lookup
+        is a binary search, so lexing and parsing never pay for positions nobody reads.
+
+        Args:
+            source (str | bytes-like): the text offsets refer to (for an encoded buffer, offsets and columns are in bytes)
+        """
+        self.source = source
+        self._line_starts: array | None = None
+
+    def __getstate__(self) -> dict:
+        # positions only need the line starts, so the source itself is not pickled
+        return {"source": None, "_line_starts": self.line_starts}
+
+    @property
+    def line_starts(self) -> array:
+        """the offset at which each line starts"""
+        if self._line_starts is None:
+            newline = "\n" if isinstance(self.source, str) else b"\n"
+            find = self.source.find
+            line_starts = array("q", [0])
+            position = find(newline)
+            while position >= 0:
+                line_starts.append(position + 1)
+                position = find(newline, position + 1)
+            self._line_starts = line_starts
+        return self._line_starts
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """the (line, column) of an offset, both counting from 1"""
+        line_starts = self.line_starts
+        line = bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
@@ -0,0 +1,122 @@
+import re
+from typing import Callable, Iterable, Iterator, TextIO
+
+from .compiled_lexer import *
+from .token import *
+
+
+class StreamLexer:
+    def __init__(self, lexer: CompiledLexer | dict[re.Pattern, TokenTag], lookahead: int = 1 << 8) -> None:
+        """An incremental lexer fed with consecutive chunks of text, handing back each lexeme as soon as no later input can make it longer
+
+        Only the unfinished tail of the text fed so far is kept, so memory depends on the longest lexeme rather than the size of the input.
+        As with find_lexemes, lexing stops at the first position no pattern matches.
+
+        A lexer on the backtracking fallback (see CompiledLexer.uses_dfa) can never tell that more input would not make a lexeme longer, so
+        it only looks lookahead characters past the start of each lexeme, and takes the longest lexeme found within them as certain. This
+        keeps memory and the time spent on each lexeme bounded, at the cost of splitting any lexeme longer than lookahead characters.
+
+        Args:
+            lexer (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or the mapping of regex patterns to token tags to compile one from
+            lookahead (int): with the backtracking fallback, the number of characters searched for each lexeme (the longest lexeme found)
+        """
+        self.lexer = lexer if isinstance(lexer, CompiledLexer) else CompiledLexer(lexer)
+        self.lookahead = lookahead
+        self.offset = 0  # position in the whole input of the start of the pending tail
+        self._tail = ""
+        self._stopped = False
+
+    def feed(self, chunk: str) -> list[tuple[str, TokenTag]]:
+        """adds the next chunk of text, returning every lexeme that is now certain"""
+        if self._stopped:
+            return []
+        self._tail += chunk
+        return self._lex(final=False)
+
+    def finish(self) -> list[tuple[str, TokenTag]]:
+        """marks the end of the input, returning the lexemes left in the pending tail"""
+        if self._stopped:
+            return []
+        lexemes = self._lex(final=True)
+        self._stopped = True
+        return lexemes
+
+    def _lex(self, final: bool) -> list[tuple[str, TokenTag]]:
+        tail = self._tail
+        tags = self.lexer.tags
+        scan = self.lexer._scan
+        bounded = not self.lexer.uses_dfa
+        lexemes: list[tuple[str, TokenTag]] = []
+        front = 0
+        end = len(tail)
+        while front < end:
+            if bounded:
+                stop = min(end, front + self.lookahead)
+                match_end, accept, may_extend = scan(tail, front, stop)
+                may_extend = stop == end  # with lookahead characters seen, the lexeme found is taken as certain
+            else:
+                match_end, accept, may_extend = scan(tail, front, end)
+            if may_extend and not final:
+                break  # the lexeme (or the lack of one) depends on text we have not seen yet
+            if match_end < 0:
+                self._stopped = True
+                front = end
+                break
+            lexemes.append((tail[front:match_end], tags[accept]))
+            front = match_end
+        self.offset += front
+        self._tail = tail[front:]
+        return lexemes
+
+
+def _read_chunks(source: TextIO | Iterable[str], chunk_size: int) -> Iterator[str]:
+    if hasattr(source, "read"):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
+
+
+def stream_lexemes(
+    source: TextIO | Iterable[str],
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    chunk_size: int = 1 << 16,
+) -> Iterator[tuple[str, TokenTag]]:
+    """Identifies lexemes in a text stream or an iterable of text chunks, without holding the whole text in memory
+
+    Args:
+        source (TextIO | Iterable[str]): a text file-like object, or any iterable of consecutive chunks of text
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+        chunk_size (int): the number of characters to read at a time from a file-like source
+
+    Yields:
+        (str, TokenTag): a substring lexeme and the associated token tag, in the same order as find_lexemes would give them
+    """
+    stream_lexer = StreamLexer(pattern_to_type)
+    for chunk in _read_chunks(source, chunk_size):
+        yield from stream_lexer.feed(chunk)
+    yield from stream_lexer.finish()
+
+
+def stream_tokens(
+    source: TextIO | Iterable[str],
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    type_to_extractor: dict[TokenTag, Callable[[str], any]],
+    chunk_size: int = 1 << 16,
+) -> Iterator[Token]:
+    """The streaming equivalent of find_lexemes followed by construct_tokens
+
+    Args:
+        source (TextIO | Iterable[str]): a text file-like object, or any iterable of consecutive chunks of text
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+        type_to_extractor (dict[TokenTag, Callable[[str], any]]): a mapping of TokenTag to a lambda that can be used to extract data from said TokenTag
+        chunk_size (int): the number of characters to read at a time from a file-like source
+
+    Yields:
+        Token: each token, as soon as its lexeme is certain
+    """
+    offset = 0
+    for substring, tag in stream_lexemes(source, pattern_to_type, chunk_size):
+        extractor = type_to_extractor.get(tag)
+        yield Token(tag, extractor(substring) if extractor else None, offset)
+        offset += len(substring)
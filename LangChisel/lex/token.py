@@ -1,36 +1,68 @@
+import threading
 
 
 class TokenTag:
-    def __init__(self, identifier:str) -> None:
+    __slots__ = ("identifier", "id")
+
+    _interned: dict[str, "TokenTag"] = {}
+    _by_id: list["TokenTag"] = []
+    _lock = threading.Lock()
+
+    def __new__(cls, identifier: str) -> "TokenTag":
         """A representation of a single tag of Token
-        
+
+        Tags are interned: constructing a tag with an identifier that has been seen before returns the same object, so tags compare and
+        hash by identity, and every tag carries a small integer id that can index tables directly. Ids are handed out in order of first use,
+        so they differ from one process to the next: a tag is pickled by its identifier, and anything keyed by id is rebuilt on arrival.
+
          Args:
             identifier (str): the name of the non-terminal or token of the terminal
         """
-        self.identifier = identifier
-    
+        tag = cls._interned.get(identifier)
+        if tag is None:
+            with cls._lock:
+                # looked up again, as another thread may have interned the identifier since
+                tag = cls._interned.get(identifier)
+                if tag is None:
+                    tag = super().__new__(cls)
+                    tag.identifier = identifier
+                    tag.id = len(cls._by_id)
+                    cls._by_id.append(tag)
+                    cls._interned[identifier] = tag
+        return tag
+
+    @classmethod
+    def from_id(cls, id: int) -> "TokenTag":
+        """the interned tag with the given id"""
+        return cls._by_id[id]
+
+    @classmethod
+    def count(cls) -> int:
+        """the number of tags interned so far (every id is below this)"""
+        return len(cls._by_id)
+
+    def __reduce__(self):
+        # interned again when unpickled, taking this process's id for the identifier
+        return (TokenTag, (self.identifier,))
+
     def __repr__(self) -> str:
         return f"Token: {self.identifier}"
-    
-    def __eq__(self, other: object) -> bool:
-        if isinstance(other, TokenTag):
-            return self.identifier == other.identifier
-        return False
-    
-    def __hash__(self) -> int:
-        return hash((self.identifier))
 
 
 class Token:
-    def __init__(self, tag: TokenTag, value: any) -> None:
+    __slots__ = ("tag", "value", "offset")
+
+    def __init__(self, tag: TokenTag, value: any, offset: int | None = None) -> None:
         """A Token a meaningful collection of characters that carry semantic weight to the language
 
         Args:
             tag (Tokentag): The tag of token this is
             value (any): Extra information (if any) to be associated with this token
+            offset (int | None): The offset of the token's lexeme in its source (if known), see LineIndex to turn it into a line and column
         """
         self.tag = tag  # the tag of this token
         self.value = value  # data associated with this token
+        self.offset = offset  # where this token starts in its source
 
     def __repr__(self) -> str:
         return f"(tag: {self.tag}, Value: {self.value})"
@@ -0,0 +1,251 @@
+import re
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from typing import Callable, Iterator
+
+from .compiled_lexer import *
+from .mapped_lexer import source_text
+from .source_position import LineIndex
+from .token import *
+
+
+_UNEXTRACTED = object()
+
+
+class TokenBuffer:
+    def __init__(
+        self,
+        source,
+        type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+        encoding: str = "utf-8",
+    ) -> None:
+        """A sequence of tokens stored as parallel columns of tag ids (TokenTag.id), start offsets and end offsets into their source
+
+        No Token object exists until one is asked for, and a token's value is only extracted (and then cached) the first time it is needed.
+
+        Args:
+            source (str | bytes-like): the text the tokens were lexed from, a str or an encoded buffer such as an mmap
+            type_to_extractor (dict[TokenTag, Callable[[str], any]]): a mapping of TokenTag to a lambda that can be used to extract data from said TokenTag
+            encoding (str): the encoding of a buffer source
+        """
+        self.source = source
+        self.type_to_extractor = type_to_extractor if type_to_extractor is not None else {}
+        self.encoding = encoding
+        self.tag_ids = array("I")
+        self._starts = array("q")
+        self._ends = array("q")
+        # offsets are stored in shift segments (see relex): those of tokens from _shift_indexes[k] up to the next segment are stored
+        # _shift_deltas[k] too early (and those before the first segment as they are), and only fixed up when needed
+        self._shift_indexes = array("q")
+        self._shift_deltas = array("q")
+        # the furthest any scan up to each token read (a running maximum of scan extents), stored like the offsets; kept by relex, and
+        # only known for as many tokens as relex has needed so far
+        self._reaches: array | None = None
+        # the value of each token, or _UNEXTRACTED (a list rather than a dict, so relex splices it instead of renumbering every value)
+        self._values: list | None = None
+        self._line_index: LineIndex | None = None
+
+    @classmethod
+    def from_source(
+        cls,
+        source,
+        pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+        type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+        encoding: str = "utf-8",
+    ) -> "TokenBuffer":
+        """lexes a whole source straight into a buffer, the equivalent of construct_tokens(find_lexemes(...)) without any per token objects"""
+        lexer = pattern_to_type if isinstance(pattern_to_type, CompiledLexer) else CompiledLexer(pattern_to_type)
+        buffer = cls(source, type_to_extractor, encoding)
+        tag_ids = [tag.id for tag in lexer.tags]
+        append_tag = buffer.tag_ids.append
+        append_start = buffer._starts.append
+        append_end = buffer._ends.append
+        scan = lexer._scan if isinstance(source, str) else lexer._scan_bytes
+        front = 0
+        end = len(source)
+        while front < end:
+            match_end, accept, _ = scan(source, front, end)
+            if match_end < 0:
+                break
+            append_tag(tag_ids[accept])
+            append_start(front)
+            append_end(match_end)
+            front = match_end
+        return buffer
+
+    def __getstate__(self) -> dict:
+        # tag_ids travel as indexes into a list of the identifiers used, which __setstate__ interns again; extractors (often lambdas)
+        # and extracted values are left behind
+        self._apply_shift()
+        used_ids = sorted(set(self.tag_ids))
+        local_id = {tag_id: index for index, tag_id in enumerate(used_ids)}
+        return {
+            "source": self.source,
+            "encoding": self.encoding,
+            "identifiers": [TokenTag.from_id(tag_id).identifier for tag_id in used_ids],
+            "tag_indexes": array("I", map(local_id.__getitem__, self.tag_ids)),
+            "starts": self._starts,
+            "ends": self._ends,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["source"], None, state["encoding"])
+        tag_ids = [TokenTag(identifier).id for identifier in state["identifiers"]]
+        self.tag_ids = array("I", map(tag_ids.__getitem__, state["tag_indexes"]))
+        self._starts = state["starts"]
+        self._ends = state["ends"]
+
+    @property
+    def starts(self) -> array:
+        """the start offset of every token"""
+        self._apply_shift()
+        return self._starts
+
+    @starts.setter
+    def starts(self, starts: array) -> None:
+        self._apply_shift()
+        self._starts = starts
+        self._reaches = None
+
+    @property
+    def ends(self) -> array:
+        """the end offset of every token"""
+        self._apply_shift()
+        return self._ends
+
+    @ends.setter
+    def ends(self, ends: array) -> None:
+        self._apply_shift()
+        self._ends = ends
+        self._reaches = None
+
+    def _apply_shift(self) -> None:
+        while self._shift_indexes:
+            self._merge_shift(0)
+
+    def _merge_shift(self, segment: int) -> None:
+        """fixes up the offsets of a shift segment to those of the one before it, merging the two (at a cost of its length)"""
+        indexes, deltas = self._shift_indexes, self._shift_deltas
+        low = indexes[segment]
+        high = indexes[segment + 1] if segment + 1 < len(indexes) else len(self.tag_ids)
+        delta = deltas[segment] - (deltas[segment - 1] if segment else 0)
+        for column in (self._starts, self._ends, self._reaches):
+            if column is not None and low < len(column):
+                column_high = min(high, len(column))
+                column[low:column_high] = _shifted(column, low, column_high, delta)
+        del indexes[segment]
+        del deltas[segment]
+
+    def _limit_shifts(self, limit: int) -> None:
+        """merges the shortest shift segments until there are no more than limit"""
+        indexes = self._shift_indexes
+        while len(indexes) > limit:
+            bounds = [*indexes, len(self.tag_ids)]
+            self._merge_shift(min(range(len(indexes)), key=lambda segment: bounds[segment + 1] - bounds[segment]))
+
+    def _delta(self, index: int) -> int:
+        """how much too early the offsets of a token are stored"""
+        segment = bisect_right(self._shift_indexes, index)
+        return self._shift_deltas[segment - 1] if segment else 0
+
+    def start(self, index: int) -> int:
+        start = self._starts[index]
+        return start + self._delta(index) if self._shift_indexes else start
+
+    def end(self, index: int) -> int:
+        end = self._ends[index]
+        return end + self._delta(index) if self._shift_indexes else end
+
+    def append(self, start: int, end: int, tag: TokenTag) -> None:
+        self._apply_shift()
+        self.tag_ids.append(tag.id)
+        self._starts.append(start)
+        self._ends.append(end)
+        self._reaches = None
+
+    def close(self) -> None:
+        """closes the source if it can be closed (e.g. a file mapped into memory), after which no lexeme can be read from it"""
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self) -> "TokenBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.tag_ids)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.tag_ids)
+        return Token(TokenTag.from_id(self.tag_ids[index]), self.value(index), self.start(index))
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.tag_ids)):
+            yield self[index]
+
+    def __repr__(self) -> str:
+        return f"(TokenBuffer: {len(self)} tokens)"
+
+    @property
+    def line_index(self) -> LineIndex:
+        """the line index of the source, only built the first time a position is asked for"""
+        if self._line_index is None:
+            self._line_index = LineIndex(self.source)
+        return self._line_index
+
+    def tag(self, index: int) -> TokenTag:
+        return TokenTag.from_id(self.tag_ids[index])
+
+    def text(self, index: int) -> str:
+        """copies the lexeme of a token out of the source"""
+        return source_text(self.source, self.start(index), self.end(index), self.encoding)
+
+    def value(self, index: int) -> any:
+        """the value of a token, extracted from its lexeme the first time it is asked for"""
+        values = self._values
+        if values is None:
+            values = self._values = []
+        if index >= len(values):
+            values.extend([_UNEXTRACTED] * (len(self.tag_ids) - len(values)))
+        value = values[index]
+        if value is _UNEXTRACTED:
+            extractor = self.type_to_extractor.get(self.tag(index))
+            value = values[index] = extractor(self.text(index)) if extractor else None
+        return value
+
+    def tag_list(self) -> list[TokenTag]:
+        """the tag of every token, in order"""
+        return list(map(TokenTag._by_id.__getitem__, self.tag_ids))
+
+    def without_tags(self, *tags: TokenTag) -> "TokenBuffer":
+        """Filters out every token with one of the given tags (e.g. white space) using a mask over the columns, rather than per token objects
+
+        Returns:
+            TokenBuffer: a new buffer over the same source holding the remaining tokens
+        """
+        keep_by_id = bytearray(b"\x01" * TokenTag.count())
+        for tag in tags:
+            keep_by_id[tag.id] = 0
+        mask = bytes(map(keep_by_id.__getitem__, self.tag_ids))
+
+        filtered = TokenBuffer(self.source, self.type_to_extractor, self.encoding)
+        filtered.tag_ids = array(self.tag_ids.typecode, compress(self.tag_ids, mask))
+        filtered.starts = array(self.starts.typecode, compress(self.starts, mask))
+        filtered.ends = array(self.ends.typecode, compress(self.ends, mask))
+        return filtered
+
+    def to_tokens(self) -> list[Token]:
+        """materialises every token, as construct_tokens would have returned them"""
+        return list(self)
+
+
+def _shifted(offsets: array, low: int, high: int, delta: int) -> array:
+    """a copy of offsets[low:high], each moved by delta"""
+    if not delta:
+        return offsets[low:high]
+    return array(offsets.typecode, map(delta.__add__, offsets[low:high]))
@@ -0,0 +1,3 @@
+from .batch import *
+from .async_parse import *
+from .split_lexer import *
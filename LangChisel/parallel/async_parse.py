@@ -0,0 +1,166 @@
+import asyncio
+import codecs
+import re
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable
+
+from LangChisel.lex import CompiledLexer, StreamLexer, Token, TokenTag
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.parse import CFGrammar, CFProduction, CFSymbol, CompiledLL1Table, LL1StreamParser
+
+from .batch import BatchPool
+
+
+async def _read_text(reader: asyncio.StreamReader, chunk_size: int, encoding: str) -> AsyncIterator[str]:
+    # characters split across reads are held back by the decoder until the rest of them arrive
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while data := await reader.read(chunk_size):
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+async def _split_text(text: str, chunk_size: int) -> AsyncIterator[str]:
+    for start in range(0, len(text), chunk_size):
+        yield text[start : start + chunk_size]
+
+
+async def _lex_chunks(
+    chunks: AsyncIterable[str],
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    type_to_extractor: dict[TokenTag, Callable[[str], any]] | None,
+    skip_tags: Iterable[TokenTag],
+) -> AsyncIterator[Token]:
+    stream_lexer = StreamLexer(pattern_to_type)
+    # the backtracking fallback is far slower per character than the automaton, so its chunks are lexed in a thread, leaving the loop free
+    offload = not stream_lexer.lexer.uses_dfa
+    loop = asyncio.get_running_loop()
+    type_to_extractor = type_to_extractor if type_to_extractor is not None else {}
+    skip_tags = frozenset(skip_tags)
+    offset = 0
+    finished = False
+    while not finished:
+        chunk = await anext(chunks, None)
+        finished = chunk is None
+        lex = stream_lexer.finish if finished else partial(stream_lexer.feed, chunk)
+        for substring, tag in await loop.run_in_executor(None, lex) if offload else lex():
+            if tag not in skip_tags:
+                extractor = type_to_extractor.get(tag)
+                yield Token(tag, extractor(substring) if extractor else None, offset)
+            offset += len(substring)
+        # a read of data already buffered does not suspend, so the loop is given a turn after lexing each chunk
+        await asyncio.sleep(0)
+
+
+def async_stream_tokens(
+    reader: asyncio.StreamReader,
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+    skip_tags: Iterable[TokenTag] = (),
+    chunk_size: int = 1 << 12,
+    encoding: str = "utf-8",
+) -> AsyncIterator[Token]:
+    """The asyncio equivalent of stream_tokens, lexing the bytes read from a StreamReader (e.g. of a socket) as they arrive
+
+    Text is read and lexed a chunk at a time, and the event loop is given a turn after each chunk, so a long source does not hold up
+    other tasks for longer than it takes to lex one chunk. A lexer on the backtracking fallback (see CompiledLexer.uses_dfa) lexes each
+    chunk in the loop's default executor instead, as even one chunk takes it too long to hold up the loop.
+
+    Args:
+        reader (asyncio.StreamReader): the stream to read the source from, up to its end
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+        type_to_extractor (dict[TokenTag, Callable[[str], any]] | None): a mapping of TokenTag to a lambda that can be used to extract data from said TokenTag
+        skip_tags (Iterable[TokenTag]): tags of tokens to leave out (e.g. white space)
+        chunk_size (int): the number of bytes to read at a time
+        encoding (str): the encoding of the bytes read
+
+    Yields:
+        Token: each token, as soon as its lexeme is certain (with its offset in characters)
+    """
+    return _lex_chunks(_read_text(reader, chunk_size, encoding), pattern_to_type, type_to_extractor, skip_tags)
+
+
+async def async_iter_LL1_derivation(
+    tokens: AsyncIterable[Token] | Iterable[Token],
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
+    yield_every: int = 1024,
+) -> AsyncIterator[CFProduction]:
+    """The asyncio equivalent of iter_LL1_derivation, giving the event loop a turn every yield_every tokens
+
+    Args:
+        tokens (AsyncIterable[Token] | Iterable[Token]): the tokens to parse, e.g. async_stream_tokens(...), or any iterable of tokens
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token in a ParseError
+        yield_every (int): the number of tokens parsed between turns of the event loop
+
+    Yields:
+        CFProduction: each production of the derivation, in order (a ParseError is raised where no step is valid)
+    """
+    parser = LL1StreamParser(grammar, parse_table, line_index)
+    if not hasattr(tokens, "__aiter__"):
+        tokens = _from_iterable(tokens)
+    count = 0
+    async for token in tokens:
+        for production in parser.feed(token):
+            yield production
+        if parser.finished:
+            return
+        count += 1
+        if count == yield_every:
+            count = 0
+            await asyncio.sleep(0)
+    for production in parser.finish():
+        yield production
+
+
+async def _from_iterable(tokens: Iterable[Token]) -> AsyncIterator[Token]:
+    for token in tokens:
+        yield token
+
+
+async def async_parse(
+    reader: asyncio.StreamReader,
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    skip_tags: Iterable[TokenTag] = (),
+    pool: BatchPool | None = None,
+    offload_size: int = 1 << 16,
+    chunk_size: int = 1 << 12,
+    encoding: str = "utf-8",
+    yield_every: int = 1024,
+) -> list[CFProduction]:
+    """Lexes and parses the source read from a StreamReader without blocking the event loop, for serving many parse requests at once
+
+    Without a pool, the source is lexed and parsed as it arrives, taking turns with the loop's other tasks (see async_stream_tokens and
+    async_iter_LL1_derivation). With a pool, the source is read in full first, and if it is at least offload_size bytes, it is lexed and
+    parsed by one of the pool's worker processes (see BatchPool.parse_async) while the loop goes on; smaller sources are parsed in the
+    loop as before, as sending them would cost more than parsing them.
+
+    Args:
+        reader (asyncio.StreamReader): the stream to read the source from, up to its end
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        skip_tags (Iterable[TokenTag]): tags of tokens to drop before parsing (e.g. white space)
+        pool (BatchPool | None): a pool, shared between requests, to offload large sources to (made with the same lexer, grammar, table and
+            skip_tags)
+        offload_size (int): the size in bytes from which a source is offloaded to the pool
+        chunk_size (int): the number of bytes (or, of a source read in full, characters) lexed at a time
+        encoding (str): the encoding of the bytes read
+        yield_every (int): the number of tokens parsed between turns of the event loop
+
+    Returns:
+        list[CFProduction]: the derivation sequence of the source (a ParseError is raised where no step is valid)
+    """
+    if pool is None:
+        chunks = _read_text(reader, chunk_size, encoding)
+    else:
+        data = await reader.read()
+        if len(data) >= offload_size:
+            return await pool.parse_async(data.decode(encoding))
+        chunks = _split_text(data.decode(encoding), chunk_size)
+    tokens = _lex_chunks(chunks, pattern_to_type, None, skip_tags)
+    return [production async for production in async_iter_LL1_derivation(tokens, grammar, parse_table, yield_every=yield_every)]
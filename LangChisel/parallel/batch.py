@@ -0,0 +1,234 @@
+import asyncio
+import mmap
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable
+
+from LangChisel.lex import CompiledLexer, TokenBuffer, TokenTag, map_source_file
+from LangChisel.parse import CFGrammar, CFProduction, CFSymbol, CompiledLL1Table, ParseError
+
+# what each worker process is given once by the pool initializer, rather than with every task
+_worker_state: dict = {}
+
+
+def _init_worker(
+    lexer: CompiledLexer,
+    skip_tags: tuple[TokenTag, ...],
+    grammar: CFGrammar | None,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table | None,
+) -> None:
+    _worker_state["lexer"] = lexer
+    _worker_state["skip_tags"] = skip_tags
+    _worker_state["grammar"] = grammar
+    if grammar is not None and isinstance(parse_table, dict):
+        # the table's productions arrived in the same pickle as the grammar's, so they are the same objects
+        parse_table = CompiledLL1Table(grammar, parse_table)
+    _worker_state["parse_table"] = parse_table
+
+
+def _lex_mapped(source: str | os.PathLike, task: Callable[[TokenBuffer], any]) -> any:
+    """lexes a source string, or a path mapped into memory, and runs task on the resulting tokens while the source is still available"""
+    if isinstance(source, str):
+        return task(_lex_buffer(source))
+    with map_source_file(source) as mapped:
+        return task(_lex_buffer(mapped))
+
+
+def _lex_buffer(source) -> TokenBuffer:
+    tokens = TokenBuffer.from_source(source, _worker_state["lexer"])
+    if _worker_state["skip_tags"]:
+        tokens = tokens.without_tags(*_worker_state["skip_tags"])
+    return tokens
+
+
+def _detach(tokens: TokenBuffer) -> TokenBuffer:
+    # the caller already has the source, so only the columns are sent back
+    tokens.source = None
+    return tokens
+
+
+def _derive(tokens: TokenBuffer) -> array:
+    try:
+        return _worker_state["parse_table"].derive_indexes(tokens)
+    except ParseError as error:
+        if error.line_index is not None:
+            error.line_index.line_starts  # resolved while the source is still open, so the error can be pickled without it
+        raise
+
+
+def _lex_task(source: str | os.PathLike) -> TokenBuffer:
+    if isinstance(source, str):
+        return _detach(_lex_buffer(source))
+    with open(source, "rb") as file:
+        if os.fstat(file.fileno()).st_size < _MAP_SIZE:
+            # the bytes come back as the buffer's source, so the caller never reads the file itself
+            return _lex_buffer(file.read())
+    return _lex_mapped(source, _detach)
+
+
+def _parse_task(source: str | os.PathLike) -> array:
+    return _lex_mapped(source, _derive)
+
+
+# files smaller than this are read by the worker and sent back in the buffers lex_many returns, rather than mapped (each map holds a
+# file descriptor open)
+_MAP_SIZE = 1 << 20
+
+
+def _attach(tokens: TokenBuffer, source: str | os.PathLike) -> None:
+    """gives a buffer sent back without its source the caller's copy: the str itself, or a map of the file sharing the worker's pages"""
+    if tokens.source is not None:
+        return
+    if isinstance(source, str):
+        tokens.source = source
+        return
+    with open(source, "rb") as file:
+        tokens.source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class BatchPool:
+    def __init__(
+        self,
+        pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+        grammar: CFGrammar | None = None,
+        parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table | None = None,
+        skip_tags: Iterable[TokenTag] = (),
+        max_workers: int | None = None,
+        mp_context=None,
+    ) -> None:
+        """A pool of worker processes that lex (and parse) many sources at once
+
+        The lexer, grammar and parse table are handed to each worker a single time through the pool initializer (or inherited when
+        processes are forked), so a task only carries its source, and only comes back with compact arrays.
+
+        Args:
+            pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+            grammar (CFGrammar | None): the grammar to parse with, only needed by parse_many
+            parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table | None): the LL(1) table of the grammar, only needed by
+                parse_many (each worker compiles a dict table once)
+            skip_tags (Iterable[TokenTag]): tags of tokens to drop before parsing (e.g. white space)
+            max_workers (int | None): the number of worker processes, defaults to the number of processors
+            mp_context: the multiprocessing context used to start the workers (e.g. multiprocessing.get_context("spawn"))
+        """
+        self.lexer = pattern_to_type if isinstance(pattern_to_type, CompiledLexer) else CompiledLexer(pattern_to_type)
+        self.grammar = grammar
+        self.parse_table = parse_table
+        self.skip_tags = tuple(skip_tags)
+        self.executor = ProcessPoolExecutor(
+            max_workers,
+            mp_context,
+            initializer=_init_worker,
+            initargs=(self.lexer, self.skip_tags, grammar, parse_table),
+        )
+
+    def __enter__(self) -> "BatchPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+
+    def lex_many(
+        self,
+        sources: Iterable[str | os.PathLike],
+        type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+        chunksize: int = 1,
+    ) -> list[TokenBuffer]:
+        """Lexes many sources in parallel
+
+        Args:
+            sources (Iterable[str | os.PathLike]): source texts (str) or paths of source files (any other path-like, e.g. pathlib.Path)
+            type_to_extractor (dict[TokenTag, Callable[[str], any]] | None): extractors for the values of the returned tokens
+            chunksize (int): the number of sources sent to a worker at a time
+
+        Returns:
+            list[TokenBuffer]: the tokens of each source, in order (offsets into a file are in bytes, and its buffer holds the file's bytes,
+            or maps a file of 1 MiB or more into memory until the buffer is closed)
+        """
+        sources = list(sources)
+        buffers = list(self.executor.map(_lex_task, sources, chunksize=chunksize))
+        for source, tokens in zip(sources, buffers):
+            _attach(tokens, source)
+            tokens.type_to_extractor = type_to_extractor if type_to_extractor is not None else {}
+        return buffers
+
+    def parse_many(self, sources: Iterable[str | os.PathLike], chunksize: int = 1) -> list[list[CFProduction]]:
+        """Lexes and parses many sources in parallel, raising the ParseError of the first source that fails
+
+        Args:
+            sources (Iterable[str | os.PathLike]): source texts (str) or paths of source files (any other path-like, e.g. pathlib.Path)
+            chunksize (int): the number of sources sent to a worker at a time
+
+        Returns:
+            list[list[CFProduction]]: the derivation sequence of each source, in order
+        """
+        if self.grammar is None or self.parse_table is None:
+            raise ValueError("parse_many needs a grammar and a parse table")
+        productions = self.grammar.productions
+        return [
+            [productions[index] for index in derivation]
+            for derivation in self.executor.map(_parse_task, sources, chunksize=chunksize)
+        ]
+
+    async def lex_async(
+        self, source: str | os.PathLike, type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None
+    ) -> TokenBuffer:
+        """Lexes a source in a worker process, leaving the running event loop free in the meantime
+
+        Args:
+            source (str | os.PathLike): a source text (str) or the path of a source file (any other path-like, e.g. pathlib.Path)
+            type_to_extractor (dict[TokenTag, Callable[[str], any]] | None): extractors for the values of the returned tokens
+
+        Returns:
+            TokenBuffer: the tokens of the source, as lex_many gives them
+        """
+        tokens = await asyncio.get_running_loop().run_in_executor(self.executor, _lex_task, source)
+        _attach(tokens, source)
+        tokens.type_to_extractor = type_to_extractor if type_to_extractor is not None else {}
+        return tokens
+
+    async def parse_async(self, source: str | os.PathLike) -> list[CFProduction]:
+        """Lexes and parses a source in a worker process, leaving the running event loop free in the meantime
+
+        Args:
+            source (str | os.PathLike): a source text (str) or the path of a source file (any other path-like, e.g. pathlib.Path)
+
+        Returns:
+            list[CFProduction]: the derivation sequence of the source (its ParseError is raised if it fails)
+        """
+        if self.grammar is None or self.parse_table is None:
+            raise ValueError("parse_async needs a grammar and a parse table")
+        derivation = await asyncio.get_running_loop().run_in_executor(self.executor, _parse_task, source)
+        productions = self.grammar.productions
+        return [productions[index] for index in derivation]
+
+
+def lex_many(
+    sources: Iterable[str | os.PathLike],
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+    skip_tags: Iterable[TokenTag] = (),
+    max_workers: int | None = None,
+    chunksize: int = 1,
+) -> list[TokenBuffer]:
+    """Lexes many sources across a pool of processes, see BatchPool.lex_many"""
+    with BatchPool(pattern_to_type, skip_tags=skip_tags, max_workers=max_workers) as pool:
+        return pool.lex_many(sources, type_to_extractor, chunksize)
+
+
+def parse_many(
+    sources: Iterable[str | os.PathLike],
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    skip_tags: Iterable[TokenTag] = (),
+    max_workers: int | None = None,
+    chunksize: int = 1,
+) -> list[list[CFProduction]]:
+    """Lexes and parses many sources across a pool of processes, see BatchPool.parse_many"""
+    with BatchPool(pattern_to_type, grammar, parse_table, skip_tags, max_workers) as pool:
+        return pool.parse_many(sources, chunksize)
@@ -0,0 +1,159 @@
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+from LangChisel.lex import CompiledLexer, TokenBuffer, TokenTag
+
+# what each worker process is given once by the pool initializer: the lexer and the whole source (inherited when forked)
+_worker_state: dict = {}
+
+
+def _init_split_worker(lexer: CompiledLexer, source: str | os.PathLike) -> None:
+    _worker_state["lexer"] = lexer
+    _worker_state["source"] = source if isinstance(source, str) else _map_file(source)
+
+
+def _map_file(path: str | os.PathLike) -> mmap.mmap | bytes:
+    with open(path, "rb") as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""  # an empty file cannot be mapped
+
+
+def _lex_range(lexer: CompiledLexer, source, start: int, end: int) -> tuple[array, array, array, int, bool]:
+    """lexes source[start:end] without reading past end
+
+    Returns:
+        (array, array, array, int, bool): the pattern index, start and end of each token, where the tokens stop being trustworthy
+        (the start of a token that could have continued past end, or end itself), and whether lexing hit a character no pattern matches
+    """
+    scan = lexer._scan if isinstance(source, str) else lexer._scan_bytes
+    pattern_indexes = array("H")
+    starts = array("q")
+    ends = array("q")
+    front = start
+    while front < end:
+        match_end, accept, may_extend = scan(source, front, end)
+        if may_extend:
+            break  # this lexeme might cross the boundary, so it is left for the caller to lex sequentially
+        if match_end < 0:
+            return pattern_indexes, starts, ends, front, True
+        pattern_indexes.append(accept)
+        starts.append(front)
+        ends.append(match_end)
+        front = match_end
+    return pattern_indexes, starts, ends, front, False
+
+
+def _lex_range_task(start: int, end: int) -> tuple[array, array, array, int, bool]:
+    return _lex_range(_worker_state["lexer"], _worker_state["source"], start, end)
+
+
+def _chunk_boundaries(source, sync_pattern: re.Pattern, chunk_size: int) -> list[int]:
+    """cuts the source just after a sync match roughly every chunk_size characters (or bytes)"""
+    boundaries = [0]
+    while boundaries[-1] + chunk_size < len(source):
+        match = sync_pattern.search(source, boundaries[-1] + chunk_size)
+        if match is None or match.end() >= len(source):
+            break
+        boundaries.append(match.end())
+    boundaries.append(len(source))
+    return boundaries
+
+
+def _sync_pattern_for(sync_pattern: re.Pattern | str, source) -> re.Pattern:
+    pattern = sync_pattern.pattern if isinstance(sync_pattern, re.Pattern) else sync_pattern
+    flags = sync_pattern.flags if isinstance(sync_pattern, re.Pattern) else 0
+    if isinstance(source, str):
+        return re.compile(pattern if isinstance(pattern, str) else pattern.decode("utf-8"), flags)
+    return re.compile(pattern.encode("utf-8") if isinstance(pattern, str) else pattern, flags & ~re.UNICODE)
+
+
+def lex_parallel(
+    source: str | os.PathLike,
+    pattern_to_type: CompiledLexer | dict[re.Pattern, TokenTag],
+    sync_pattern: re.Pattern | str,
+    type_to_extractor: dict[TokenTag, Callable[[str], any]] | None = None,
+    chunk_size: int = 1 << 22,
+    max_workers: int | None = None,
+    mp_context=None,
+) -> TokenBuffer:
+    """Lexes one large source across a pool of processes, giving the same tokens as lexing it sequentially
+
+    The source is cut into chunks just after matches of sync_pattern (e.g. a newline, or the ";" ending a statement), where lexemes are
+    not expected to continue. Each worker lexes its chunks without reading past their ends, and the chunks are stitched back together
+    in order. A lexeme that could have continued across a cut (or a cut that landed inside a lexeme) is detected, and lexing continues
+    sequentially from there until its tokens line up with the next chunk's again.
+
+    A lexer on the backtracking fallback (see CompiledLexer.uses_dfa) can never tell that a lexeme ends before a chunk does, so no chunk's
+    tokens could be trusted: such a source is lexed sequentially in this process, without starting a pool.
+
+    Args:
+        source (str | os.PathLike): the source text (str), or the path of a UTF-8 source file (any other path-like), which is mapped rather than read
+        pattern_to_type (CompiledLexer | dict[re.Pattern, TokenTag]): a compiled lexer, or a mapping of regex patterns to their respective tokens
+        sync_pattern (re.Pattern | str): a pattern after which lexing can safely restart
+        type_to_extractor (dict[TokenTag, Callable[[str], any]] | None): extractors for the values of the returned tokens
+        chunk_size (int): the rough size of each chunk, in characters (or bytes for a file)
+        max_workers (int | None): the number of worker processes, defaults to the number of processors
+        mp_context: the multiprocessing context used to start the workers
+
+    Returns:
+        TokenBuffer: the tokens of the whole source (offsets into a file are in bytes, and the buffer maps the file)
+    """
+    lexer = pattern_to_type if isinstance(pattern_to_type, CompiledLexer) else CompiledLexer(pattern_to_type)
+    text = source if isinstance(source, str) else _map_file(source)
+    if not lexer.uses_dfa:
+        return _stitch(lexer, text, [], TokenBuffer(text, type_to_extractor))
+    boundaries = _chunk_boundaries(text, _sync_pattern_for(sync_pattern, text), chunk_size)
+
+    if len(boundaries) > 2:
+        with ProcessPoolExecutor(
+            max_workers, mp_context, initializer=_init_split_worker, initargs=(lexer, source)
+        ) as executor:
+            chunks = list(executor.map(_lex_range_task, boundaries[:-1], boundaries[1:]))
+    else:
+        chunks = [_lex_range(lexer, text, 0, len(text))]
+
+    return _stitch(lexer, text, chunks, TokenBuffer(text, type_to_extractor))
+
+
+def _stitch(
+    lexer: CompiledLexer, text, chunks: list[tuple[array, array, array, int, bool]], tokens: TokenBuffer
+) -> TokenBuffer:
+    """appends the tokens of consecutive chunks to tokens, lexing sequentially wherever a chunk's tokens cannot be trusted"""
+    tag_ids = [tag.id for tag in lexer.tags]
+    scan = lexer._scan if isinstance(text, str) else lexer._scan_bytes
+    length = len(text)
+    position = 0  # everything before this has been lexed exactly as a sequential lexer would
+    for pattern_indexes, starts, ends, trusted_end, stopped in chunks:
+        index = bisect_left(starts, position)
+        # lex sequentially until a token starts where one of the chunk's tokens does, from which point the chunk's tokens are exact
+        while position < trusted_end and not (index < len(starts) and starts[index] == position):
+            match_end, accept, _ = scan(text, position, length)
+            if match_end < 0:
+                return tokens
+            tokens.append(position, match_end, lexer.tags[accept])
+            position = match_end
+            while index < len(starts) and starts[index] < position:
+                index += 1
+        if position < trusted_end:
+            tokens.tag_ids.extend(map(tag_ids.__getitem__, pattern_indexes[index:]))
+            tokens._starts.extend(starts[index:])
+            tokens._ends.extend(ends[index:])
+            position = trusted_end
+        if stopped and position == trusted_end:
+            return tokens
+
+    # the last chunk's final lexeme (if it was left untrusted) still needs lexing
+    while position < length:
+        match_end, accept, _ = scan(text, position, length)
+        if match_end < 0:
+            break
+        tokens.append(position, match_end, lexer.tags[accept])
+        position = match_end
+    return tokens
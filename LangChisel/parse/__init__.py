@@ -1 +1,16 @@
-from .ll1_parser import *
\ No newline at end of file
+from .grammar import *
+from .terminal_set import *
+from .grammar_analysis import *
+from .parse_error import *
+from .compiled_table import *
+from .ll1_parser import *
+from .syntax_tree_traversal import *
+from .syntax_tree import *
+from .streaming_parser import *
+from .syntax_tree_builder import *
+from .error_recovery import *
+from .incremental_parser import *
+from .lalr1_parser import *
+from .grammar_transforms import *
+from .grammar_cache import *
+from .parser_codegen import *
@@ -0,0 +1,194 @@
+from array import array
+
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token, TokenTag
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .grammar import *
+from .parse_error import *
+from .parse_error import _error_at
+
+
+class CompiledLL1Table:
+    def __init__(self, grammar: CFGrammar, parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]]):
+        """An LL(1) parse table flattened into ints, so a parse only ever compares and indexes ints
+
+        Terminals are numbered as columns (end of string is column 0, and a last column stands for any tag the grammar does not use) and
+        non-terminals as rows. The table is one dense array of rows x columns cells, each holding 1 + the index of the production to expand
+        by (0 where there is none). Every production's right hand-side is kept reversed as the codes to push onto the parse stack (all in
+        one flat array), with epsilon left out. On the stack, a terminal is its column, and a non-terminal is (row + 1) * the number of
+        columns, so a non-terminal's code plus the column of the next token (less one row) is the index of its cell.
+
+        Each cell is also unrolled into a step the first time it is used: expanding a non-terminal leaves another on top of the stack just as
+        often as not, and that one is expanded on the same lookahead, so the whole chain of expansions (up to a matched terminal, an empty
+        stack or an error) is known from the cell alone. The driver then emits a step's productions and pushes its codes in one go.
+
+        Args:
+            grammar (CFGrammar): the grammar the table was built for
+            parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]]): the table, as given by build_LL1_table
+        """
+        self.grammar = grammar
+        self.productions: list[CFProduction] = grammar.productions
+        production_index = {id(production): index for index, production in enumerate(self.productions)}
+
+        self.terminals: list[CFSymbol] = [grammar.end_of_string]
+        self.non_terminals: list[CFSymbol] = []
+        column_of: dict[CFSymbol, int] = {grammar.end_of_string: 0}
+        row_of: dict[CFSymbol, int] = {}
+        symbols = [production.from_symbol for production in self.productions]
+        symbols += [symbol for production in self.productions for symbol in production.to_sequence]
+        symbols += [terminal for row in parse_table.values() for terminal in row]
+        for symbol in symbols:
+            if symbol in column_of or symbol in row_of or symbol == grammar.epsilon:
+                continue
+            if is_terminal(symbol):
+                column_of[symbol] = len(self.terminals)
+                self.terminals.append(symbol)
+            else:
+                row_of[symbol] = len(self.non_terminals)
+                self.non_terminals.append(symbol)
+        width = len(self.terminals) + 1
+
+        def code(symbol: CFSymbol) -> int:
+            return column_of[symbol] if symbol in column_of else (row_of[symbol] + 1) * width
+
+        rhs_offsets = array("I", [0])
+        rhs_codes = array("i")
+        for production in self.productions:
+            rhs_codes.extend(code(symbol) for symbol in reversed(production.to_sequence) if symbol != grammar.epsilon)
+            rhs_offsets.append(len(rhs_codes))
+        cells = array("i", bytes(4 * len(self.non_terminals) * width))
+        for non_terminal, row in parse_table.items():
+            for terminal, production in row.items():
+                # a table built by build_LL1_table holds the grammar's own productions, anything else is matched by equality
+                index = production_index.get(id(production))
+                if index is None:
+                    index = self.productions.index(production)
+                cells[row_of[non_terminal] * width + column_of[terminal]] = index + 1
+        self._set_arrays(code(grammar.start_symbol), cells, rhs_offsets, rhs_codes)
+
+    @classmethod
+    def _from_arrays(
+        cls,
+        grammar: CFGrammar,
+        terminals: list[CFSymbol],
+        non_terminals: list[CFSymbol],
+        start_code: int,
+        cells: array,
+        rhs_offsets: array,
+        rhs_codes: array,
+    ) -> "CompiledLL1Table":
+        """a table put together from its columns, rows and arrays directly (e.g. read from a cache), without building anything per cell"""
+        table = cls.__new__(cls)
+        table.grammar = grammar
+        table.productions = grammar.productions
+        table.terminals = terminals
+        table.non_terminals = non_terminals
+        table._set_arrays(start_code, cells, rhs_offsets, rhs_codes)
+        return table
+
+    def _set_arrays(self, start_code: int, cells: array, rhs_offsets: array, rhs_codes: array) -> None:
+        self.unknown_column = len(self.terminals)
+        self.width = len(self.terminals) + 1
+        self.start_code = start_code
+        self.cells = cells
+        # the reversed right hand-side of production i is rhs_codes[rhs_offsets[i]:rhs_offsets[i + 1]]
+        self.rhs_offsets = rhs_offsets
+        self.rhs_codes = rhs_codes
+        # cell -> (the productions expanded, the codes left pushed (reversed), whether the lookahead token is matched), unrolled the
+        # first time the cell is used (None until then, and for good if the cell is empty)
+        self.steps: list[tuple[tuple[int, ...], tuple[int, ...], bool] | None] = [None] * len(cells)
+        self._column_by_tag = array("i")
+
+    def reversed_rhs(self, production: int) -> array:
+        """the codes of a production's right hand-side, last symbol first (epsilon left out)"""
+        return self.rhs_codes[self.rhs_offsets[production] : self.rhs_offsets[production + 1]]
+
+    def _step(self, cell: int) -> tuple[tuple[int, ...], tuple[int, ...], bool] | None:
+        if not self.cells[cell]:
+            return None
+        step = self.steps[cell] = self._unroll(cell)
+        return step
+
+    def _unroll(self, cell: int) -> tuple[tuple[int, ...], tuple[int, ...], bool]:
+        cells = self.cells
+        width = self.width
+        column = cell % width
+        expanded: list[int] = []
+        stack = [cell - column + width]
+        # a chain longer than the number of productions can only be a cycle (which would never stop parsing either), so it is cut short
+        while stack and len(expanded) <= len(self.productions):
+            code = stack.pop()
+            if code < width:
+                if code == column and code:
+                    return tuple(expanded), tuple(stack), True
+                stack.append(code)
+                break
+            production = cells[code - width + column]
+            if not production:
+                stack.append(code)
+                break
+            expanded.append(production - 1)
+            stack.extend(self.reversed_rhs(production - 1))
+        return tuple(expanded), tuple(stack), False
+
+    def __getstate__(self) -> dict:
+        # the cache of columns is indexed by TokenTag.id, so it is sent empty and column_by_tag refills it on first use
+        state = self.__dict__.copy()
+        state["_column_by_tag"] = array("i")
+        return state
+
+    def column_by_tag(self) -> array:
+        """the column of every interned tag, indexed by TokenTag.id (tags the grammar does not use get the unknown column)"""
+        column_by_tag = self._column_by_tag
+        if len(column_by_tag) < TokenTag.count():
+            column_by_tag.extend([self.unknown_column] * (TokenTag.count() - len(column_by_tag)))
+            for column, terminal in enumerate(self.terminals):
+                if isinstance(terminal.value, TokenTag):
+                    column_by_tag[terminal.value.id] = column
+        return column_by_tag
+
+    def derive_indexes(self, tokens: list[Token] | TokenBuffer, line_index: LineIndex | None = None) -> array:
+        """Find the left-most derivation of a sequence of tokens, as the indexes of its productions in the grammar
+
+        The tags are turned into columns up front, so the driver loop only indexes arrays. line_index is as for get_LL1_derivation_seq.
+        """
+        tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+        columns = list(map(self.column_by_tag().__getitem__, tag_ids))
+        columns.append(0)
+
+        steps = self.steps
+        width = self.width
+        derivation: list[int] = []
+        emit = derivation.extend
+        stack = [0, self.start_code]
+        pop = stack.pop
+        push = stack.extend
+        position = 0
+        column = columns[0]
+        while True:
+            code = pop()
+            if code >= width:
+                step = steps[code - width + column]
+                if step is None:
+                    step = self._step(code - width + column)
+                    if step is None:
+                        break
+                expanded, pushed, matched = step
+                emit(expanded)
+                push(pushed)
+                if matched:
+                    position += 1
+                    column = columns[position]
+            elif code == column and code:
+                position += 1
+                column = columns[position]
+            else:
+                break  # end of string is on top of the stack (the derivation is complete), or a terminal that does not match
+        if code != 0:
+            raise _error_at(tokens, position, line_index)
+        return array("I", derivation)
+
+    def derive(self, tokens: list[Token] | TokenBuffer, line_index: LineIndex | None = None) -> list[CFProduction]:
+        """Find the left-most derivation of a sequence of tokens, see derive_indexes"""
+        return list(map(self.productions.__getitem__, self.derive_indexes(tokens, line_index)))
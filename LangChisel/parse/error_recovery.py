@@ -0,0 +1,127 @@
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .compiled_table import *
+from .grammar import *
+from .grammar_analysis import GrammarAnalysis
+from .ll1_parser import SyntaxNode
+from .parse_error import *
+from .syntax_tree_builder import _child_positions
+from .terminal_set import TerminalSet
+
+
+def _follow_columns(
+    table: CompiledLL1Table, follow_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]]
+) -> list[frozenset[int]]:
+    """for each row of the table, the columns of the terminals that may follow its non-terminal"""
+    column_of = {terminal: column for column, terminal in enumerate(table.terminals)}
+    return [
+        frozenset(column_of[symbol] for symbol in follow_sets.get(non_terminal, ()) if symbol in column_of)
+        for non_terminal in table.non_terminals
+    ]
+
+
+def parse_with_recovery(
+    tokens: list[Token] | TokenBuffer,
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    follow_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]] | None = None,
+    max_errors: int = 100,
+    line_index: LineIndex | None = None,
+) -> tuple[SyntaxNode, list[ParseError]]:
+    """Parse a sequence of tokens into a syntax tree, recovering from syntax errors rather than stopping at the first
+
+    Recovery is in panic mode, with FOLLOW sets as the synchronising sets. Where a non-terminal has no production for the next token, tokens
+    are skipped until one it has a production for, or one that may follow it (in which case the non-terminal is given up on, and left
+    without children); where a terminal does not match, it is taken to be missing (and left without a token). A ParseError is recorded
+    when each error is found, and no more are recorded until a terminal matches again, so a single mistake is reported once however many
+    tokens it takes to recover from. Without errors, the tree is the same as parse_syntax_tree gives.
+
+    Args:
+        tokens (list[Token] | TokenBuffer): the tokens to parse
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        follow_sets (dict[CFSymbol, TerminalSet | list[CFSymbol]] | None): the grammar's FOLLOW sets, as given by
+            extract_LL1_follow_sets (they are worked out if not given)
+        max_errors (int): the parse stops, leaving the rest of the tree out, once this many errors have been recorded
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate each recorded error (taken from the tokens if
+            they are a TokenBuffer, as every error shares it)
+
+    Returns:
+        tuple[SyntaxNode, list[ParseError]]: the (possibly partial) tree, rooted at the grammar's start symbol, and every error found, in
+            order of the tokens
+    """
+    table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+    if follow_sets is None:
+        follow_sets = GrammarAnalysis(grammar).follow_sets
+    if line_index is None and isinstance(tokens, TokenBuffer):
+        line_index = tokens.line_index
+    follow_columns = _follow_columns(table, follow_sets)
+    tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+    columns = list(map(table.column_by_tag().__getitem__, tag_ids))
+    columns.append(0)
+
+    cells = table.cells
+    width = table.width
+    productions = table.productions
+    child_positions = _child_positions(table)
+    errors: list[ParseError] = []
+    recovering = False  # whether an error has been recorded that has not been recovered from yet
+
+    def record(message: str) -> None:
+        nonlocal recovering
+        if not recovering:
+            errors.append(ParseError(message, tokens[position] if position < len(tokens) else None, line_index))
+            recovering = True
+
+    root = SyntaxNode(grammar.start_symbol)
+    codes = [0, table.start_code]
+    nodes: list[SyntaxNode | None] = [None, root]
+    position = 0
+    column = columns[0]
+    # the height of the stack when a symbol was last given up on at this position: giving up on another is only allowed below it, as
+    # otherwise the stack has grown back and the parse would go round in circles without reading a token
+    stalled_height = len(codes) + 1
+    while codes and len(errors) < max_errors:
+        code = codes[-1]
+        if code >= width:
+            production = cells[code - width + column] - 1
+            if production >= 0:
+                codes.pop()
+                node = nodes.pop()
+                children = [SyntaxNode(symbol) for symbol in productions[production].to_sequence]
+                node.children = children
+                codes.extend(table.reversed_rhs(production))
+                nodes.extend([children[index] for index in child_positions[production]])
+                continue
+            give_up = column in follow_columns[code // width - 1] or column == 0
+            message = f"Unexpected token, {table.non_terminals[code // width - 1].value} left incomplete"
+        elif code == column and code:
+            codes.pop()
+            nodes.pop().token = tokens[position]
+            recovering = False
+            position += 1
+            column = columns[position]
+            stalled_height = len(codes) + 1
+            continue
+        elif code == 0:
+            break  # end of string is on top of the stack, so the tree is complete
+        else:
+            give_up = True  # take the terminal to be missing
+            message = f"Expected {table.terminals[code].value}"
+
+        if give_up and len(codes) < stalled_height:
+            record(message)
+            stalled_height = len(codes)
+            codes.pop()
+            nodes.pop()
+        elif column:
+            record("Unexpected token, skipped")
+            position += 1
+            column = columns[position]
+            stalled_height = len(codes) + 1
+        else:
+            record(message)
+            break  # at the end of the tokens, with nothing left to give up on
+    return root, errors
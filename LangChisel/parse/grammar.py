@@ -0,0 +1,107 @@
+import threading
+
+from LangChisel.lex.token import TokenTag
+
+
+class CFSymbol:
+    __slots__ = ("value", "id", "terminal")
+
+    _interned: dict[str | TokenTag | None, "CFSymbol"] = {}
+    _by_id: list["CFSymbol"] = []
+    _lock = threading.Lock()
+
+    def __new__(cls, value: str | TokenTag) -> "CFSymbol":
+        """A Single Context Free Symbol
+
+        Symbols are interned flyweights: the same value always gives back the same object, so equality is identity and every symbol has a
+        small integer id (stable for the life of the process) that grammar tables can be indexed by.
+
+        Args:
+            value (str): the name of the non-terminal or token of the terminal
+        """
+        symbol = cls._interned.get(value)
+        if symbol is None:
+            with cls._lock:
+                # looked up again, as another thread may have interned the value since
+                symbol = cls._interned.get(value)
+                if symbol is None:
+                    symbol = super().__new__(cls)
+                    symbol.value = value
+                    symbol.id = len(cls._by_id)
+                    symbol.terminal = isinstance(value, TokenTag)
+                    cls._by_id.append(symbol)
+                    cls._interned[value] = symbol
+        return symbol
+
+    @classmethod
+    def from_id(cls, id: int) -> "CFSymbol":
+        """the interned symbol with the given id"""
+        return cls._by_id[id]
+
+    def __reduce__(self):
+        # the value goes through the constructor on unpickling, so the symbol is interned with the receiving process's id
+        return (CFSymbol, (self.value,))
+
+    def __repr__(self) -> str:
+        return f"(CFSymbol: {self.value})"
+
+
+class CFProduction:
+    def __init__(self, from_symbol: CFSymbol, to_sequence: list[CFSymbol]):
+        """A Production Rule defining a possible transition from one symbol to a sequence of other symbols
+
+        Args:
+            from_symbol (CFSymbol): The 'left hand-side' of this derivation, what the derviation 'derives from'
+            to_sequence (list[CFSymbol]): The 'right hand-side' of this derivation, what the derivation 'derives to'
+        """
+        self.from_symbol = from_symbol
+        self.to_sequence = to_sequence
+
+    def __repr__(self) -> str:
+        return f"(CFProduction: {self.from_symbol} => {self.to_sequence})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CFProduction):
+            return (
+                self.from_symbol == other.from_symbol
+                and self.to_sequence == other.to_sequence
+            )
+        return False
+
+    def __hash__(self) -> int:
+        return hash((self.from_symbol, tuple(self.to_sequence)))
+
+
+class CFGrammar:
+    def __init__(
+        self,
+        productions: list[CFProduction],
+        start_symbol: CFSymbol,
+        epsilon: CFSymbol,
+        end_of_string: CFSymbol,
+    ):
+        """A Context Free Grammar, defined by a series of productions, alongside  start symbol, epsilon, and end of string definitions"""
+        self.productions = productions
+        self.start_symbol = start_symbol
+        self.epsilon = epsilon
+        self.end_of_string = end_of_string
+
+
+def get_non_terminals(derivations: list[CFProduction]) -> list[CFSymbol]:
+    """ """
+    return list(set([production.from_symbol for production in derivations]))
+
+
+def get_terminals(derivations: list[CFProduction]) -> list[CFSymbol]:
+    """ """
+    terminals = []
+    for production in derivations:
+        for symbol in production.to_sequence:
+            if is_terminal(symbol):
+                terminals.append(symbol)
+    return list(set(terminals))
+
+
+def is_terminal(symbol: CFSymbol) -> bool:
+    """ """
+    return symbol.terminal
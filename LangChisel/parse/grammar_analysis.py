@@ -0,0 +1,175 @@
+from collections import deque
+
+from .grammar import *
+from .terminal_set import *
+
+
+class GrammarAnalysis:
+    def __init__(self, grammar: CFGrammar):
+        """The nullable symbols, First sets and Follow sets of a grammar, computed together as fixed points
+
+        The productions are indexed once (the productions of each left hand-side symbol, and every position each symbol occurs at in a right
+        hand-side), then each property is grown from its seeds with a worklist, so a symbol is only revisited when something it depends on
+        has changed. This takes time close to linear in the size of the grammar, and is exact on grammars whose symbols depend on each
+        other in cycles (e.g. mutual recursion). Each property is computed the first time it is asked for, and the sets are TerminalSets,
+        so growing them is a matter of int operations.
+
+        Args:
+            grammar (CFGrammar): the grammar to analyse
+        """
+        self.grammar = grammar
+        # every symbol of the grammar, in order of first appearance
+        self.symbols: list[CFSymbol] = []
+        # lhs -> the indexes of its productions
+        self.productions_by_lhs: dict[CFSymbol, list[int]] = {}
+        # symbol -> every (production index, position) it occurs at in a right hand-side
+        self.occurrences: dict[CFSymbol, list[tuple[int, int]]] = {}
+
+        seen: set[CFSymbol] = set()
+        for index, production in enumerate(grammar.productions):
+            self.productions_by_lhs.setdefault(production.from_symbol, []).append(index)
+            for symbol in (production.from_symbol, *production.to_sequence):
+                if symbol not in seen:
+                    seen.add(symbol)
+                    self.symbols.append(symbol)
+            for position, symbol in enumerate(production.to_sequence):
+                self.occurrences.setdefault(symbol, []).append((index, position))
+
+        # the columns of the grammar's TerminalSets
+        self.columns = TerminalColumns.of_grammar(grammar)
+
+        self._nullable: set[CFSymbol] | None = None
+        self._first_sets: dict[CFSymbol, TerminalSet] | None = None
+        self._follow_sets: dict[CFSymbol, TerminalSet] | None = None
+
+    @property
+    def nullable(self) -> set[CFSymbol]:
+        """the symbols that can derive the empty string (epsilon included)"""
+        if self._nullable is None:
+            self._nullable = self._compute_nullable()
+        return self._nullable
+
+    @property
+    def first_sets(self) -> dict[CFSymbol, TerminalSet]:
+        """First(X) for every symbol X of the grammar, holding epsilon if X is nullable"""
+        if self._first_sets is None:
+            self._first_sets = self._compute_first_sets()
+        return self._first_sets
+
+    @property
+    def follow_sets(self) -> dict[CFSymbol, TerminalSet]:
+        """Follow(A) for every non-terminal A with productions"""
+        if self._follow_sets is None:
+            self._follow_sets = self.compute_follow_sets(self.first_sets)
+        return self._follow_sets
+
+    def _compute_nullable(self) -> set[CFSymbol]:
+        productions = self.grammar.productions
+        epsilon = self.grammar.epsilon
+        # for each production, how many symbols of its right hand-side are not yet known to be nullable
+        remaining = [len(production.to_sequence) for production in productions]
+        nullable = {epsilon}
+        worklist = deque([epsilon])
+        while worklist:
+            symbol = worklist.popleft()
+            for index, _ in self.occurrences.get(symbol, ()):
+                remaining[index] -= 1
+                from_symbol = productions[index].from_symbol
+                if remaining[index] == 0 and from_symbol not in nullable:
+                    nullable.add(from_symbol)
+                    worklist.append(from_symbol)
+        return nullable
+
+    def _compute_first_sets(self) -> dict[CFSymbol, TerminalSet]:
+        productions = self.grammar.productions
+        epsilon = self.grammar.epsilon
+        columns = self.columns
+        epsilon_bit = columns.bit(epsilon)
+        nullable = self.nullable
+
+        # the sets are grown as plain ints, First(a) = {a} and First(epsilon) = {epsilon}, while a non-terminal starts with epsilon only
+        # if it is nullable
+        first_bits: dict[CFSymbol, int] = {}
+        for symbol in self.symbols:
+            if is_terminal(symbol) or symbol == epsilon:
+                first_bits[symbol] = columns.bit(symbol)
+            else:
+                first_bits[symbol] = epsilon_bit if symbol in nullable else 0
+
+        # First(A) contains First(B) if A -> w B ... and every symbol of w is nullable, recorded as an edge B -> A
+        dependants: dict[CFSymbol, set[CFSymbol]] = {}
+        for production in productions:
+            for symbol in production.to_sequence:
+                if symbol != production.from_symbol:
+                    dependants.setdefault(symbol, set()).add(production.from_symbol)
+                if symbol not in nullable:
+                    break
+
+        # each symbol's First set flows along its edges (without epsilon) until nothing changes
+        worklist = deque(self.symbols)
+        queued = set(self.symbols)
+        while worklist:
+            symbol = worklist.popleft()
+            queued.discard(symbol)
+            flowing = first_bits[symbol] & ~epsilon_bit
+            for dependant in dependants.get(symbol, ()):
+                if flowing & ~first_bits[dependant]:
+                    first_bits[dependant] |= flowing
+                    if dependant not in queued:
+                        queued.add(dependant)
+                        worklist.append(dependant)
+        return {symbol: TerminalSet(bits=bits, columns=columns) for symbol, bits in first_bits.items()}
+
+    def compute_follow_sets(
+        self, first_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]]
+    ) -> dict[CFSymbol, TerminalSet]:
+        """computes the Follow sets of the grammar's non-terminals from the given First sets
+
+        Args:
+            first_sets (dict[CFSymbol, TerminalSet | list[CFSymbol]]): the First set of every symbol of the grammar
+
+        Returns:
+            dict[CFSymbol, TerminalSet]: Follow(A) for every non-terminal A with productions
+        """
+        grammar = self.grammar
+        epsilon = grammar.epsilon
+        columns = self.columns
+        epsilon_bit = columns.bit(epsilon)
+        first_bits = {symbol: columns.bits(first_set) for symbol, first_set in first_sets.items()}
+        follow_bits: dict[CFSymbol, int] = {symbol: 0 for symbol in self.symbols if symbol != epsilon}
+        if grammar.start_symbol in follow_bits:
+            follow_bits[grammar.start_symbol] |= columns.bit(grammar.end_of_string)
+
+        # for A -> w B v: Follow(B) gets First(v) without epsilon, and if v can vanish, Follow(B) contains Follow(A) (an edge A -> B)
+        dependants: dict[CFSymbol, set[CFSymbol]] = {}
+        for production in grammar.productions:
+            from_symbol = production.from_symbol
+            suffix_first = 0
+            suffix_nullable = True
+            for symbol in reversed(production.to_sequence):
+                if symbol != epsilon:
+                    follow_bits[symbol] |= suffix_first
+                    if suffix_nullable and symbol != from_symbol:
+                        dependants.setdefault(from_symbol, set()).add(symbol)
+                first_symbol = first_bits[symbol]
+                if first_symbol & epsilon_bit:
+                    suffix_first |= first_symbol & ~epsilon_bit
+                else:
+                    suffix_first = first_symbol
+                    suffix_nullable = False
+
+        worklist = deque(dependants)
+        queued = set(dependants)
+        while worklist:
+            symbol = worklist.popleft()
+            queued.discard(symbol)
+            flowing = follow_bits[symbol]
+            for dependant in dependants.get(symbol, ()):
+                if flowing & ~follow_bits[dependant]:
+                    follow_bits[dependant] |= flowing
+                    if dependant not in queued:
+                        queued.add(dependant)
+                        worklist.append(dependant)
+
+        # Follow is only defined for non-terminals
+        return {symbol: TerminalSet(bits=follow_bits[symbol], columns=columns) for symbol in self.productions_by_lhs}
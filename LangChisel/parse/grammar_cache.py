@@ -0,0 +1,345 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from LangChisel.lex.token import TokenTag
+
+from .compiled_table import *
+from .grammar import *
+from .grammar_analysis import *
+from .ll1_parser import build_LL1_table
+from .terminal_set import *
+
+_MAGIC = b"LCGT"
+_VERSION = 1
+# magic, version, byte order, grammar fingerprint, then the counts: symbols, productions, columns, rows, start code, bytes per set,
+# right hand-side codes
+_HEADER = struct.Struct("<4sIc32s7Q")
+_BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+_CHECKSUM_SIZE = 32
+
+
+def _encode_symbol(symbol: CFSymbol) -> bytes:
+    value = symbol.value
+    if isinstance(value, TokenTag):
+        encoded = ["tag", value.identifier]
+    elif value is None or isinstance(value, str):
+        encoded = ["symbol", value]
+    else:
+        encoded = ["repr", repr(value)]
+    return json.dumps(encoded).encode("utf-8")
+
+
+def grammar_fingerprint(grammar: CFGrammar) -> str:
+    """A content hash of a grammar: its productions (in order), start symbol, epsilon and end of string
+
+    Two grammars built separately from the same definitions (in any process) have the same fingerprint.
+
+    Args:
+        grammar (CFGrammar): the grammar to fingerprint
+
+    Returns:
+        str: the SHA-256 of the grammar's contents, in hex
+    """
+    encoded: dict[CFSymbol, bytes] = {}
+
+    def encode(symbol: CFSymbol) -> bytes:
+        if symbol not in encoded:
+            encoded[symbol] = _encode_symbol(symbol)
+        return encoded[symbol]
+
+    # each symbol is a JSON array, so joining them with separators JSON never leaves unquoted is unambiguous
+    parts = [encode(grammar.start_symbol), encode(grammar.epsilon), encode(grammar.end_of_string)]
+    for production in grammar.productions:
+        parts.append(b";" + encode(production.from_symbol) + b":")
+        parts.append(b",".join(map(encode, production.to_sequence)))
+    return hashlib.sha256(b"".join(parts)).hexdigest()
+
+
+def _grammar_symbols(grammar: CFGrammar) -> list[CFSymbol]:
+    """every symbol of the grammar, numbered by order of first appearance (the numbering a cache file uses, as symbol ids differ between
+    processes)"""
+    symbols = {}
+    for production in grammar.productions:
+        symbols.setdefault(production.from_symbol)
+        for symbol in production.to_sequence:
+            symbols.setdefault(symbol)
+    for symbol in (grammar.start_symbol, grammar.epsilon, grammar.end_of_string):
+        symbols.setdefault(symbol)
+    return list(symbols)
+
+
+class GrammarTables:
+    def __init__(
+        self,
+        grammar: CFGrammar,
+        first_sets: dict[CFSymbol, TerminalSet] | None,
+        follow_sets: dict[CFSymbol, TerminalSet] | None,
+        compiled_table: CompiledLL1Table,
+        parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | None = None,
+    ):
+        """The First sets, Follow sets and LL(1) parse table of a grammar, as computed by build_grammar_tables or read from a cache file
+
+        Tables read from a cache only hold the cached arrays, and turn them back into sets and dicts the first time they are asked for.
+
+        Args:
+            grammar (CFGrammar): the grammar the tables belong to
+            first_sets (dict[CFSymbol, TerminalSet] | None): the First sets, None to decode them from the cache when first asked for
+            follow_sets (dict[CFSymbol, TerminalSet] | None): the Follow sets, None to decode them from the cache when first asked for
+            compiled_table (CompiledLL1Table): the compiled parse table
+            parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | None): the parse table, None to rebuild it from compiled_table
+        """
+        self.grammar = grammar
+        self.compiled_table = compiled_table
+        self._first_sets = first_sets
+        self._follow_sets = follow_sets
+        self._parse_table = parse_table
+        # what a cache file holds for the sets: the grammar's numbering of symbols, and which symbols have a set, and the bits of each set
+        self._cached_sets: tuple[list[CFSymbol], int, bytes, bytes, memoryview, memoryview] | None = None
+
+    @property
+    def first_sets(self) -> dict[CFSymbol, TerminalSet]:
+        """First(X) for every symbol X of the grammar, as extract_LL1_first_sets gives them"""
+        if self._first_sets is None:
+            symbols, set_size, first_present, _, first_bits, _ = self._cached_sets
+            self._first_sets = _decode_sets(symbols, set_size, first_present, first_bits, TerminalColumns.of_grammar(self.grammar))
+        return self._first_sets
+
+    @property
+    def follow_sets(self) -> dict[CFSymbol, TerminalSet]:
+        """Follow(A) for every non-terminal A of the grammar, as extract_LL1_follow_sets gives them"""
+        if self._follow_sets is None:
+            symbols, set_size, _, follow_present, _, follow_bits = self._cached_sets
+            self._follow_sets = _decode_sets(symbols, set_size, follow_present, follow_bits, TerminalColumns.of_grammar(self.grammar))
+        return self._follow_sets
+
+    @property
+    def parse_table(self) -> dict[CFSymbol, dict[CFSymbol, CFProduction]]:
+        """the parse table as build_LL1_table gives it"""
+        if self._parse_table is None:
+            table = self.compiled_table
+            rows = {non_terminal: row for row, non_terminal in enumerate(table.non_terminals)}
+            self._parse_table = {}
+            for production in self.grammar.productions:
+                non_terminal = production.from_symbol
+                if non_terminal not in self._parse_table:
+                    start = rows[non_terminal] * table.width
+                    cells = table.cells[start : start + len(table.terminals)]
+                    self._parse_table[non_terminal] = {
+                        table.terminals[column]: table.productions[cell - 1] for column, cell in enumerate(cells) if cell
+                    }
+        return self._parse_table
+
+
+def _decode_sets(
+    symbols: list[CFSymbol], set_size: int, present: bytes, bits: memoryview, columns: TerminalColumns
+) -> dict[CFSymbol, TerminalSet]:
+    sets = {}
+    for index, symbol in enumerate(symbols):
+        if present[index]:
+            local = int.from_bytes(bits[index * set_size : (index + 1) * set_size], "little")
+            members = []
+            while local:
+                lowest = local & -local
+                members.append(symbols[lowest.bit_length() - 1])
+                local ^= lowest
+            sets[symbol] = TerminalSet(members, columns=columns)
+    return sets
+
+
+def _encode_sets(
+    symbols: list[CFSymbol], local_index: dict[CFSymbol, int], set_size: int, sets: dict[CFSymbol, TerminalSet]
+) -> tuple[bytes, bytes]:
+    present = bytearray(len(symbols))
+    bits = bytearray(len(symbols) * set_size)
+    for symbol, symbol_set in sets.items():
+        index = local_index[symbol]
+        present[index] = 1
+        local = 0
+        for member in symbol_set:
+            local |= 1 << local_index[member]
+        bits[index * set_size : (index + 1) * set_size] = local.to_bytes(set_size, "little")
+    return bytes(present), bytes(bits)
+
+
+def build_grammar_tables(grammar: CFGrammar) -> GrammarTables:
+    """Computes the First and Follow sets and the (compiled) LL(1) parse table of a grammar
+
+    Args:
+        grammar (CFGrammar): the grammar to analyse
+
+    Returns:
+        GrammarTables: the sets and tables of the grammar (build_LL1_table's ValueError is raised if the grammar is not LL(1))
+    """
+    analysis = GrammarAnalysis(grammar)
+    parse_table = build_LL1_table(grammar, analysis.first_sets, analysis.follow_sets)
+    return GrammarTables(grammar, analysis.first_sets, analysis.follow_sets, CompiledLL1Table(grammar, parse_table), parse_table)
+
+
+def write_grammar_tables(tables: GrammarTables, path: str | os.PathLike) -> None:
+    """Writes the sets and tables of a grammar to a cache file (replacing any file at path in one step)
+
+    The file holds a header (a magic number, the format version, the byte order and the grammar's fingerprint), then the arrays of the
+    compiled table and the sets as raw bytes, then a SHA-256 checksum of all that comes before it. Symbols are numbered by their first
+    appearance in the grammar rather than by their ids, which differ between processes.
+
+    Args:
+        tables (GrammarTables): the tables to write
+        path (str | os.PathLike): where to write them
+    """
+    grammar = tables.grammar
+    table = tables.compiled_table
+    symbols = _grammar_symbols(grammar)
+    local_index = {symbol: index for index, symbol in enumerate(symbols)}
+    set_size = (len(symbols) + 7) // 8
+    first_present, first_bits = _encode_sets(symbols, local_index, set_size, tables.first_sets)
+    follow_present, follow_bits = _encode_sets(symbols, local_index, set_size, tables.follow_sets)
+
+    header = _HEADER.pack(
+        _MAGIC,
+        _VERSION,
+        _BYTE_ORDER,
+        bytes.fromhex(grammar_fingerprint(grammar)),
+        len(symbols),
+        len(table.productions),
+        len(table.terminals),
+        len(table.non_terminals),
+        table.start_code,
+        set_size,
+        len(table.rhs_codes),
+    )
+    content = b"".join(
+        [
+            header,
+            array("i", [local_index[symbol] for symbol in table.terminals]).tobytes(),
+            array("i", [local_index[symbol] for symbol in table.non_terminals]).tobytes(),
+            table.rhs_offsets.tobytes(),
+            table.rhs_codes.tobytes(),
+            table.cells.tobytes(),
+            first_present,
+            follow_present,
+            first_bits,
+            follow_bits,
+        ]
+    )
+    temporary_path = f"{os.fspath(path)}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(content)
+        file.write(hashlib.sha256(content).digest())
+    os.replace(temporary_path, path)
+
+
+def read_grammar_tables(grammar: CFGrammar, path: str | os.PathLike) -> GrammarTables | None:
+    """Reads the sets and tables of a grammar from a cache file written by write_grammar_tables
+
+    The file is mapped and checked against its checksum, then each array is copied out of it whole; nothing is built per symbol or per
+    cell until it is used.
+
+    Args:
+        grammar (CFGrammar): the grammar the file should hold the tables of
+        path (str | os.PathLike): the cache file
+
+    Returns:
+        GrammarTables | None: the tables, or None if the file is missing, corrupt, from another version or byte order, or for another grammar
+    """
+    return _read_grammar_tables(grammar, path, grammar_fingerprint(grammar))
+
+
+def _read_grammar_tables(grammar: CFGrammar, path: str | os.PathLike, fingerprint: str) -> GrammarTables | None:
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _read_mapped(grammar, mapped, fingerprint)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _read_mapped(grammar: CFGrammar, mapped: mmap.mmap, expected_fingerprint: str) -> GrammarTables | None:
+    if len(mapped) < _HEADER.size + _CHECKSUM_SIZE:
+        return None
+    magic, version, byte_order, fingerprint, n_symbols, n_productions, n_columns, n_rows, start_code, set_size, n_rhs_codes = (
+        _HEADER.unpack_from(mapped)
+    )
+    if magic != _MAGIC or version != _VERSION or byte_order != _BYTE_ORDER:
+        return None
+    if fingerprint.hex() != expected_fingerprint:
+        return None
+    view = memoryview(mapped)
+    try:
+        if hashlib.sha256(view[:-_CHECKSUM_SIZE]).digest() != view[-_CHECKSUM_SIZE:]:
+            return None
+
+        position = _HEADER.size
+
+        def take(typecode: str, count: int) -> array:
+            nonlocal position
+            taken = array(typecode)
+            taken.frombytes(view[position : position + count * taken.itemsize])
+            if len(taken) != count:
+                raise ValueError("truncated cache file")
+            position += count * taken.itemsize
+            return taken
+
+        terminal_indexes = take("i", n_columns)
+        non_terminal_indexes = take("i", n_rows)
+        rhs_offsets = take("I", n_productions + 1)
+        rhs_codes = take("i", n_rhs_codes)
+        cells = take("i", n_rows * (n_columns + 1))
+        first_present = take("B", n_symbols).tobytes()
+        follow_present = take("B", n_symbols).tobytes()
+        set_bits = take("B", 2 * n_symbols * set_size).tobytes()
+        if position != len(view) - _CHECKSUM_SIZE:
+            return None
+    finally:
+        view.release()
+
+    symbols = _grammar_symbols(grammar)
+    compiled_table = CompiledLL1Table._from_arrays(
+        grammar,
+        [symbols[index] for index in terminal_indexes],
+        [symbols[index] for index in non_terminal_indexes],
+        start_code,
+        cells,
+        rhs_offsets,
+        rhs_codes,
+    )
+    tables = GrammarTables(grammar, None, None, compiled_table)
+    bits = memoryview(set_bits)
+    tables._cached_sets = (
+        symbols,
+        set_size,
+        first_present,
+        follow_present,
+        bits[: n_symbols * set_size],
+        bits[n_symbols * set_size :],
+    )
+    return tables
+
+
+def load_grammar_tables(grammar: CFGrammar, cache_dir: str | os.PathLike) -> GrammarTables:
+    """Loads the sets and tables of a grammar from a cache directory, computing (and caching) them if they are missing or stale
+
+    Each grammar has its own file, named after its fingerprint, so a changed grammar never picks up the tables of its old version, and
+    a cache file that cannot be used (corrupt, truncated, or from another version of this format) is rebuilt.
+
+    Args:
+        grammar (CFGrammar): the grammar to load the tables of
+        cache_dir (str | os.PathLike): the directory of cache files, created if needed
+
+    Returns:
+        GrammarTables: the sets and tables of the grammar
+    """
+    fingerprint = grammar_fingerprint(grammar)
+    path = os.path.join(cache_dir, f"{fingerprint}.lcgt")
+    tables = _read_grammar_tables(grammar, path, fingerprint)
+    if tables is None:
+        tables = build_grammar_tables(grammar)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_grammar_tables(tables, path)
+        except OSError:
+            pass  # an unwritable cache only costs the next process a rebuild
+    return tables
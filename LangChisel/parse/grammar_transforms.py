@@ -0,0 +1,492 @@
+from typing import Callable, Sequence
+
+from .grammar import *
+from .grammar_analysis import GrammarAnalysis
+from .ll1_parser import SyntaxNode, _sequence_first_bits
+from .terminal_set import TerminalSet
+
+# A transformed grammar's productions each carry a rule for turning the nodes they expand back into nodes of the original grammar. The
+# children of a node are restored first, each to a list of nodes (or, for the new symbol of an eliminated left recursion, a _Tail), then:
+#   ("build", item)  the node becomes the nodes built from item (see _Item)
+#   ("splice",)      the node becomes its children's nodes, leaving out epsilon (the new symbol of a left factoring)
+#   ("tail", item)   the node becomes its last child's _Tail, with a step built from item added
+#   ("tail_end",)    the node becomes an empty _Tail
+# Productions without a rule are the original's, and are kept as they are.
+_Rule = tuple
+
+# Nodes are built from an item: the index of a child (standing for its restored nodes), a node template (symbol, [items]), or
+# ("rotate", item, index), the node built from item, wrapped in a node for each step of the _Tail at index in turn.
+_Item = int | tuple
+
+
+class _Tail:
+    def __init__(self) -> None:
+        # (item, restored children) for each step of a left recursion, innermost first
+        self.steps: list[tuple[_Item, list]] = []
+
+
+def _build(item: _Item, children: list) -> list[SyntaxNode]:
+    if isinstance(item, int):
+        return children[item]
+    if item[0] == "rotate":
+        node = _build(item[1], children)[0]
+        # each step's item has the node built so far as its child 0
+        for step, step_children in reversed(children[item[2]].steps):
+            node = _build(step, [[node], *step_children])[0]
+        return [node]
+    symbol, items = item
+    nodes: list[SyntaxNode] = []
+    for child in items:
+        nodes.extend(_build(child, children))
+    return [SyntaxNode(symbol, children=nodes)]
+
+
+def _remap(item: _Item, leaf: Callable[[int], _Item]) -> _Item:
+    """item with the index of each child replaced by leaf(index)"""
+    if isinstance(item, int):
+        return leaf(item)
+    if item[0] == "rotate":
+        return ("rotate", _remap(item[1], leaf), leaf(item[2]))
+    return (item[0], [_remap(child, leaf) for child in item[1]])
+
+
+def _identity(production: CFProduction) -> _Item:
+    return (production.from_symbol, list(range(len(production.to_sequence))))
+
+
+class GrammarTransform:
+    def __init__(self, source: CFGrammar, grammar: CFGrammar, rules: dict[tuple[CFSymbol, tuple[CFSymbol, ...]], _Rule]) -> None:
+        """A grammar transformed from another, along with the mapping from the trees it parses back to trees of the original
+
+        Args:
+            source (CFGrammar): the original grammar
+            grammar (CFGrammar): the transformed grammar
+            rules (dict[tuple[CFSymbol, tuple[CFSymbol, ...]], _Rule]): (left hand-side, right hand-side) -> how to restore a node expanded
+                by that production, for each production of the transformed grammar that is not one of the original's
+        """
+        self.source = source
+        self.grammar = grammar
+        self._rules = rules
+
+    def restore(self, root: SyntaxNode) -> SyntaxNode:
+        """Turns a tree of the transformed grammar into the tree of the same tokens in the original grammar, without recursing
+
+        Terminal (and other childless) nodes are taken over as they are, so the restored tree holds the same tokens.
+
+        Args:
+            root (SyntaxNode): the root of a complete tree parsed with the transformed grammar
+
+        Returns:
+            SyntaxNode: the root of the tree in the original grammar
+        """
+        rules = self._rules
+        epsilon = self.grammar.epsilon
+        values: list = []  # the restored form of each node whose parent is yet to be restored, in order
+        stack = [(root, False)]
+        while stack:
+            node, children_restored = stack.pop()
+            if not node.children:
+                values.append([node])
+            elif not children_restored:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+            else:
+                children = values[len(values) - len(node.children) :]
+                del values[len(values) - len(node.children) :]
+                rule = rules.get((node.symbol, tuple(child.symbol for child in node.children)))
+                if rule is None:
+                    values.append([SyntaxNode(node.symbol, node.token, [nodes for child in children for nodes in child])])
+                elif rule[0] == "build":
+                    values.append(_build(rule[1], children))
+                elif rule[0] == "splice":
+                    values.append([nodes for child in children for nodes in child if nodes.symbol != epsilon])
+                elif rule[0] == "tail":
+                    tail = children[-1]
+                    tail.steps.append((rule[1], children[:-1]))
+                    values.append(tail)
+                else:
+                    values.append(_Tail())
+        return values[0][0]
+
+
+class GrammarTransformChain(GrammarTransform):
+    def __init__(self, transforms: list[GrammarTransform]) -> None:
+        """Transforms applied one after another, each to the grammar of the one before, restoring trees through each in turn
+
+        Args:
+            transforms (list[GrammarTransform]): the transforms, in the order they were applied
+        """
+        super().__init__(transforms[0].source, transforms[-1].grammar, {})
+        self.transforms = transforms
+
+    def restore(self, root: SyntaxNode) -> SyntaxNode:
+        for transform in reversed(self.transforms):
+            root = transform.restore(root)
+        return root
+
+
+def _fresh_symbol(name: str, taken: set) -> CFSymbol:
+    """a non-terminal named after name that is none of the names in taken (and is added to them)"""
+    while name in taken:
+        name += "'"
+    taken.add(name)
+    return CFSymbol(name)
+
+
+def _names(grammar: CFGrammar) -> set:
+    return {symbol.value for production in grammar.productions for symbol in (production.from_symbol, *production.to_sequence)}
+
+
+def _drop_epsilon(sequence: list[CFSymbol], item: _Item, epsilon: CFSymbol) -> tuple[list[CFSymbol], _Item]:
+    """sequence without epsilon, and item (over a node with children for sequence) over the children left, building epsilon instead"""
+    if epsilon not in sequence:
+        return list(sequence), item
+    new_index: dict[int, int] = {}
+    for index, symbol in enumerate(sequence):
+        if symbol != epsilon:
+            new_index[index] = len(new_index)
+    kept = [symbol for symbol in sequence if symbol != epsilon]
+    return kept, _remap(item, lambda index: new_index[index] if index in new_index else (epsilon, []))
+
+
+def _finish(source: CFGrammar, productions: list[tuple[CFProduction, _Rule | None]], start: CFSymbol | None = None) -> GrammarTransform:
+    """the transform to productions (each with its rule), leaving out repeats and the productions of symbols that cannot be reached"""
+    start = start or source.start_symbol
+    by_lhs: dict[CFSymbol, list[tuple[CFProduction, _Rule | None]]] = {}
+    seen: set[tuple[CFSymbol, tuple[CFSymbol, ...]]] = set()
+    for production, rule in productions:
+        key = (production.from_symbol, tuple(production.to_sequence))
+        if key not in seen:  # a production reached in two ways (only possible in an ambiguous grammar) keeps the first
+            seen.add(key)
+            by_lhs.setdefault(production.from_symbol, []).append((production, rule))
+    reached = {start}
+    worklist = [start]
+    while worklist:
+        for production, _ in by_lhs.get(worklist.pop(), ()):
+            for symbol in production.to_sequence:
+                if symbol not in reached:
+                    reached.add(symbol)
+                    worklist.append(symbol)
+
+    kept: list[CFProduction] = []
+    rules: dict[tuple[CFSymbol, tuple[CFSymbol, ...]], _Rule] = {}
+    for lhs, entries in by_lhs.items():
+        if lhs in reached:
+            for production, rule in entries:
+                kept.append(production)
+                if rule is not None:
+                    rules[(lhs, tuple(production.to_sequence))] = rule
+    return GrammarTransform(source, CFGrammar(kept, start, source.epsilon, source.end_of_string), rules)
+
+
+def collapse_unit_productions(grammar: CFGrammar) -> GrammarTransform:
+    """Replaces each unit production A -> B (whose right hand-side is a single non-terminal) with A -> w for each production B -> w that
+    is not a unit production itself, following chains of them, so derivations skip the steps through B
+
+    Args:
+        grammar (CFGrammar): the grammar to transform
+
+    Returns:
+        GrammarTransform: the grammar without unit productions (or the symbols only reached through them)
+    """
+    by_lhs: dict[CFSymbol, list[CFProduction]] = {}
+    for production in grammar.productions:
+        by_lhs.setdefault(production.from_symbol, []).append(production)
+
+    def is_unit(production: CFProduction) -> bool:
+        return len(production.to_sequence) == 1 and production.to_sequence[0] in by_lhs
+
+    productions: list[tuple[CFProduction, _Rule | None]] = []
+    for production in grammar.productions:
+        if not is_unit(production):
+            productions.append((production, None))
+            continue
+        lhs = production.from_symbol
+        # the chains of unit productions from this one, shortest first, taking each non-unit production at the end of one
+        chains = [[production.to_sequence[0]]]
+        visited = {lhs, production.to_sequence[0]}
+        for chain in chains:  # (extended as it goes)
+            for target in by_lhs[chain[-1]]:
+                if not is_unit(target):
+                    item = _identity(target)
+                    for symbol in reversed(chain[:-1]):
+                        item = (symbol, [item])
+                    productions.append((CFProduction(lhs, list(target.to_sequence)), ("build", (lhs, [item]))))
+                elif target.to_sequence[0] not in visited:
+                    visited.add(target.to_sequence[0])
+                    chains.append(chain + [target.to_sequence[0]])
+    return _finish(grammar, productions)
+
+
+def _epsilon_items(grammar: CFGrammar, nullable: set[CFSymbol]) -> dict[CFSymbol, _Item]:
+    """for epsilon and each nullable non-terminal, the item of its shallowest derivation of nothing"""
+    items: dict[CFSymbol, _Item] = {grammar.epsilon: (grammar.epsilon, [])}
+    depths = {grammar.epsilon: 0}
+    changed = True
+    while changed:
+        changed = False
+        for production in grammar.productions:
+            lhs, sequence = production.from_symbol, production.to_sequence
+            if lhs in nullable and all(symbol in depths for symbol in sequence):
+                depth = 1 + max((depths[symbol] for symbol in sequence), default=0)
+                if depth < depths.get(lhs, depth + 1):
+                    depths[lhs] = depth
+                    items[lhs] = (lhs, [items[symbol] for symbol in sequence])
+                    changed = True
+    return items
+
+
+def inline_epsilon_productions(grammar: CFGrammar) -> GrammarTransform:
+    """Removes the productions to epsilon, giving each production a copy without each combination of the nullable symbols in it instead
+
+    Derivations then take no steps that derive nothing, which suits LR parsing (an LL(1) table usually needs the productions to epsilon
+    to tell the rest apart). If the start symbol is nullable it keeps a production to epsilon, under a new start symbol if it is used in
+    a right hand-side as well.
+
+    Args:
+        grammar (CFGrammar): the grammar to transform
+
+    Returns:
+        GrammarTransform: the grammar without productions to epsilon, restoring the derivations of nothing that were left out
+    """
+    epsilon = grammar.epsilon
+    nullable = GrammarAnalysis(grammar).nullable - {epsilon}
+    epsilon_items = _epsilon_items(grammar, nullable)
+
+    productions: list[tuple[CFProduction, _Rule | None]] = []
+    for production in grammar.productions:
+        sequence, item = _drop_epsilon(production.to_sequence, _identity(production), epsilon)
+        optional = [index for index, symbol in enumerate(sequence) if symbol in nullable]
+        for combination in range(1 << len(optional)):
+            left_out = {optional[bit] for bit in range(len(optional)) if combination >> bit & 1}
+            if len(left_out) == len(sequence):
+                continue
+            if not left_out and sequence == production.to_sequence:
+                productions.append((production, None))
+                continue
+            new_index: dict[int, int] = {}
+            for index in range(len(sequence)):
+                if index not in left_out:
+                    new_index[index] = len(new_index)
+            kept = [symbol for index, symbol in enumerate(sequence) if index not in left_out]
+            kept_item = _remap(item, lambda index: new_index[index] if index in new_index else epsilon_items[sequence[index]])
+            productions.append((CFProduction(production.from_symbol, kept), ("build", kept_item)))
+
+    start = grammar.start_symbol
+    new_start = start
+    if start in nullable:
+        if any(start in production.to_sequence for production in grammar.productions):
+            new_start = _fresh_symbol(f"{start.value}'", _names(grammar))
+            productions.append((CFProduction(new_start, [start]), ("splice",)))
+        productions.append((CFProduction(new_start, [epsilon]), ("build", epsilon_items[start])))
+
+    # symbols that only ever derived nothing are left with no productions, so every copy still using one is dropped
+    while True:
+        derived = {production.from_symbol for production, _ in productions} | {epsilon}
+        kept_productions = [
+            entry for entry in productions if all(symbol.terminal or symbol in derived for symbol in entry[0].to_sequence)
+        ]
+        if len(kept_productions) == len(productions):
+            return _finish(grammar, kept_productions, new_start)
+        productions = kept_productions
+
+
+def left_factor(grammar: CFGrammar) -> GrammarTransform:
+    """Factors the longest common prefix out of the productions of a symbol that start with the same symbol, e.g. A -> a b | a c into
+    A -> a A' and A' -> b | c, until no two productions of a symbol start the same way (a certain LL(1) conflict otherwise)
+
+    Args:
+        grammar (CFGrammar): the grammar to transform
+
+    Returns:
+        GrammarTransform: the factored grammar, splicing the new symbols' children back into their parents
+    """
+    epsilon = grammar.epsilon
+    taken = _names(grammar)
+    pending: dict[CFSymbol, list[tuple[CFProduction, _Rule | None]]] = {}
+    for production in grammar.productions:
+        pending.setdefault(production.from_symbol, []).append((production, None))
+
+    productions: list[tuple[CFProduction, _Rule | None]] = []
+    worklist = list(pending)
+    while worklist:  # (new symbols are added to it, to be factored in turn)
+        lhs = worklist.pop(0)
+        groups: dict[CFSymbol, list[tuple[CFProduction, _Rule | None]]] = {}
+        for entry in pending.pop(lhs):
+            groups.setdefault(entry[0].to_sequence[0] if entry[0].to_sequence else epsilon, []).append(entry)
+        for first, group in groups.items():
+            if len(group) == 1 or first == epsilon:
+                productions.extend(group)
+                continue
+            prefix = list(group[0][0].to_sequence)
+            for production, _ in group[1:]:
+                length = 0
+                while length < min(len(prefix), len(production.to_sequence)) and prefix[length] == production.to_sequence[length]:
+                    length += 1
+                del prefix[length:]
+            helper = _fresh_symbol(f"{lhs.value}'", taken)
+            productions.append((CFProduction(lhs, prefix + [helper]), group[0][1]))  # (a new symbol's are spliced in turn)
+            pending[helper] = [
+                (CFProduction(helper, production.to_sequence[len(prefix) :] or [epsilon]), ("splice",)) for production, _ in group
+            ]
+            worklist.append(helper)
+    return _finish(grammar, productions)
+
+
+def eliminate_left_recursion(grammar: CFGrammar) -> GrammarTransform:
+    """Removes left recursion: direct left recursion A -> A a | b becomes A -> b A' and A' -> a A' | epsilon, and indirect left recursion
+    is made direct first, by replacing the B a production A -> B c starts with by each of B's productions, where B can lead back to A (as
+    in Paull's algorithm)
+
+    Left-deep trees of the original grammar come out right-deep, and are turned back around when restored.
+
+    Args:
+        grammar (CFGrammar): the grammar to transform
+
+    Returns:
+        GrammarTransform: the grammar without left recursion
+
+    Raises:
+        ValueError: if left recursion remains, through symbols that derive nothing (e.g. A -> B A where B is nullable)
+    """
+    epsilon = grammar.epsilon
+    taken = _names(grammar)
+    # each symbol's productions as they stand, with the item restoring them (or the rule, for a new symbol's)
+    current: dict[CFSymbol, list[tuple[CFProduction, _Item]]] = {}
+    for production in grammar.productions:
+        current.setdefault(production.from_symbol, []).append((production, _identity(production)))
+    order = list(current)
+
+    def leads_back(symbol: CFSymbol, lhs: CFSymbol) -> bool:
+        reached, worklist = {symbol}, [symbol]
+        while worklist:
+            for production, _ in current.get(worklist.pop(), ()):
+                first = production.to_sequence[0]
+                if first == lhs:
+                    return True
+                if first in current and first not in reached:
+                    reached.add(first)
+                    worklist.append(first)
+        return False
+
+    for index, lhs in enumerate(order):
+        earlier = set(order[:index])
+        changed = True
+        while changed:  # (a substituted production may start with another such symbol)
+            changed = False
+            substituted: list[tuple[CFProduction, _Item]] = []
+            for production, item in current[lhs]:
+                first = production.to_sequence[0]
+                if first not in earlier or not leads_back(first, lhs):
+                    substituted.append((production, item))
+                    continue
+                changed = True
+                for inner_production, inner_item in current[first]:
+                    inner, inner_item = _drop_epsilon(inner_production.to_sequence, inner_item, epsilon)
+                    shift = len(inner) - 1
+                    outer = _remap(item, lambda child: inner_item if child == 0 else child + shift)
+                    substituted.append((CFProduction(lhs, inner + production.to_sequence[1:] or [epsilon]), outer))
+            current[lhs] = substituted
+
+        recursive = [(production, item) for production, item in current[lhs] if production.to_sequence[0] == lhs]
+        if not recursive:
+            continue
+        helper = _fresh_symbol(f"{lhs.value}'", taken)
+        rotated: list[tuple[CFProduction, _Item]] = []
+        for production, item in current[lhs]:
+            if production.to_sequence[0] != lhs:
+                sequence, item = _drop_epsilon(production.to_sequence, item, epsilon)
+                rotated.append((CFProduction(lhs, sequence + [helper]), ("rotate", item, len(sequence))))
+        current[lhs] = rotated
+        current[helper] = [
+            (CFProduction(helper, production.to_sequence[1:] + [helper]), ("tail", item))
+            for production, item in recursive
+            if len(production.to_sequence) > 1  # A -> A derives nothing new
+        ]
+        current[helper].append((CFProduction(helper, [epsilon]), ("tail_end",)))
+
+    productions: list[tuple[CFProduction, _Rule | None]] = []
+    for entries in current.values():
+        for production, item in entries:
+            if item[0] in ("tail", "tail_end"):
+                productions.append((production, item))
+            else:
+                productions.append((production, None if item == _identity(production) else ("build", item)))
+    transform = _finish(grammar, productions)
+    symbol = _left_recursive(transform.grammar)
+    if symbol is not None:
+        raise ValueError(f"Left recursion at {symbol} cannot be eliminated, as it is through symbols that derive nothing")
+    return transform
+
+
+def _left_recursive(grammar: CFGrammar) -> CFSymbol | None:
+    """a non-terminal that can derive a sequence starting with itself, if any"""
+    nullable = GrammarAnalysis(grammar).nullable
+    corners: dict[CFSymbol, set[CFSymbol]] = {production.from_symbol: set() for production in grammar.productions}
+    for production in grammar.productions:
+        for symbol in production.to_sequence:
+            if symbol in corners:
+                corners[production.from_symbol].add(symbol)
+            if symbol not in nullable:
+                break
+    for symbol in corners:
+        reached, worklist = set(), [symbol]
+        while worklist:
+            for corner in corners[worklist.pop()]:
+                if corner == symbol:
+                    return symbol
+                if corner not in reached:
+                    reached.add(corner)
+                    worklist.append(corner)
+    return None
+
+
+def LL1_conflicts(grammar: CFGrammar) -> list[tuple[CFSymbol, CFSymbol]]:
+    """Finds the cells of the grammar's LL(1) table that more than one production would claim (where build_LL1_table stops at the first)
+
+    Each production claims its row's cells in the order build_LL1_table fills them: First of its right hand-side, then, if all of it can
+    derive epsilon, Follow of its left hand-side (which may clash with the first).
+
+    Args:
+        grammar (CFGrammar): the grammar
+
+    Returns:
+        list[tuple[CFSymbol, CFSymbol]]: (non-terminal, terminal) for each conflicting cell
+    """
+    analysis = GrammarAnalysis(grammar)
+    first_bits = {symbol: first_set.bits for symbol, first_set in analysis.first_sets.items()}
+    epsilon_bit = analysis.columns.bit(grammar.epsilon)
+    filled: dict[CFSymbol, int] = {}
+    conflicts: dict[CFSymbol, int] = {}
+    for production in grammar.productions:
+        lhs = production.from_symbol
+        first_set = _sequence_first_bits(production.to_sequence, first_bits, epsilon_bit)
+        claims = [first_set & ~epsilon_bit]
+        if first_set & epsilon_bit:
+            claims.append(analysis.follow_sets[lhs].bits)
+        for terminals in claims:
+            conflicts[lhs] = conflicts.get(lhs, 0) | filled.get(lhs, 0) & terminals
+            filled[lhs] = filled.get(lhs, 0) | terminals
+    return [(lhs, terminal) for lhs, bits in conflicts.items() for terminal in TerminalSet(bits=bits, columns=analysis.columns)]
+
+
+def transform_grammar(
+    grammar: CFGrammar,
+    passes: Sequence[Callable[[CFGrammar], GrammarTransform]] = (eliminate_left_recursion, left_factor, collapse_unit_productions),
+) -> GrammarTransformChain:
+    """Applies a sequence of transformation passes to a grammar, each to the grammar the one before gave
+
+    The default passes make a grammar more likely to be LL(1) and shorten its derivations; inline_epsilon_productions shortens them
+    further, for LR parsing.
+
+    Args:
+        grammar (CFGrammar): the grammar to transform
+        passes (Sequence[Callable[[CFGrammar], GrammarTransform]]): the passes, in order
+
+    Returns:
+        GrammarTransformChain: the transforms, whose restore turns trees of the final grammar into trees of the original
+    """
+    transforms = []
+    for transform_pass in passes:
+        transforms.append(transform_pass(transforms[-1].grammar if transforms else grammar))
+    return GrammarTransformChain(transforms)
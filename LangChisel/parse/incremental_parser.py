@@ -0,0 +1,245 @@
+from array import array
+from typing import Callable
+
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .compiled_table import *
+from .grammar import *
+from .ll1_parser import SyntaxNode
+from .parse_error import _error_at
+from .syntax_tree_builder import _child_positions
+
+
+def count_syntax_tree_tokens(root: SyntaxNode) -> int:
+    """Gives every node of a tree its token_count (the number of tokens it spans), without recursing
+
+    Only nodes without a count are counted (along with their children), so counting a tree in which most subtrees are already counted
+    costs only as much as the rest.
+
+    Args:
+        root (SyntaxNode): the root of the tree
+
+    Returns:
+        int: the number of tokens the whole tree spans
+    """
+    stack = [(root, False)]
+    while stack:
+        node, children_counted = stack.pop()
+        if node.token_count is not None:
+            continue
+        if children_counted:
+            node.token_count = 1 if node.token is not None else sum(child.token_count for child in node.children)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if child.token_count is None)
+    return root.token_count
+
+
+class _ReuseCursor:
+    def __init__(self, root: SyntaxNode, start: int = 0) -> None:
+        """A cursor over a counted tree that finds the nodes starting at a given token, only ever moving forward through the tree
+
+        Subtrees that end before the token asked for are stepped over whole, and only those around it are stepped into, so a sequence of
+        lookups at increasing tokens costs about the depth of the tree, plus the subtrees that start at each token.
+
+        Args:
+            root (SyntaxNode): the root of the tree (or of a subtree), with every node counted (see count_syntax_tree_tokens)
+            start (int): the index of the root's first token
+        """
+        self._stack = [(root, start)]  # nodes yet to be passed, with the index of their first token, the next to be passed on top
+
+    def find(self, symbol: CFSymbol, position: int) -> SyntaxNode | None:
+        """the outermost node for symbol that starts at the token at position (positions must not decrease between calls)"""
+        stack = self._stack
+        while stack:
+            node, start = stack[-1]
+            end = start + node.token_count
+            if end < position or (end == position and start < position):
+                stack.pop()  # ends before position
+            elif start < position:
+                stack.pop()  # starts before position, so any node starting at position is within it
+                starts = []
+                for child in node.children:
+                    starts.append(start)
+                    start += child.token_count
+                stack.extend(zip(reversed(node.children), reversed(starts)))
+            else:
+                break
+
+        # the nodes starting at position are those on top of the stack that do, and their descendants that start with them
+        for node, start in reversed(stack):
+            if start != position:
+                break
+            candidates = [node]
+            while candidates:
+                node = candidates.pop()
+                if node.symbol == symbol:
+                    return node
+                # the children that start at position are the first up to (and including) the first to span a token
+                starting = []
+                for child in node.children:
+                    starting.append(child)
+                    if child.token_count:
+                        break
+                candidates.extend(reversed(starting))
+        return None
+
+
+def _column_reader(tokens: list[Token] | TokenBuffer, column_by_tag: array) -> Callable[[int], int]:
+    """a function from the index of a token to its column in a table, the end of the tokens being column 0"""
+    length = len(tokens)
+    if isinstance(tokens, TokenBuffer):
+        tag_ids = tokens.tag_ids
+
+        def column(position: int) -> int:
+            return column_by_tag[tag_ids[position]] if position < length else 0
+
+    else:
+
+        def column(position: int) -> int:
+            return column_by_tag[tokens[position].tag.id] if position < length else 0
+
+    return column
+
+
+def reparse_syntax_tree(
+    tree: SyntaxNode,
+    old_tokens: list[Token] | TokenBuffer,
+    new_tokens: list[Token] | TokenBuffer,
+    edited: tuple[int, int],
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
+) -> SyntaxNode:
+    """Parse a sequence of tokens into a syntax tree, reusing the subtrees of the tree of an earlier version of the tokens that are unchanged
+
+    Only the deepest node of the old tree that encloses the edit is parsed again (LL(1) parsing being deterministic, the parse up to it is
+    the same as before, and so is the parse after it if it ends where it did, less the tokens taken out and plus those put in); if it does
+    not end there, its parent is tried instead, and so on up to the root. The nodes enclosing it are copied with the new node in place of
+    the old. Within the node, before a non-terminal is expanded, the old tree is looked up for a node of the same non-terminal starting at
+    the same token (counting from the start of the tokens before the edit, and from the end after it). If none of the tokens that node spans
+    were edited, and the token following it is the same as well, its subtree is exactly what expanding the non-terminal would give, so it is
+    taken as it is. The work done is then about that of parsing the edited tokens (and whatever they change the parse of), plus a step for
+    each node enclosing them.
+
+    Reused subtrees are shared with the old tree (which is left as it was), so their tokens are those of old_tokens, equal to the new tokens
+    but with offsets in the old source.
+
+    Args:
+        tree (SyntaxNode): the complete tree of old_tokens, as given by parse_syntax_tree or reparse_syntax_tree
+        old_tokens (list[Token] | TokenBuffer): the tokens the old tree was parsed from
+        new_tokens (list[Token] | TokenBuffer): the tokens to parse
+        edited (tuple[int, int]): the range [start, end) of old_tokens replaced in new_tokens, by new_tokens[start : end + len(new_tokens) -
+            len(old_tokens)] (e.g. (i, i) for tokens inserted before old_tokens[i])
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        line_index (LineIndex | None): the line index of the new tokens' source, used to locate a failing token
+
+    Returns:
+        SyntaxNode: the root of the new tree, with every node's token_count
+    """
+    edit_start, old_edit_end = edited
+    shift = len(new_tokens) - len(old_tokens)
+    new_edit_end = old_edit_end + shift
+    if not 0 <= edit_start <= old_edit_end <= len(old_tokens) or new_edit_end < edit_start:
+        raise ValueError(f"{edited} is not a range of the old tokens that the new tokens could have replaced")
+
+    table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+    column_by_tag = table.column_by_tag()
+    new_column = _column_reader(new_tokens, column_by_tag)
+    old_column = _column_reader(old_tokens, column_by_tag)
+    cells = table.cells
+    width = table.width
+    productions = table.productions
+    child_positions = _child_positions(table)
+    code_of = {symbol: (row + 1) * width for row, symbol in enumerate(table.non_terminals)}
+
+    def derive(node: SyntaxNode, code: int, position: int, bottom: int, cursor: _ReuseCursor) -> tuple[bool, int]:
+        """expands node (for code) from the token at position, until bottom is popped; gives whether it was, and the position reached"""
+        codes = [bottom, code]
+        nodes: list[SyntaxNode | None] = [None, node]
+        column = new_column(position)
+        while True:
+            code = codes.pop()
+            node = nodes.pop()
+            if code >= width:
+                # where the node would start in the old tokens, if not among the edited ones
+                old_position = position if position < edit_start else position - shift if position >= new_edit_end else -1
+                if old_position >= 0:
+                    old = cursor.find(node.symbol, old_position)
+                    if old is not None:
+                        old_end = old_position + old.token_count
+                        if (old_end <= edit_start or old_position >= old_edit_end) and old_column(old_end) == new_column(
+                            position + old.token_count
+                        ):
+                            node.children = old.children
+                            node.token = old.token
+                            node.token_count = old.token_count
+                            position += old.token_count
+                            column = new_column(position)
+                            continue
+                production = cells[code - width + column] - 1
+                if production < 0:
+                    break
+                children = [SyntaxNode(symbol) for symbol in productions[production].to_sequence]
+                node.children = children
+                codes.extend(table.reversed_rhs(production))
+                nodes.extend([children[index] for index in child_positions[production]])
+            elif code == column and code:
+                node.token = new_tokens[position]
+                node.token_count = 1
+                position += 1
+                column = new_column(position)
+            else:
+                break  # bottom is on top of the stack (the node is complete), or a terminal that does not match
+        return code == bottom, position
+
+    count_syntax_tree_tokens(tree)
+    # the path from the root to the deepest non-terminal enclosing the edit, as (node, index of its first token, index among its siblings),
+    # leaving out any starting at the edit whose first token has changed (the parse before them would have looked ahead at it)
+    path = [(tree, 0, -1)]
+    node, start = tree, 0
+    while True:
+        enclosing = None
+        child_start = start
+        for index, child in enumerate(node.children):
+            child_end = child_start + child.token_count
+            if child_start > edit_start:
+                break
+            if (
+                child_end >= old_edit_end
+                and child.symbol in code_of
+                and (child_start < edit_start or old_column(edit_start) == new_column(edit_start))
+            ):
+                enclosing = (child, child_start, index)
+                break
+            child_start = child_end
+        if enclosing is None:
+            break
+        path.append(enclosing)
+        node, start = enclosing[0], enclosing[1]
+
+    for depth in range(len(path) - 1, 0, -1):
+        old, start, _ = path[depth]
+        new = SyntaxNode(old.symbol)
+        parsed, end = derive(new, code_of[old.symbol], start, -1, _ReuseCursor(old, start))
+        if parsed and end == start + old.token_count + shift:
+            break
+    else:
+        depth = 0
+        new = SyntaxNode(grammar.start_symbol)
+        parsed, end = derive(new, table.start_code, 0, 0, _ReuseCursor(tree))
+        if not parsed:
+            raise _error_at(new_tokens, end, line_index)
+    count_syntax_tree_tokens(new)
+
+    # copy the nodes enclosing the new one, with it in place of the old
+    for depth in range(depth - 1, -1, -1):
+        old = path[depth][0]
+        copy = SyntaxNode(old.symbol, old.token, list(old.children))
+        copy.children[path[depth + 1][2]] = new
+        copy.token_count = old.token_count + shift
+        new = copy
+    return new
@@ -0,0 +1,312 @@
+from array import array
+
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token, TokenTag
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .grammar import *
+from .grammar_analysis import GrammarAnalysis
+from .ll1_parser import SyntaxNode
+from .parse_error import _error_at
+
+
+class LALR1Table:
+    def __init__(self, grammar: CFGrammar) -> None:
+        """An LALR(1) parse table for a grammar, as action and goto tables of ints for a shift-reduce parser
+
+        The LR(0) automaton is built first, then the lookaheads of its items are worked out by propagation: the closure of each kernel item
+        is taken with a placeholder lookahead, which shows the lookaheads it generates spontaneously (for the kernel items of the states it
+        leads to, and for its completed items) and those that pass through from the kernel item unchanged; the spontaneous ones are then
+        carried along the propagation links until nothing changes. Lookaheads are sets of terminal columns held as int bitmasks.
+
+        Left-recursive grammars are taken as they are (e.g. E -> E + T, with no E' chains), and parse in fewer steps, into shallower trees,
+        than their right-recursive LL(1) rewrites. Terminals are numbered as columns as in CompiledLL1Table (end of string is column 0, and
+        the last column stands for any tag the grammar does not use), and non-terminals as rows. actions holds a cell for each state and
+        column: 0 is an error, n > 0 shifts to state n - 1, and n < 0 reduces by production -n - 1 (reducing by the production after the
+        grammar's last accepts). gotos holds a cell for each state and row, 1 + the state to go to after reducing to the row's non-terminal.
+
+        Args:
+            grammar (CFGrammar): the grammar to build the table for
+
+        Raises:
+            ValueError: if the grammar is not LALR(1), naming the conflict, or if a non-terminal it uses has no productions
+        """
+        self.grammar = grammar
+        self.productions: list[CFProduction] = grammar.productions
+        epsilon = grammar.epsilon
+        analysis = GrammarAnalysis(grammar)
+
+        self.terminals: list[CFSymbol] = [grammar.end_of_string]
+        self.non_terminals: list[CFSymbol] = []
+        column_of: dict[CFSymbol, int] = {grammar.end_of_string: 0}
+        row_of: dict[CFSymbol, int] = {}
+        for symbol in [grammar.start_symbol, *analysis.symbols]:
+            if symbol in column_of or symbol in row_of or symbol == epsilon:
+                continue
+            if is_terminal(symbol):
+                column_of[symbol] = len(self.terminals)
+                self.terminals.append(symbol)
+            else:
+                row_of[symbol] = len(self.non_terminals)
+                self.non_terminals.append(symbol)
+        self.unknown_column = len(self.terminals)
+        self.width = len(self.terminals) + 1
+        self._column_by_tag = array("i")
+
+        # right hand-sides without epsilon, with the start production (start' -> start) after the grammar's
+        accept = len(self.productions)
+        rhs = [tuple(symbol for symbol in production.to_sequence if symbol != epsilon) for production in self.productions]
+        rhs.append((grammar.start_symbol,))
+        by_lhs: dict[CFSymbol, list[int]] = {}
+        for index, production in enumerate(self.productions):
+            by_lhs.setdefault(production.from_symbol, []).append(index)
+        for symbol in self.non_terminals:
+            if symbol not in by_lhs:
+                raise ValueError(f"Non-terminal {symbol.value} has no productions, so no LALR(1) table can be built for it")
+
+        # First(X) as columns, and for each item (production, dot), First and nullability of what follows the symbol after the dot
+        first_bits = {symbol: 1 << column for symbol, column in column_of.items()}
+        for symbol, first in analysis.first_sets.items():
+            if symbol in row_of:
+                first_bits[symbol] = sum(1 << column_of[terminal] for terminal in first if terminal in column_of)
+        nullable = analysis.nullable
+        tail_first: list[list[int]] = []
+        tail_nullable: list[list[bool]] = []
+        for sequence in rhs:
+            bits, empty = 0, True
+            firsts, nullables = [0] * len(sequence), [True] * len(sequence)
+            for dot in range(len(sequence) - 1, -1, -1):
+                firsts[dot], nullables[dot] = bits, empty
+                symbol = sequence[dot]
+                bits = first_bits.get(symbol, 0) | (bits if symbol in nullable else 0)
+                empty = empty and symbol in nullable
+            tail_first.append(firsts)
+            tail_nullable.append(nullables)
+
+        # the LR(0) automaton, each state identified by its kernel (a sorted tuple of items)
+        kernels: list[tuple[tuple[int, int], ...]] = [((accept, 0),)]
+        state_of = {kernels[0]: 0}
+        transitions: list[dict[CFSymbol, int]] = []
+        for kernel in kernels:  # (grows as states are found)
+            items = list(kernel)
+            seen = set(items)
+            moves: dict[CFSymbol, list[tuple[int, int]]] = {}
+            for production, dot in items:  # (grows with the closure)
+                if dot < len(rhs[production]):
+                    symbol = rhs[production][dot]
+                    moves.setdefault(symbol, []).append((production, dot + 1))
+                    for added in by_lhs.get(symbol, ()):
+                        if (added, 0) not in seen:
+                            seen.add((added, 0))
+                            items.append((added, 0))
+            targets = {}
+            for symbol, moved in moves.items():
+                target = tuple(sorted(moved))
+                if target not in state_of:
+                    state_of[target] = len(kernels)
+                    kernels.append(target)
+                targets[symbol] = state_of[target]
+            transitions.append(targets)
+
+        # the closure of each kernel item under a placeholder lookahead, giving the spontaneous lookaheads and the propagation links
+        placeholder = 1 << self.width
+        lookaheads: list[dict[tuple[int, int], int]] = [dict.fromkeys(kernel, 0) for kernel in kernels]
+        lookaheads[0][(accept, 0)] = 1  # end of string
+        links: dict[tuple[int, tuple[int, int]], list[tuple[int, tuple[int, int]]]] = {}
+        # (state, production) -> (the lookaheads of the completed item, the kernel items that pass theirs to it)
+        completed: dict[tuple[int, int], tuple[int, list[tuple[int, int]]]] = {}
+        for state, kernel in enumerate(kernels):
+            for kernel_item in kernel:
+                closure = {kernel_item: placeholder}
+                worklist = [kernel_item]
+                while worklist:
+                    production, dot = worklist.pop()
+                    sequence = rhs[production]
+                    if dot < len(sequence) and sequence[dot] in row_of:
+                        bits = tail_first[production][dot] | (closure[production, dot] if tail_nullable[production][dot] else 0)
+                        for added in by_lhs[sequence[dot]]:
+                            known = closure.get((added, 0))
+                            if known is None or bits & ~known:
+                                closure[added, 0] = bits | (known or 0)
+                                worklist.append((added, 0))
+                for (production, dot), bits in closure.items():
+                    if dot < len(rhs[production]):
+                        target = (transitions[state][rhs[production][dot]], (production, dot + 1))
+                        lookaheads[target[0]][target[1]] |= bits & ~placeholder
+                        if bits & placeholder:
+                            links.setdefault((state, kernel_item), []).append(target)
+                    else:
+                        spontaneous, sources = completed.setdefault((state, production), (0, []))
+                        if bits & placeholder:
+                            sources.append(kernel_item)
+                        completed[state, production] = (spontaneous | (bits & ~placeholder), sources)
+
+        worklist = [(state, item) for state, kernel in enumerate(kernels) for item in kernel]
+        while worklist:
+            state, item = worklist.pop()
+            bits = lookaheads[state][item]
+            for target_state, target_item in links.get((state, item), ()):
+                if bits & ~lookaheads[target_state][target_item]:
+                    lookaheads[target_state][target_item] |= bits
+                    worklist.append((target_state, target_item))
+
+        # the tables, shifts first, then reductions (any clash being a conflict)
+        self.state_count = len(kernels)
+        width = self.width
+        rows = len(self.non_terminals)
+        actions = array("i", bytes(4 * self.state_count * width))
+        gotos = array("i", bytes(4 * self.state_count * rows))
+        for state, targets in enumerate(transitions):
+            for symbol, target in targets.items():
+                if symbol in row_of:
+                    gotos[state * rows + row_of[symbol]] = target + 1
+                else:
+                    actions[state * width + column_of[symbol]] = target + 1
+        for (state, production), (bits, sources) in sorted(completed.items()):
+            for source in sources:
+                bits |= lookaheads[state][source]
+            column = 0
+            while bits:
+                if bits & 1:
+                    cell = state * width + column
+                    if actions[cell] and actions[cell] != -production - 1:
+                        kind = "shift-reduce" if actions[cell] > 0 else "reduce-reduce"
+                        reduced = self.productions[production] if production < accept else grammar.start_symbol
+                        raise ValueError(
+                            f"{kind.capitalize()} conflict in LALR(1) table at state {state}, {self.terminals[column]}, reducing by {reduced}"
+                        )
+                    actions[cell] = -production - 1
+                bits >>= 1
+                column += 1
+        self.actions = actions
+        self.gotos = gotos
+        self.rhs_lengths = array("I", [len(sequence) for sequence in rhs])
+        self.lhs_rows = array("i", [row_of[production.from_symbol] for production in self.productions] + [-1])
+
+    def __getstate__(self) -> dict:
+        # the tag id -> column array is sent empty, and column_by_tag fills it in for the receiving process's ids
+        state = self.__dict__.copy()
+        state["_column_by_tag"] = array("i")
+        return state
+
+    def column_by_tag(self) -> array:
+        """the column of every interned tag, indexed by TokenTag.id (tags the grammar does not use get the unknown column)"""
+        column_by_tag = self._column_by_tag
+        if len(column_by_tag) < TokenTag.count():
+            column_by_tag.extend([self.unknown_column] * (TokenTag.count() - len(column_by_tag)))
+            for column, terminal in enumerate(self.terminals):
+                if isinstance(terminal.value, TokenTag):
+                    column_by_tag[terminal.value.id] = column
+        return column_by_tag
+
+    def _columns(self, tokens: list[Token] | TokenBuffer) -> list[int]:
+        tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+        columns = list(map(self.column_by_tag().__getitem__, tag_ids))
+        columns.append(0)
+        return columns
+
+    def derive_indexes(self, tokens: list[Token] | TokenBuffer, line_index: LineIndex | None = None) -> array:
+        """Find the right-most derivation of a sequence of tokens, in the order it is reduced (i.e. reversed), as indexes into the productions
+
+        Unlike the LL(1) parsers, every token must be taken up, and a ParseError is raised at the first that cannot be.
+
+        Args:
+            tokens (list[Token] | TokenBuffer): the tokens to parse
+            line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token
+
+        Returns:
+            array: the index of each production reduced by, in order
+        """
+        columns = self._columns(tokens)
+        actions = self.actions
+        gotos = self.gotos
+        width = self.width
+        rows = len(self.non_terminals)
+        rhs_lengths = self.rhs_lengths
+        lhs_rows = self.lhs_rows
+        accept = len(self.productions)
+        reductions = array("I")
+        states = [0]
+        position = 0
+        column = columns[0]
+        while True:
+            action = actions[states[-1] * width + column]
+            if action > 0:
+                states.append(action - 1)
+                position += 1
+                column = columns[position]
+            elif action < 0:
+                production = -action - 1
+                if production == accept:
+                    return reductions
+                reductions.append(production)
+                length = rhs_lengths[production]
+                if length:
+                    del states[-length:]
+                states.append(gotos[states[-1] * rows + lhs_rows[production]] - 1)
+            else:
+                raise _error_at(tokens, position, line_index)
+
+    def derive(self, tokens: list[Token] | TokenBuffer, line_index: LineIndex | None = None) -> list[CFProduction]:
+        """Find the right-most derivation of a sequence of tokens, in the order it is reduced, as productions (see derive_indexes)"""
+        return list(map(self.productions.__getitem__, self.derive_indexes(tokens, line_index)))
+
+
+def parse_LALR1_syntax_tree(
+    tokens: list[Token] | TokenBuffer, grammar: CFGrammar, table: LALR1Table, line_index: LineIndex | None = None
+) -> SyntaxNode:
+    """Parse a sequence of tokens into a syntax tree with a shift-reduce parser
+
+    The tree is built bottom up: a shift makes a node for its token, and a reduction makes a node for the production's left hand-side,
+    taking the nodes on top of the stack as its children (with a node for epsilon, as the LL(1) trees have, for a production to epsilon).
+
+    Args:
+        tokens (list[Token] | TokenBuffer): the tokens to parse
+        grammar (CFGrammar): the grammar to parse with
+        table (LALR1Table): the grammar's table
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate the token no action is defined for
+
+    Returns:
+        SyntaxNode: the root of the tree, for the grammar's start symbol
+    """
+    columns = table._columns(tokens)
+    actions = table.actions
+    gotos = table.gotos
+    width = table.width
+    rows = len(table.non_terminals)
+    rhs_lengths = table.rhs_lengths
+    lhs_rows = table.lhs_rows
+    productions = table.productions
+    accept = len(productions)
+    epsilon = grammar.epsilon
+    # the productions with epsilon in their right hand-side, whose children are not just the nodes on the stack
+    with_epsilon = {index for index, production in enumerate(productions) if epsilon in production.to_sequence}
+    terminals = table.terminals
+
+    states = [0]
+    nodes: list[SyntaxNode] = []
+    position = 0
+    column = columns[0]
+    while True:
+        action = actions[states[-1] * width + column]
+        if action > 0:
+            states.append(action - 1)
+            nodes.append(SyntaxNode(terminals[column], tokens[position]))
+            position += 1
+            column = columns[position]
+        elif action < 0:
+            production = -action - 1
+            if production == accept:
+                return nodes[0]
+            length = rhs_lengths[production]
+            children = nodes[-length:] if length else []
+            if length:
+                del states[-length:]
+                del nodes[-length:]
+            if production in with_epsilon:
+                stacked = iter(children)
+                children = [SyntaxNode(epsilon) if symbol == epsilon else next(stacked) for symbol in productions[production].to_sequence]
+            nodes.append(SyntaxNode(productions[production].from_symbol, children=children))
+            states.append(gotos[states[-1] * rows + lhs_rows[production]] - 1)
+        else:
+            raise _error_at(tokens, position, line_index)
@@ -1,95 +1,18 @@
 from LangChisel.lex.greedy_backtrack_lexer import Token, TokenTag
-from collections import deque
-
-# TODO: move CF to new file
-
-
-class CFSymbol:
-    def __init__(self, value: str | TokenTag) -> None:
-        """A Single Context Free Symbol
-
-        Args:
-            value (str): the name of the non-terminal or token of the terminal
-        """
-        self.value = value
-
-    def __repr__(self) -> str:
-        return f"(CFSymbol: {self.value})"
-
-    def __eq__(self, other: object) -> bool:
-        if isinstance(other, CFSymbol):
-            return self.value == other.value
-        return False
-
-    def __hash__(self) -> int:
-        return hash((self.value))
-
-
-class CFProduction:
-    def __init__(self, from_symbol: CFSymbol, to_sequence: list[CFSymbol]):
-        """A Production Rule defining a possible transition from one symbol to a sequence of other symbols
-
-        Args:
-            from_symbol (CFSymbol): The 'left hand-side' of this derivation, what the derviation 'derives from'
-            to_sequence (list[CFSymbol]): The 'right hand-side' of this derivation, what the derivation 'derives to'
-        """
-        self.from_symbol = from_symbol
-        self.to_sequence = to_sequence
-
-    def __repr__(self) -> str:
-        return f"(CFProduction: {self.from_symbol} => {self.to_sequence})"
-
-    def __eq__(self, other: object) -> bool:
-        if isinstance(other, CFProduction):
-            return (
-                self.from_symbol == other.from_symbol
-                and self.to_sequence == other.to_sequence
-            )
-        return False
-
-    def __hash__(self) -> int:
-        return hash((self.from_symbol, self.to_sequence))
-
-
-class CFGrammar:
-    def __init__(
-        self,
-        productions: list[CFProduction],
-        start_symbol: CFSymbol,
-        epsilon: CFSymbol,
-        end_of_string: CFSymbol,
-    ):
-        """A Context Free Grammar, defined by a series of productions, alongside  start symbol, epsilon, and end of string definitions"""
-        self.productions = productions
-        self.start_symbol = start_symbol
-        self.epsilon = epsilon
-        self.end_of_string = end_of_string
-
-
-def get_non_terminals(derivations: list[CFProduction]) -> list[CFSymbol]:
-    """ """
-    return list(set([production.from_symbol for production in derivations]))
-
-
-def get_terminals(derivations: list[CFProduction]) -> list[CFSymbol]:
-    """ """
-    terminals = []
-    for production in derivations:
-        for symbol in production.to_sequence:
-            if is_terminal(symbol):
-                terminals.append(symbol)
-    return list(set(terminals))
-
-
-def is_terminal(symbol: CFSymbol) -> bool:
-    """ """
-    return isinstance(symbol.value, TokenTag)
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token_buffer import TokenBuffer
+from .grammar import *
+from .parse_error import *
+from .parse_error import _error_at
+from .compiled_table import *
+from .grammar_analysis import *
+from .syntax_tree_traversal import *
 
 
 def LL1_first(
     symbol: CFSymbol,
     grammar: CFGrammar,
-    known_first_sets: dict[CFSymbol, list[CFSymbol]],
+    known_first_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]],
 ):
     """Find the set of symbols that may appear at the start of a string derived from A
     That is, First(A) = { t | A->...->tW for some string w}
@@ -98,233 +21,143 @@ def LL1_first(
     Args:
         symbol (CFSymbol): the symbol we want the first set of
         grammar (list[CFProduction]): the grammar we will use to derive the first set
-        known_first_sets (dict[CFSymbol, list[CFSymbol]]): a dictionary containing any pre-calculated first_sets - if empty, the function will simply calculate any dependency recursively - any newly calculated first-sets will be added to this dictionary
+        known_first_sets (dict[CFSymbol, list[CFSymbol]]): a dictionary containing any pre-calculated first_sets - if the symbol is missing, the first sets of the whole grammar are calculated and added to this dictionary
     """
-
-    if symbol in known_first_sets:
-        return known_first_sets[symbol]
-
-    # definition for First(a) = {a}  OR First(epsilon) = {epsilon}
-    if is_terminal(symbol) or symbol == grammar.epsilon:
-        known_first_sets[symbol] = [symbol]
-        return known_first_sets[symbol]
-
-    first_set = set()  # this will be the set of 'First(symbol)' we will return
-    relevant_productions = [
-        production
-        for production in grammar.productions
-        if production.from_symbol == symbol
-    ]
-
-    for production in relevant_productions:
-        to_sequence = production.to_sequence
-        # should never have a production that does not contain a single derived symbol
-        assert len(to_sequence) > 0
-
-        # First(A) += First(B) + First(C) if (A -> B C) and (epsilon in B)
-        # OR First(A) += First(B) if A -> A B
-        for i, sym in enumerate(to_sequence):
-            # add all terminals in First(X) other than epsilon
-            first_of_sym = LL1_first(sym, grammar, known_first_sets)
-            first_set.update(set(first_of_sym) - {grammar.epsilon})
-
-            # if sym cannot derive epsilon, then we should not add the first of the next set (i.e. First(C)) to our first_set
-            if not grammar.epsilon in first_of_sym:
-                break
-
-            # if we have reached the end of the to_sequence and (from above) first(X) contains epsilon, we add epsilon
-            if i == len(to_sequence) - 1:
-                first_set.add(grammar.epsilon)
-
-    known_first_sets[symbol] = list(first_set)
-    return list(first_set)
+    if symbol not in known_first_sets:
+        for known_symbol, first_set in extract_LL1_first_sets(grammar).items():
+            known_first_sets.setdefault(known_symbol, first_set)
+    return known_first_sets[symbol]
 
 
 def extract_LL1_first_sets(
     grammar: CFGrammar,
-) -> dict[CFSymbol, list[CFSymbol]]:
+) -> dict[CFSymbol, TerminalSet]:
     """Calculate the First sets for all symbols in the grammar"""
-    first_sets: dict[CFSymbol, list[CFSymbol]] = {}
-    symbols = get_non_terminals(grammar.productions) + get_terminals(
-        grammar.productions
-    )
-
-    for symbol in symbols:
-        LL1_first(symbol, grammar, first_sets)
-
-    return first_sets
+    return GrammarAnalysis(grammar).first_sets
 
 
 def LL1_follow(
     symbol: CFSymbol,
     grammar: CFGrammar,
-    known_first_sets: dict[CFSymbol, list[CFSymbol]],
-    known_follow_sets: dict[CFSymbol, list[CFSymbol]],
-    symbols_visiting: set[CFSymbol] = None
+    known_first_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]],
+    known_follow_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]],
 ):
     """Find the set of symbols that may appear a string derived from this symbol (Note: this does not mean 'at the end' of a derived string, but immediately after/next any derived string)
     That is, Follow(A) = { t | S ->...-> aAtw for some a, w}, where S is the start symbol
+    If the symbol is missing from known_follow_sets, the follow sets of the whole grammar are calculated and added to it
     """
-    
-    if symbols_visiting is None:
-        symbols_visiting = set()
-        
-    # if we are already currently visiting/calculating the follow set for this we are about to inifinitely recurse, 
-    # so we escape, adding no new information (as none can be obtained)
-    if symbol in symbols_visiting:
-        return known_follow_sets.get(symbol, [])
-    
-    symbols_visiting.add(symbol)
-    
-    if symbol in known_follow_sets:
-        return known_follow_sets[symbol]
-
-    follow_set = set()
-    # if symbol is start symbol, add $ (the end of string symbol)
-    if symbol == grammar.start_symbol:
-        follow_set.add(grammar.end_of_string)
-
-    # this time, relevant productions for symbol A, are those where X -> "..."A"..."
-    relevant_productions = [
-        production
-        for production in grammar.productions
-        if symbol in production.to_sequence
-    ]
-
-    for production in relevant_productions:
-        # from_symbol -> to_sequence
-        from_symbol = production.from_symbol
-        to_sequence = production.to_sequence
-
-        # find all occurrences of the symbol in this production
-        positions = [i for i, sym in enumerate(to_sequence) if sym == symbol]
-        for symbol_pos in positions:
-            # Follow(A) += Follow(B) if B -> w A and B != A
-            if symbol_pos == len(to_sequence) - 1:
-                if from_symbol != symbol:
-                    follow_set.update(
-                        LL1_follow(
-                            from_symbol, grammar, known_first_sets, known_follow_sets, symbols_visiting
-                        )
-                    )
-                continue  # we are now finished with this derivation, so go to the next
-
-            # Follow(A) += First(B) if W -> A B C
-            # Follow(A) += First(C) if W -> A B C and First(B) has epsilon
-            curr_pos = symbol_pos
-            epsilon_in_curr_first = True
-            while epsilon_in_curr_first and curr_pos < len(to_sequence) - 1:
-                curr_pos += 1
-                if curr_pos in positions:
-                    break  # if we have reached another intance of the symbol, we can just continue to it in the outer loop
-                # we can add the first set (i.e. First(B)) to the follow set of our symbol (i.e. follow(A))
-                first_curr = known_first_sets[to_sequence[curr_pos]]
-                follow_set.update(set(first_curr) - {grammar.epsilon})
-                # if this has epsilon, then we have Follow(A) += First(C) if W -> A B C and First(B) has epsilon
-                epsilon_in_curr_first = grammar.epsilon in first_curr
-
-                # if this is also the last symbol in the sequence, we get Follow(A) += Follow(B) if B -> a A w, and eps in First(w)
-                if curr_pos == len(to_sequence) - 1 and epsilon_in_curr_first:
-                    follow_set.update(
-                        LL1_follow(
-                            from_symbol, grammar, known_first_sets, known_follow_sets, symbols_visiting
-                        )
-                    )
-
-    known_follow_sets[symbol] = list(follow_set)
-    return list(follow_set)
+    if symbol not in known_follow_sets:
+        for known_symbol, follow_set in extract_LL1_follow_sets(grammar, known_first_sets).items():
+            known_follow_sets.setdefault(known_symbol, follow_set)
+    return known_follow_sets.get(symbol, TerminalSet())
 
 
 def extract_LL1_follow_sets(
-    grammar: CFGrammar, first_sets: dict[CFSymbol, list[CFSymbol]]
-) -> dict:
-    follow_sets: dict[CFSymbol, list[CFSymbol]] = {}
-    symbols = get_non_terminals(
-        grammar.productions
-    )  # we only define follow for non-terminals
-
-    for symbol in symbols:
-        LL1_follow(symbol, grammar, first_sets, follow_sets)
-
-    return follow_sets
+    grammar: CFGrammar, first_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]]
+) -> dict[CFSymbol, TerminalSet]:
+    """Calculate the Follow sets for all non-terminals in the grammar (we only define follow for non-terminals)"""
+    return GrammarAnalysis(grammar).compute_follow_sets(first_sets)
 
 
 def build_LL1_table(
     grammar: CFGrammar,
-    first_sets: dict[CFSymbol, list[CFSymbol]],
-    follow_sets: dict[CFSymbol, list[CFSymbol]],
+    first_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]],
+    follow_sets: dict[CFSymbol, TerminalSet | list[CFSymbol]],
 ) -> dict[CFSymbol, dict[CFSymbol, CFProduction]]:
-    """Construct an LL(1) Parse Table given a grammar, first_sets, and follow_sets"""
+    """Construct an LL(1) Parse Table given a grammar, first_sets, and follow_sets (as TerminalSets, or lists of symbols)"""
 
     # our table is a mapping of (non-terminal, terminal) -> production the parser should use when terminal is front of input and non-terminal top of stack
     ll1_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] = {}
+    # the terminals already given a production in each row, as bits
+    filled: dict[CFSymbol, int] = {}
+    columns = TerminalColumns.of_grammar(grammar)
+    first_bits = {symbol: columns.bits(first_set) for symbol, first_set in first_sets.items()}
+    epsilon_bit = columns.bit(grammar.epsilon)
 
     for production in grammar.productions:
 
         if production.from_symbol not in ll1_table:
             ll1_table[production.from_symbol] = {}
+            filled[production.from_symbol] = 0
 
-        # we keep adding to the first set, by iterating over symbols and fetching their first sets until we stop getting: (first(symbol) has epsilon)
-        first_set = set()
-        for symbol in production.to_sequence:
-            first_set.update(first_sets[symbol])
-            if grammar.epsilon not in first_sets[symbol]:
-                break
+        first_set = _sequence_first_bits(production.to_sequence, first_bits, epsilon_bit)
+        row = ll1_table[production.from_symbol]
         # for every terminal in the first set, we assert that (non-terminal, terminal -> production) does not already exist
         # if we are correct, we add the mapping and repeat
-        for terminal in first_set - {grammar.epsilon}:
-            if terminal not in ll1_table[production.from_symbol]:
-                ll1_table[production.from_symbol][terminal] = production
-            else:
-                raise ValueError(
-                    f"Conflict in LL(1) table at {production.from_symbol}, {terminal}"
-                )
-        # if the first set contains epsilong (i.e. every symbol in the production can derive epsilon)
+        _fill_LL1_row(row, filled, production, first_set & ~epsilon_bit, columns)
+        # if the first set contains epsilon (i.e. every symbol in the production can derive epsilon)
         # we now know that the whole production can be used to derive eps
-        if grammar.epsilon in first_set:
-            for terminal in follow_sets[production.from_symbol]:
-                if terminal not in ll1_table[production.from_symbol]:
-                    ll1_table[production.from_symbol][terminal] = production
-                else:
-                    raise ValueError(
-                        f"Conflict in LL(1) table at {production.from_symbol}, {terminal}"
-                    )
+        if first_set & epsilon_bit:
+            _fill_LL1_row(row, filled, production, columns.bits(follow_sets[production.from_symbol]), columns)
 
     return ll1_table
 
 
-class ParseError(Exception):
-    def __init__(self, message):
-        self.message = message
-        super().__init__(self.message)
-
-    def __str__(self):
-        if self.position:
-            return f"Parse Error Raised: {self.message}"
-        return self.message
+def _sequence_first_bits(sequence: list[CFSymbol], first_bits: dict[CFSymbol, int], epsilon_bit: int) -> int:
+    """the bits of First(sequence), holding epsilon only if every symbol of the sequence can derive epsilon"""
+    # we keep adding to the first set, by iterating over symbols and fetching their first sets until we stop getting: (first(symbol) has epsilon)
+    first_set = 0
+    for symbol in sequence:
+        first_set |= first_bits[symbol] & ~epsilon_bit
+        if not first_bits[symbol] & epsilon_bit:
+            return first_set
+    return first_set | epsilon_bit
+
+
+def _fill_LL1_row(
+    row: dict[CFSymbol, CFProduction],
+    filled: dict[CFSymbol, int],
+    production: CFProduction,
+    terminals: int,
+    columns: TerminalColumns,
+) -> None:
+    conflicts = filled[production.from_symbol] & terminals
+    if conflicts:
+        raise ValueError(
+            f"Conflict in LL(1) table at {production.from_symbol}, {next(iter(TerminalSet(bits=conflicts, columns=columns)))}"
+        )
+    filled[production.from_symbol] |= terminals
+    for terminal in TerminalSet(bits=terminals, columns=columns):
+        row[terminal] = production
 
 
 def get_LL1_derivation_seq(
-    tokens: list[Token],
+    tokens: list[Token] | TokenBuffer,
     grammar: CFGrammar,
-    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]],
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
 ) -> list[CFProduction]:
+    """Find the left-most derivation of a sequence of tokens, only the tag of each token is read (so a TokenBuffer never builds any Token)
+
+    A CompiledLL1Table (of the same grammar) is parsed with by its own driver, which only works on ints.
+    A ParseError reports the location of the failing token through line_index (a TokenBuffer brings its own)
+    """
+    if isinstance(parse_table, CompiledLL1Table):
+        return parse_table.derive(tokens, line_index)
+
     stack: list[CFSymbol] = [grammar.end_of_string, grammar.start_symbol]
-    tokens.append(Token(grammar.end_of_string.value, None))
-    tokens.reverse()
+    if isinstance(tokens, TokenBuffer):
+        token_tags = tokens.tag_list()
+    else:
+        token_tags = [token.tag for token in tokens]
+    # symbols are interned, so the terminal for each tag is looked up rather than built (a tag no symbol uses gives None)
+    token_symbols: list[CFSymbol | None] = list(map(CFSymbol._interned.get, token_tags))
+    token_symbols.append(grammar.end_of_string)
+    token_symbols.reverse()
 
     derivation_sequence: list[CFProduction] = []
+    epsilon = grammar.epsilon
+    end_of_string = grammar.end_of_string
 
-    while stack[-1] != grammar.end_of_string:
+    while stack[-1] is not end_of_string:
         symbol: CFSymbol = stack[-1]
-        token: Token = tokens[-1]
-        token_sym: CFSymbol = CFSymbol(token.tag)
+        token_sym: CFSymbol | None = token_symbols[-1]
 
-        if symbol == grammar.epsilon:
+        if symbol is epsilon:
             stack.pop()
-        elif is_terminal(symbol) and symbol.value == token.tag:
+        elif symbol.terminal and symbol is token_sym:
             stack.pop()
-            tokens.pop()
+            token_symbols.pop()
         elif symbol in parse_table and token_sym in parse_table[symbol]:
             derivation: CFProduction = parse_table[symbol][token_sym]
             assert symbol == derivation.from_symbol
@@ -335,17 +168,15 @@ def get_LL1_derivation_seq(
             stack += to_seq
             derivation_sequence.append(derivation)
         else:
-            raise ParseError("No Valid Next Step for Parser")
+            raise _error_at(tokens, len(tokens) + 1 - len(token_symbols), line_index)
     return derivation_sequence
 
 
-# TODO: move to new file
-# Below we are no longer tied to being LL1
-
-
 class SyntaxNode:
+    __slots__ = ("symbol", "token", "children", "token_count")
+
     def __init__(
-        self, symbol: CFSymbol, token: Token = None, children: list["SyntaxNode"] = []
+        self, symbol: CFSymbol, token: Token = None, children: list["SyntaxNode"] | None = None
     ):
         """A SyntaxNode describes a node in a tree generated by some parsing step. The Syntax Node will contain a CFSymbol to identify its grammatical class, alongside a token to define exactly what it is representing (in both sub-type and value)
 
@@ -357,14 +188,17 @@ class SyntaxNode:
         """
         self.symbol = symbol
         self.token = token
-        self.children = children
+        self.children = children if children is not None else []
+        self.token_count: int | None = None  # the number of tokens the node spans, once known (see count_syntax_tree_tokens)
 
     def __repr__(self, level=0):
-        indent = "    " * level
-        node_repr = f"{indent}(SyntaxNode: symbol:{self.symbol}, token:{self.token})"
-        child_reprs = [child.__repr__(level + 1) for child in self.children]
-        children_repr = "\n".join(child_reprs)
-        return f"{node_repr}\n{children_repr}" if child_reprs else node_repr
+        lines = []
+        stack = [(self, level)]
+        while stack:
+            node, depth = stack.pop()
+            lines.append(f"{'    ' * depth}(SyntaxNode: symbol:{node.symbol}, token:{node.token})")
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        return "\n".join(lines)
 
 
 def generate_syntax_tree_symbols(
@@ -408,20 +242,13 @@ def generate_syntax_tree_symbols(
 
 
 def extract_terminal_children(curr_node: SyntaxNode) -> list[SyntaxNode]:
-    if is_terminal(curr_node.symbol):
-        return [curr_node]
-    terminals = []
-    for child in curr_node.children:
-        terminals.extend(extract_terminal_children(child))
-    return terminals
-        
+    return list(iter_terminals(curr_node))
 
 
 def tokenise_syntax_tree_terminals(root_node: SyntaxNode, tokens: list[Token], grammar: CFGrammar):
     """Add tokens to every terminal symbol in a syntax tree"""
-    terminals = extract_terminal_children(root_node)
     # remove epsilon at this stage (no value to give it)
-    terminals = [terminal for terminal in terminals if terminal.symbol != grammar.epsilon]
+    terminals = (terminal for terminal in iter_terminals(root_node) if terminal.symbol != grammar.epsilon)
     for i, terminal_node in enumerate(terminals):
         terminal_symbol: CFSymbol = terminal_node.symbol
         assert is_terminal(terminal_symbol)
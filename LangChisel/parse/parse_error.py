@@ -0,0 +1,38 @@
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token
+from LangChisel.lex.token_buffer import TokenBuffer
+
+
+class ParseError(Exception):
+    def __init__(self, message, token: Token | None = None, line_index: LineIndex | None = None):
+        """An error raised when the tokens cannot be derived from the grammar
+
+        Args:
+            message (str): what went wrong
+            token (Token | None): the token the parser failed at, None if it failed at the end of the tokens
+            line_index (LineIndex | None): the line index of the token's source, used to report where the token is
+        """
+        self.message = message
+        self.token = token
+        self.line_index = line_index
+        super().__init__(self.message)
+
+    @property
+    def position(self) -> tuple[int, int] | None:
+        """the (line, column) of the failing token, if both its offset and its source are known"""
+        if self.token is None or self.token.offset is None or self.line_index is None:
+            return None
+        return self.line_index.position(self.token.offset)
+
+    def __str__(self):
+        position = self.position
+        if position:
+            return f"Parse Error Raised: {self.message} at line {position[0]}, column {position[1]}"
+        return self.message
+
+
+def _error_at(tokens: list[Token] | TokenBuffer, index: int, line_index: LineIndex | None) -> ParseError:
+    """the ParseError for failing at tokens[index] (or at the end of the tokens), located through line_index or the buffer's own"""
+    if line_index is None and isinstance(tokens, TokenBuffer):
+        line_index = tokens.line_index
+    return ParseError("No Valid Next Step for Parser", tokens[index] if index < len(tokens) else None, line_index)
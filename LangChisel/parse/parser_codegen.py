@@ -0,0 +1,182 @@
+import os
+import types
+
+from LangChisel.lex.token import TokenTag
+
+from .compiled_table import *
+from .grammar import *
+from .grammar_cache import grammar_fingerprint
+
+_HEADER = '''"""LL(1) recursive descent parser for the grammar with fingerprint {fingerprint}
+
+Generated by LangChisel.parse.parser_codegen, do not edit. derive_indexes(tokens) and derive(tokens, grammar) give the same derivation
+sequences as get_LL1_derivation_seq does with the grammar's LL(1) table.
+"""
+
+from array import array
+
+from LangChisel.lex.token import TokenTag
+from LangChisel.lex.token_buffer import TokenBuffer
+from LangChisel.parse.parse_error import _error_at
+
+FINGERPRINT = {fingerprint!r}
+
+# the tag of each terminal column, column 0 being the end of the input (tag ids differ between processes, so columns are found by identifier)
+_TAGS = {tags!r}
+_UNKNOWN = {unknown}
+_column_by_id = {{TokenTag(identifier).id: column for column, identifier in enumerate(_TAGS) if identifier is not None}}
+
+
+class _Failed(Exception):
+    pass
+
+
+class _Finished(Exception):
+    pass
+'''
+
+_FOOTER = '''
+
+def derive_indexes(tokens, line_index=None) -> array:
+    """Find the left-most derivation of a sequence of tokens (a list of Token, or a TokenBuffer), as indexes into the grammar's productions
+
+    The generated functions raise _Failed with the failing position, which is turned into a ParseError located through line_index
+    """
+    tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+    get = _column_by_id.get
+    columns = [get(tag_id, _UNKNOWN) for tag_id in tag_ids]
+    columns.append(0)
+    derivation = []
+    try:
+        {start}(columns, 0, derivation.append)
+    except _Finished:
+        pass  # the end of the input was reached on the stack, which ends a derivation wherever it happens
+    except _Failed as failed:
+        raise _error_at(tokens, failed.args[0], line_index) from None
+    return array("I", derivation)
+
+
+def derive(tokens, grammar, line_index=None) -> list:
+    """Find the left-most derivation of a sequence of tokens, as the productions of the grammar this parser was generated from"""
+    return list(map(grammar.productions.__getitem__, derive_indexes(tokens, line_index)))
+'''
+
+
+def _symbol_name(symbol: CFSymbol) -> str:
+    value = symbol.value
+    return repr(value.identifier if isinstance(value, TokenTag) else value)
+
+
+def _column_test(columns: list[int], constants: list[str]) -> str:
+    """the condition for the lookahead column being one of columns (a set constant is declared for long lists)"""
+    if len(columns) == 1:
+        return f"column == {columns[0]}"
+    if len(columns) <= 4:
+        return f"column in {tuple(columns)!r}"
+    name = f"_COLUMNS_{len(constants)}"
+    constants.append(f"{name} = frozenset({sorted(columns)!r})")
+    return f"column in {name}"
+
+
+def generate_LL1_parser_source(
+    grammar: CFGrammar, parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table
+) -> str:
+    """Generates the source of a Python module that parses with a grammar's LL(1) table built into its code
+
+    Each non-terminal gets a function that picks its production with an if-chain over the lookahead's terminal column, records it, then
+    matches or calls each symbol of its right hand-side in turn, so no table is interpreted and nothing is analysed when the module is
+    imported. A production that ends by deriving its own non-terminal again (e.g. E' -> + T E') loops instead of recursing; any other
+    nesting recurses, so it is bounded by Python's recursion limit.
+
+    Args:
+        grammar (CFGrammar): the grammar to generate a parser for
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table, as given by build_LL1_table
+
+    Returns:
+        str: the source of the module, see write_LL1_parser
+    """
+    table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+    width = table.width
+    tags = tuple(terminal.value.identifier if isinstance(terminal.value, TokenTag) else None for terminal in table.terminals)
+    constants: list[str] = []
+    functions: list[str] = []
+
+    for row, non_terminal in enumerate(table.non_terminals):
+        code = (row + 1) * width
+        # the lookahead columns that choose each production, in order of the productions
+        choices: dict[int, list[int]] = {}
+        for column in range(len(table.terminals)):
+            cell = table.cells[row * width + column]
+            if cell:
+                choices.setdefault(cell - 1, []).append(column)
+
+        lines = [f"def _parse_{row}(columns, position, emit):", f"    # {_symbol_name(non_terminal)}"]
+        loops = any(table.reversed_rhs(production)[:1].tolist() == [code] for production in choices)
+        indent = "    "
+        if loops:
+            lines.append("    while True:")
+            indent = "        "
+        lines.append(f"{indent}column = columns[position]")
+        for branch, (production, columns) in enumerate(sorted(choices.items())):
+            keyword = "if" if branch == 0 else "elif"
+            rhs = table.productions[production].to_sequence
+            lines.append(f"{indent}{keyword} {_column_test(columns, constants)}:")
+            lines.append(f"{indent}    # {_symbol_name(non_terminal)} -> {' '.join(_symbol_name(symbol) for symbol in rhs)}")
+            lines.append(f"{indent}    emit({production})")
+            symbol_codes = table.reversed_rhs(production).tolist()[::-1]
+            tail_loop = symbol_codes[-1:] == [code]
+            if tail_loop:
+                symbol_codes.pop()
+            for index, symbol_code in enumerate(symbol_codes):
+                if index == 0 and columns == [symbol_code] and symbol_code:
+                    # the lookahead was just tested to be this terminal
+                    lines.append(f"{indent}    position += 1")
+                elif symbol_code == 0:
+                    lines.append(f"{indent}    raise _Finished()")
+                elif symbol_code < width:
+                    lines.append(f"{indent}    if columns[position] != {symbol_code}:")
+                    lines.append(f"{indent}        raise _Failed(position)")
+                    lines.append(f"{indent}    position += 1")
+                else:
+                    lines.append(f"{indent}    position = _parse_{symbol_code // width - 1}(columns, position, emit)")
+            lines.append(f"{indent}    {'continue' if tail_loop else 'return position'}")
+        lines.append(f"{indent}raise _Failed(position)")
+        functions.append("\n".join(lines))
+
+    start = table.start_code
+    if start < width:
+        raise ValueError("the start symbol of a grammar must be a non-terminal")
+    source = _HEADER.format(fingerprint=grammar_fingerprint(grammar), tags=tags, unknown=table.unknown_column)
+    if constants:
+        source += "\n" + "\n".join(constants) + "\n"
+    source += "\n\n" + "\n\n\n".join(functions) + "\n" + _FOOTER.format(start=f"_parse_{start // width - 1}")
+    return source
+
+
+def write_LL1_parser(
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    path: str | os.PathLike,
+) -> None:
+    """Writes a generated parser module (see generate_LL1_parser_source) to path, from where it can be imported like any other module
+
+    Args:
+        grammar (CFGrammar): the grammar to generate a parser for
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table, as given by build_LL1_table
+        path (str | os.PathLike): the file to write, e.g. "my_language_parser.py"
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(generate_LL1_parser_source(grammar, parse_table))
+
+
+def compile_LL1_parser(
+    grammar: CFGrammar, parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table
+) -> types.ModuleType:
+    """Generates a parser module (see generate_LL1_parser_source) and loads it straight away, without writing it anywhere
+
+    Returns:
+        types.ModuleType: the module, with derive_indexes(tokens) and derive(tokens, grammar)
+    """
+    module = types.ModuleType("LangChisel_generated_parser")
+    exec(compile(generate_LL1_parser_source(grammar, parse_table), "<generated LL(1) parser>", "exec"), module.__dict__)
+    return module
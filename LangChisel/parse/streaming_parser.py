@@ -0,0 +1,102 @@
+from typing import Iterable, Iterator
+
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token
+
+from .compiled_table import *
+from .grammar import *
+from .parse_error import *
+
+
+class LL1StreamParser:
+    def __init__(
+        self,
+        grammar: CFGrammar,
+        parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+        line_index: LineIndex | None = None,
+    ) -> None:
+        """An LL(1) parser pushed one token at a time, handing back each production as soon as it is chosen
+
+        Only the parse stack is kept, never the tokens, so a parse of an unbounded stream of tokens (e.g. from stream_tokens) takes memory
+        in proportion to its nesting rather than its length. The derivation is the same as get_LL1_derivation_seq gives, and once the start
+        symbol has been derived in full, any further tokens are ignored, as they are there.
+
+        Args:
+            grammar (CFGrammar): the grammar to parse with
+            parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+            line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token in a ParseError
+        """
+        self.table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+        self.line_index = line_index
+        self.finished = False  # whether the derivation is complete
+        self._stack = [0, self.table.start_code]
+
+    def feed(self, token: Token) -> list[CFProduction]:
+        """takes the next token, returning the productions chosen up to (and including) the one that matches it"""
+        if self.finished:
+            return []
+        column_by_tag = self.table.column_by_tag()
+        tag_id = token.tag.id
+        return self._advance(column_by_tag[tag_id] if tag_id < len(column_by_tag) else self.table.unknown_column, token)
+
+    def finish(self) -> list[CFProduction]:
+        """marks the end of the tokens, returning the productions that complete the derivation"""
+        if self.finished:
+            return []
+        return self._advance(0, None)
+
+    def _advance(self, column: int, token: Token | None) -> list[CFProduction]:
+        table = self.table
+        steps = table.steps
+        width = table.width
+        stack = self._stack
+        expanded: list[int] = []
+        while True:
+            code = stack.pop()
+            if code >= width:
+                step = steps[code - width + column]
+                if step is None:
+                    step = table._step(code - width + column)
+                    if step is None:
+                        stack.append(code)
+                        break
+                expanded.extend(step[0])
+                stack.extend(step[1])
+                if step[2]:
+                    return list(map(table.productions.__getitem__, expanded))
+            elif code == 0:
+                self.finished = True  # end of string is on top of the stack, so the derivation is complete
+                return list(map(table.productions.__getitem__, expanded))
+            elif code == column:
+                return list(map(table.productions.__getitem__, expanded))
+            else:
+                stack.append(code)
+                break
+        raise ParseError("No Valid Next Step for Parser", token, self.line_index)
+
+
+def iter_LL1_derivation(
+    tokens: Iterable[Token],
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
+) -> Iterator[CFProduction]:
+    """Find the left-most derivation of any iterable of tokens, yielding each production as soon as it is chosen
+
+    Tokens are read one at a time (a single token of lookahead), and the iterable is neither changed nor held on to.
+
+    Args:
+        tokens (Iterable[Token]): the tokens to parse, e.g. a list, a TokenBuffer or stream_tokens(...)
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token in a ParseError
+
+    Yields:
+        CFProduction: each production of the derivation, in order (a ParseError is raised where no step is valid)
+    """
+    parser = LL1StreamParser(grammar, parse_table, line_index)
+    for token in tokens:
+        yield from parser.feed(token)
+        if parser.finished:
+            return
+    yield from parser.finish()
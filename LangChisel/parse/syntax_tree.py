@@ -0,0 +1,118 @@
+from array import array
+from typing import Iterator
+
+from LangChisel.lex.token import Token
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .grammar import *
+from .ll1_parser import SyntaxNode
+
+
+class SyntaxTree:
+    def __init__(self, tokens: list[Token] | TokenBuffer) -> None:
+        """A syntax tree stored as parallel columns of ints rather than as one object per node
+
+        Node i is described by symbol_ids[i] (the CFSymbol.id of its symbol), token_indexes[i] (the index of its token in tokens, or -1),
+        first_child[i] and child_count[i] (a node's children are always stored next to each other, so they are the nodes first_child[i]
+        up to first_child[i] + child_count[i], or none if first_child[i] is -1). The root is node 0. That is 16 bytes a node, and a
+        question about the whole tree (e.g. how often a symbol occurs) is a scan of one column.
+
+        Nodes are looked at through SyntaxTreeNode views, which have the symbol, token and children of a SyntaxNode and are made on demand.
+
+        Args:
+            tokens (list[Token] | TokenBuffer): the tokens the tree was parsed from
+        """
+        self.tokens = tokens
+        self.symbol_ids = array("I")
+        self.token_indexes = array("i")
+        self.first_child = array("i")
+        self.child_count = array("I")
+        # the node of each token, in the order of the tokens
+        self.token_nodes = array("i")
+
+    def __len__(self) -> int:
+        return len(self.symbol_ids)
+
+    @property
+    def root(self) -> "SyntaxTreeNode":
+        return SyntaxTreeNode(self, 0)
+
+    def node(self, index: int) -> "SyntaxTreeNode":
+        return SyntaxTreeNode(self, index)
+
+    def symbol(self, index: int) -> CFSymbol:
+        return CFSymbol.from_id(self.symbol_ids[index])
+
+    def token(self, index: int) -> Token | None:
+        token_index = self.token_indexes[index]
+        return self.tokens[token_index] if token_index >= 0 else None
+
+    def child_indexes(self, index: int) -> range:
+        first = self.first_child[index]
+        return range(first, first + self.child_count[index]) if first >= 0 else range(0)
+
+    def iter_terminals(self) -> Iterator["SyntaxTreeNode"]:
+        """the nodes given a token, in the order of their tokens"""
+        for index in self.token_nodes:
+            yield SyntaxTreeNode(self, index)
+
+    def count(self, symbol: CFSymbol) -> int:
+        """the number of nodes with the given symbol"""
+        return self.symbol_ids.count(symbol.id)
+
+    def to_syntax_node(self) -> SyntaxNode:
+        """the tree as SyntaxNode objects"""
+        nodes = [SyntaxNode(self.symbol(index), self.token(index)) for index in range(len(self))]
+        for index, node in enumerate(nodes):
+            first = self.first_child[index]
+            if first >= 0:
+                node.children = nodes[first : first + self.child_count[index]]
+        return nodes[0]
+
+    def __repr__(self) -> str:
+        return repr(self.root)
+
+
+class SyntaxTreeNode:
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: SyntaxTree, index: int) -> None:
+        """A view of one node of a SyntaxTree, with the same symbol, token and children as a SyntaxNode
+
+        Args:
+            tree (SyntaxTree): the tree the node is in
+            index (int): the index of the node in the tree's columns
+        """
+        self.tree = tree
+        self.index = index
+
+    @property
+    def symbol(self) -> CFSymbol:
+        return CFSymbol.from_id(self.tree.symbol_ids[self.index])
+
+    @property
+    def token(self) -> Token | None:
+        return self.tree.token(self.index)
+
+    @property
+    def children(self) -> list["SyntaxTreeNode"]:
+        tree = self.tree
+        return [SyntaxTreeNode(tree, index) for index in tree.child_indexes(self.index)]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SyntaxTreeNode):
+            return self.tree is other.tree and self.index == other.index
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self) -> str:
+        lines = []
+        stack = [(self.index, 0)]
+        tree = self.tree
+        while stack:
+            index, level = stack.pop()
+            lines.append(f"{'    ' * level}(SyntaxNode: symbol:{tree.symbol(index)}, token:{tree.token(index)})")
+            stack.extend((child, level + 1) for child in reversed(tree.child_indexes(index)))
+        return "\n".join(lines)
@@ -0,0 +1,154 @@
+from array import array
+
+from LangChisel.lex.source_position import LineIndex
+from LangChisel.lex.token import Token
+from LangChisel.lex.token_buffer import TokenBuffer
+
+from .compiled_table import *
+from .grammar import *
+from .ll1_parser import SyntaxNode
+from .parse_error import _error_at
+from .syntax_tree import *
+
+
+def _child_positions(table: CompiledLL1Table) -> list[tuple[int, ...]]:
+    """for each production, the positions of the children pushed onto the parse stack (all but epsilon), last first to line up with
+    reversed_rhs"""
+    epsilon = table.grammar.epsilon
+    return [
+        tuple(index for index in reversed(range(len(production.to_sequence))) if production.to_sequence[index] != epsilon)
+        for production in table.productions
+    ]
+
+
+def parse_syntax_tree(
+    tokens: list[Token] | TokenBuffer,
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
+) -> SyntaxNode:
+    """Parse a sequence of tokens straight into a syntax tree, in a single pass
+
+    Gives the same tree as get_LL1_derivation_seq followed by generate_syntax_tree_symbols and tokenise_syntax_tree_terminals, but the
+    parse stack holds the tree's nodes alongside its symbols: expanding a node gives it its children, and matching a terminal node gives it
+    its token, so there is no derivation sequence to replay, nor a second walk of the tree to find its terminals.
+
+    Args:
+        tokens (list[Token] | TokenBuffer): the tokens to parse
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token
+
+    Returns:
+        SyntaxNode: the root of the tree, for the grammar's start symbol
+    """
+    table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+    tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+    columns = list(map(table.column_by_tag().__getitem__, tag_ids))
+    columns.append(0)
+
+    cells = table.cells
+    width = table.width
+    productions = table.productions
+    child_positions = _child_positions(table)
+    root = SyntaxNode(grammar.start_symbol)
+    codes = [0, table.start_code]
+    nodes: list[SyntaxNode | None] = [None, root]
+    position = 0
+    column = columns[0]
+    while True:
+        code = codes.pop()
+        node = nodes.pop()
+        if code >= width:
+            production = cells[code - width + column] - 1
+            if production < 0:
+                break
+            children = [SyntaxNode(symbol) for symbol in productions[production].to_sequence]
+            node.children = children
+            codes.extend(table.reversed_rhs(production))
+            nodes.extend([children[index] for index in child_positions[production]])
+        elif code == column and code:
+            node.token = tokens[position]
+            position += 1
+            column = columns[position]
+        else:
+            break  # end of string is on top of the stack (the tree is complete), or a terminal that does not match
+    if code != 0:
+        raise _error_at(tokens, position, line_index)
+    return root
+
+
+def parse_compact_syntax_tree(
+    tokens: list[Token] | TokenBuffer,
+    grammar: CFGrammar,
+    parse_table: dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table,
+    line_index: LineIndex | None = None,
+) -> SyntaxTree:
+    """Parse a sequence of tokens straight into a compact SyntaxTree, in a single pass
+
+    The same parse as parse_syntax_tree, but nodes are rows of the tree's columns rather than SyntaxNode objects: expanding a node appends
+    its children's rows in one go (so they sit next to each other), and the parse stack holds row numbers alongside symbols.
+
+    Args:
+        tokens (list[Token] | TokenBuffer): the tokens to parse
+        grammar (CFGrammar): the grammar to parse with
+        parse_table (dict[CFSymbol, dict[CFSymbol, CFProduction]] | CompiledLL1Table): the grammar's table (a dict is compiled)
+        line_index (LineIndex | None): the line index of the tokens' source, used to locate a failing token
+
+    Returns:
+        SyntaxTree: the tree, rooted at the grammar's start symbol
+    """
+    table = parse_table if isinstance(parse_table, CompiledLL1Table) else CompiledLL1Table(grammar, parse_table)
+    tag_ids = tokens.tag_ids if isinstance(tokens, TokenBuffer) else [token.tag.id for token in tokens]
+    columns = list(map(table.column_by_tag().__getitem__, tag_ids))
+    columns.append(0)
+
+    cells = table.cells
+    width = table.width
+    child_positions = _child_positions(table)
+    # the columns of a production's children, ready to be appended as they are
+    child_ids = [array("I", [symbol.id for symbol in production.to_sequence]) for production in table.productions]
+    no_children = [array("i", [-1]) * len(ids) for ids in child_ids]
+    counts = [array("I", [0]) * len(ids) for ids in child_ids]
+
+    tree = SyntaxTree(tokens)
+    symbol_ids = tree.symbol_ids
+    token_indexes = tree.token_indexes
+    first_child = tree.first_child
+    child_count = tree.child_count
+    token_nodes = tree.token_nodes
+    symbol_ids.append(grammar.start_symbol.id)
+    token_indexes.append(-1)
+    first_child.append(-1)
+    child_count.append(0)
+
+    codes = [0, table.start_code]
+    nodes = [-1, 0]
+    position = 0
+    column = columns[0]
+    while True:
+        code = codes.pop()
+        node = nodes.pop()
+        if code >= width:
+            production = cells[code - width + column] - 1
+            if production < 0:
+                break
+            first = len(symbol_ids)
+            first_child[node] = first
+            child_count[node] = len(child_ids[production])
+            symbol_ids.extend(child_ids[production])
+            token_indexes.extend(no_children[production])
+            first_child.extend(no_children[production])
+            child_count.extend(counts[production])
+            codes.extend(table.reversed_rhs(production))
+            nodes.extend([first + index for index in child_positions[production]])
+        elif code == column and code:
+            token_indexes[node] = position
+            token_nodes.append(node)
+            position += 1
+            column = columns[position]
+        else:
+            break  # end of string is on top of the stack (the tree is complete), or a terminal that does not match
+    if code != 0:
+        raise _error_at(tokens, position, line_index)
+    return tree
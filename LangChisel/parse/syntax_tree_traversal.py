@@ -0,0 +1,134 @@
+from typing import Any, Callable, Iterator, Protocol
+
+from .grammar import *
+
+
+class _Node(Protocol):
+    # what a traversal needs of a node, which both SyntaxNode and SyntaxTreeNode have
+    symbol: CFSymbol
+    children: list
+
+
+def iter_preorder(root: _Node) -> Iterator[_Node]:
+    """Yields every node of a tree, each before its children and the children left to right, without recursing
+
+    Args:
+        root (SyntaxNode | SyntaxTreeNode): the root of the tree (or of the subtree) to walk
+
+    Yields:
+        SyntaxNode | SyntaxTreeNode: each node of the tree
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.children
+        if children:
+            stack.extend(reversed(children))
+
+
+def iter_postorder(root: _Node) -> Iterator[_Node]:
+    """Yields every node of a tree, each after its children and the children left to right, without recursing
+
+    Args:
+        root (SyntaxNode | SyntaxTreeNode): the root of the tree (or of the subtree) to walk
+
+    Yields:
+        SyntaxNode | SyntaxTreeNode: each node of the tree
+    """
+    # each entry is a node and an iterator over its children still to be walked
+    stack = [(root, iter(root.children))]
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield node
+        else:
+            stack.append((child, iter(child.children)))
+
+
+def iter_terminals(root: _Node) -> Iterator[_Node]:
+    """Yields the nodes of a tree with a terminal symbol, left to right (as extract_terminal_children lists them), without recursing"""
+    for node in iter_preorder(root):
+        if is_terminal(node.symbol):
+            yield node
+
+
+def visits(*symbols: CFSymbol) -> Callable:
+    """marks a method of a Visitor as the one to call on entering a node with any of the given symbols"""
+
+    def mark(method: Callable) -> Callable:
+        method._visits = getattr(method, "_visits", ()) + symbols
+        return method
+
+    return mark
+
+
+def leaves(*symbols: CFSymbol) -> Callable:
+    """marks a method of a Visitor as the one to call on leaving a node with any of the given symbols (after its children)"""
+
+    def mark(method: Callable) -> Callable:
+        method._leaves = getattr(method, "_leaves", ()) + symbols
+        return method
+
+    return mark
+
+
+def _resolved(cls: type, table: dict[CFSymbol, Callable]) -> dict[CFSymbol, Callable]:
+    """a copy of an inherited dispatch table with each method replaced by whatever cls has under its name (dropped if not callable)"""
+    resolved = {}
+    for symbol, method in table.items():
+        method = getattr(cls, method.__name__, None)
+        if callable(method):
+            resolved[symbol] = method
+    return resolved
+
+
+class Visitor:
+    _enter_table: dict[CFSymbol, Callable] = {}
+    _leave_table: dict[CFSymbol, Callable] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Gathers the methods marked with @visits and @leaves into the class's dispatch tables (a subclass extends its base's)
+
+        An inherited entry is looked up again by the method's name, so a subclass overriding a marked method (without marking it again)
+        has its own method called for the same symbols.
+        """
+        super().__init_subclass__(**kwargs)
+        cls._enter_table = _resolved(cls, cls._enter_table)
+        cls._leave_table = _resolved(cls, cls._leave_table)
+        for method in vars(cls).values():
+            for symbol in getattr(method, "_visits", ()):
+                cls._enter_table[symbol] = method
+            for symbol in getattr(method, "_leaves", ()):
+                cls._leave_table[symbol] = method
+
+    def visit(self, root: _Node) -> None:
+        """Walks a tree without recursing, calling the method marked for each node's symbol on entering and on leaving the node
+
+        The methods are found by symbol once per class (see visits and leaves) and bound once per walk, so nothing is looked up by name as
+        the tree is walked. Nodes whose symbol has no method are walked through. A method for entering a node may return False to skip the
+        node's children (its method for leaving is still called).
+
+        Args:
+            root (SyntaxNode | SyntaxTreeNode): the root of the tree to walk
+        """
+        enter = {symbol: method.__get__(self) for symbol, method in self._enter_table.items()}
+        leave = {symbol: method.__get__(self) for symbol, method in self._leave_table.items()}
+        # a node is pushed twice: once to enter it (True) and once, below its children, to leave it (False)
+        stack: list[tuple[Any, bool]] = [(root, True)]
+        while stack:
+            node, entering = stack.pop()
+            symbol = node.symbol
+            if not entering:
+                leave[symbol](node)
+                continue
+            if symbol in leave:
+                stack.append((node, False))
+            method = enter.get(symbol)
+            if method is not None and method(node) is False:
+                continue
+            children = node.children
+            if children:
+                stack.extend((child, True) for child in reversed(children))
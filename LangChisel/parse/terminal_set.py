@@ -0,0 +1,168 @@
+import weakref
+from typing import Iterable, Iterator
+
+from .grammar import *
+
+
+class TerminalColumns:
+    def __init__(self, symbols: Iterable[CFSymbol] = ()):
+        """The numbering of the symbols the TerminalSets of one grammar hold, bit i of a set standing for symbols[i]
+
+        A symbol is only given a column when one is asked for it (by column or bit, or by building a set of it), so the sets are only as
+        wide as the symbols put in them, however many symbols the process has interned. Comparing or combining sets never adds one.
+
+        Args:
+            symbols (Iterable[CFSymbol]): the symbols to number first, in order
+        """
+        self.symbols: list[CFSymbol] = []
+        self.column_of: dict[CFSymbol, int] = {}
+        for symbol in symbols:
+            self.column(symbol)
+
+    @classmethod
+    def of_grammar(cls, grammar: CFGrammar) -> "TerminalColumns":
+        """the columns shared by every set of a grammar: end of string is column 0 and the terminals follow in order of first appearance,
+        as in CompiledLL1Table, then epsilon"""
+        columns = _grammar_columns.get(grammar)
+        if columns is None:
+            symbols = [grammar.end_of_string]
+            symbols += [
+                symbol
+                for production in grammar.productions
+                for symbol in production.to_sequence
+                if is_terminal(symbol) and symbol != grammar.epsilon
+            ]
+            symbols.append(grammar.epsilon)
+            columns = _grammar_columns.setdefault(grammar, cls(symbols))
+        return columns
+
+    def column(self, symbol: CFSymbol) -> int:
+        """the column of a symbol, giving it the next one if it has none yet"""
+        column = self.column_of.get(symbol)
+        if column is None:
+            column = self.column_of[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return column
+
+    def bit(self, symbol: CFSymbol) -> int:
+        """the bit of a symbol, giving it the next column if it has none yet"""
+        return 1 << self.column(symbol)
+
+    def bits(self, symbols: "TerminalSet | Iterable[CFSymbol]") -> int:
+        """the given symbols (e.g. a list, or a TerminalSet with other columns) as a bitmask in these columns, leaving out any symbol
+        without a column"""
+        if isinstance(symbols, TerminalSet) and symbols.columns is self:
+            return symbols.bits
+        bits = 0
+        column_of = self.column_of
+        for symbol in symbols:
+            column = column_of.get(symbol)
+            if column is not None:
+                bits |= 1 << column
+        return bits
+
+    def covers(self, symbols: "TerminalSet | Iterable[CFSymbol]") -> bool:
+        """whether every one of the given symbols has a column"""
+        if isinstance(symbols, TerminalSet) and symbols.columns is self:
+            return True
+        return all(symbol in self.column_of for symbol in symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __repr__(self) -> str:
+        return f"(TerminalColumns: {self.symbols})"
+
+
+# grammar -> the columns of its sets, kept for as long as the grammar is
+_grammar_columns: "weakref.WeakKeyDictionary[CFGrammar, TerminalColumns]" = weakref.WeakKeyDictionary()
+
+
+class TerminalSet:
+    __slots__ = ("bits", "columns")
+
+    def __init__(self, symbols: Iterable[CFSymbol] = (), bits: int = 0, columns: TerminalColumns | None = None):
+        """A set of grammar symbols (terminals, epsilon and end of string) held as the bits of an int, bit i standing for columns.symbols[i]
+
+        The sets of a grammar share its columns (see TerminalColumns.of_grammar), so union, intersection, difference, subset tests and
+        membership between them are each a single int operation, rather than hashing every symbol in a set; a set with other columns is
+        realigned symbol by symbol first. Iterating gives the symbols in order of column.
+
+        Sets are immutable (like frozenset), as the sets of a grammar are shared by everything that analysed it.
+
+        Args:
+            symbols (Iterable[CFSymbol]): the symbols in the set
+            bits (int): the set as a bitmask in columns, combined with symbols
+            columns (TerminalColumns | None): the numbering of the set's symbols (a numbering of its own if None)
+        """
+        columns = columns if columns is not None else TerminalColumns()
+        for symbol in symbols:
+            bits |= 1 << columns.column(symbol)
+        object.__setattr__(self, "columns", columns)
+        object.__setattr__(self, "bits", bits)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("TerminalSet is immutable")
+
+    def __reduce__(self):
+        return (TerminalSet, ((), self.bits, self.columns))
+
+    @classmethod
+    def of(cls, symbols: "TerminalSet | Iterable[CFSymbol]", columns: TerminalColumns | None = None) -> "TerminalSet":
+        """the given set if it already is a TerminalSet (with the given columns), else a TerminalSet of the given symbols (e.g. a list)"""
+        if isinstance(symbols, TerminalSet) and (columns is None or symbols.columns is columns):
+            return symbols
+        return cls(symbols, columns=columns)
+
+    def __contains__(self, symbol: CFSymbol) -> bool:
+        column = self.columns.column_of.get(symbol)
+        return column is not None and self.bits >> column & 1 == 1
+
+    def __iter__(self) -> Iterator[CFSymbol]:
+        bits = self.bits
+        symbols = self.columns.symbols
+        while bits:
+            lowest = bits & -bits
+            yield symbols[lowest.bit_length() - 1]
+            bits ^= lowest
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __or__(self, other: "TerminalSet") -> "TerminalSet":
+        if not self.columns.covers(other):
+            # a union with symbols these columns do not number gets a numbering of its own, leaving these columns as they are
+            return TerminalSet([*self, *other])
+        return TerminalSet(bits=self.bits | self.columns.bits(other), columns=self.columns)
+
+    def __and__(self, other: "TerminalSet") -> "TerminalSet":
+        return TerminalSet(bits=self.bits & self.columns.bits(other), columns=self.columns)
+
+    def __sub__(self, other: "TerminalSet") -> "TerminalSet":
+        return TerminalSet(bits=self.bits & ~self.columns.bits(other), columns=self.columns)
+
+    def __le__(self, other: "TerminalSet") -> bool:
+        return self.bits & ~self.columns.bits(other) == 0
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, TerminalSet):
+            # a set holding a symbol without a column here cannot be equal
+            return len(self) == len(other) and self.bits == self.columns.bits(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        # equal sets may have different columns, so the hash is of the symbols rather than the bits
+        return hash(frozenset(self))
+
+    def without(self, symbol: CFSymbol) -> "TerminalSet":
+        """a copy of this set without the given symbol (e.g. First(A) without epsilon)"""
+        column = self.columns.column_of.get(symbol)
+        if column is None:
+            return self
+        return TerminalSet(bits=self.bits & ~(1 << column), columns=self.columns)
+
+    def __repr__(self) -> str:
+        return f"(TerminalSet: {list(self)})"
@@ -0,0 +1,254 @@
+"""Lexer benchmarks: throughput and scaling of lexing and token construction across input size and pattern count
+
+Run from the repository root, e.g.
+
+    python -m benchmarks.bench_lexer --max-size 10MB
+    python -m benchmarks.bench_lexer --save-baseline bench_baseline.json
+    python -m benchmarks.bench_lexer --baseline benchmarks/baseline.json
+
+Everything is generated locally from a fixed seed, nothing is downloaded. benchmarks/baseline.json holds the mean of six default runs
+(lexing should stay linear in the size of the input and flat in the number of patterns). Across those runs the fitted exponents varied
+with a standard deviation of about 0.05 and throughput by about 15%, so the default slack (0.2) and tolerance (0.5) sit near four standard
+deviations: noise passes, while a quadratic stage or a scan per pattern moves an exponent by far more than that.
+Throughput depends on the machine, so save a baseline of your own with --save-baseline before comparing against it elsewhere. With
+--baseline the run exits with a non-zero status if a benchmark's throughput or fitted scaling exponent regressed past the tolerance.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import random
+import re
+import string
+import sys
+import time
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from LangChisel.lex import *
+
+# the token set of the language in code/__main__.py
+BASE_PATTERNS: dict[re.Pattern, TokenTag] = {
+    re.compile(r"var"): TokenTag("var"),
+    re.compile(r";"): TokenTag("line_break"),
+    re.compile(r"\="): TokenTag("assign"),
+    re.compile(r"\("): TokenTag("l_brack"),
+    re.compile(r"\)"): TokenTag("r_brack"),
+    re.compile(r"print"): TokenTag("print"),
+    re.compile(r"\s+"): TokenTag("white_space"),
+    re.compile(r"\d+"): TokenTag("num"),
+    re.compile(r"\w+"): TokenTag("identifier"),
+}
+
+BASE_EXTRACTORS: dict[TokenTag, Callable[[str], any]] = {
+    TokenTag("num"): lambda string: int(string),
+    TokenTag("identifier"): lambda string: str(string),
+}
+
+SIZE_UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "B": 1}
+
+
+def parse_size(text: str) -> int:
+    """parses sizes such as 512, 4KB or 100MB into a number of characters"""
+    for unit, factor in SIZE_UNITS.items():
+        if text.upper().endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def keyword_patterns(count: int, seed: int = 0) -> dict[re.Pattern, TokenTag]:
+    """the base token set, preceded by count random keywords (so the keywords win ties against identifiers)"""
+    generator = random.Random(seed)
+    keywords: set[str] = set()
+    while len(keywords) < count:
+        keywords.add("".join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 10))))
+    patterns = {re.compile(re.escape(keyword)): TokenTag(f"kw_{keyword}") for keyword in sorted(keywords)}
+    patterns.update(BASE_PATTERNS)
+    return patterns
+
+
+def generate_source(size: int, keywords: list[str] = (), seed: int = 0) -> str:
+    """a synthetic program in the language of code/__main__.py of roughly size characters"""
+    generator = random.Random(seed)
+    identifiers = ["".join(generator.choices(string.ascii_lowercase + "_", k=generator.randint(1, 12))) for _ in range(200)]
+    identifiers += list(keywords)
+
+    # a block of unique statements is generated once and repeated, which keeps generating 100MB inputs cheap
+    statements = []
+    block_size = 0
+    while block_size < min(size, 1 << 16):
+        kind = generator.randrange(3)
+        name = generator.choice(identifiers)
+        if kind == 0:
+            statement = f"var {name};"
+        elif kind == 1:
+            value = generator.choice(identifiers) if generator.random() < 0.5 else str(generator.randrange(10**6))
+            statement = f"{name} = {value};"
+        else:
+            statement = f"print({name});"
+        statement += generator.choice(["\n", " ", "\n    "])
+        statements.append(statement)
+        block_size += len(statement)
+    block = "".join(statements)
+    return (block * (size // len(block) + 1))[:size]
+
+
+def time_call(function: Callable[[], any], repeat: int) -> tuple[float, any]:
+    """the best wall time of repeat calls, and the result of the last one
+
+    As with timeit, the garbage collector is paused while timing: its full collections walk every live object, and with millions of
+    tokens alive they made construct_tokens (which allocates one tracked Token per lexeme) fit an exponent of about 1.2 instead of 1.0.
+    """
+    best = math.inf
+    result = None
+    enabled = gc.isenabled()
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            if enabled:
+                gc.enable()
+    return best, result
+
+
+def fit_exponent(xs: list[float], ys: list[float]) -> float:
+    """the least-squares slope of log(y) against log(x), i.e. k in y ~ x^k"""
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return float("nan")
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return covariance / variance if variance else float("nan")
+
+
+def run_size_benchmarks(sizes: list[int], repeat: int) -> dict[str, dict]:
+    """times lexing and token construction of the base language at each size"""
+    lexer = CompiledLexer(BASE_PATTERNS)
+    lexer.find_lexemes(generate_source(1 << 12))  # warm the lazily built automaton
+
+    stages: dict[str, Callable[[str, list], Callable[[], any]]] = {
+        "find_lexemes": lambda source, lexemes: lambda: find_lexemes(source, BASE_PATTERNS),
+        "construct_tokens": lambda source, lexemes: lambda: construct_tokens(lexemes, BASE_EXTRACTORS),
+        "token_buffer": lambda source, lexemes: lambda: TokenBuffer.from_source(source, lexer, BASE_EXTRACTORS),
+    }
+    results = {name: {"sizes": [], "seconds": [], "tokens": []} for name in stages}
+    for size in sizes:
+        source = generate_source(size)
+        lexemes = lexer.find_lexemes(source)
+        for name, stage in stages.items():
+            seconds, _ = time_call(stage(source, lexemes), repeat if size <= 1 << 20 else 1)
+            results[name]["sizes"].append(size)
+            results[name]["seconds"].append(seconds)
+            results[name]["tokens"].append(len(lexemes))
+    return {name: summarise(result, "sizes") for name, result in results.items()}
+
+
+def run_pattern_benchmarks(pattern_counts: list[int], size: int, repeat: int) -> dict[str, dict]:
+    """times lexing the same amount of text with larger and larger pattern sets"""
+    result = {"pattern_counts": [], "seconds": [], "tokens": [], "sizes": []}
+    for count in pattern_counts:
+        patterns = keyword_patterns(count)
+        keywords = [pattern.pattern for pattern in list(patterns)[:count]]
+        source = generate_source(size, keywords)
+        lexer = CompiledLexer(patterns)
+        lexer.find_lexemes(source[: 1 << 12])
+        seconds, lexemes = time_call(lambda: lexer.find_lexemes(source), repeat)
+        result["pattern_counts"].append(len(patterns))
+        result["seconds"].append(seconds)
+        result["tokens"].append(len(lexemes))
+        result["sizes"].append(size)
+    return {"pattern_count_scaling": summarise(result, "pattern_counts")}
+
+
+def summarise(result: dict, scaled_by: str) -> dict:
+    total_seconds = sum(result["seconds"])
+    result["tokens_per_s"] = [tokens / seconds for tokens, seconds in zip(result["tokens"], result["seconds"])]
+    result["mb_per_s"] = [size / (1 << 20) / seconds for size, seconds in zip(result["sizes"], result["seconds"])]
+    result["exponent"] = fit_exponent(result[scaled_by], result["seconds"])
+    result["overall_mb_per_s"] = sum(result["sizes"]) / (1 << 20) / total_seconds
+    return result
+
+
+def compare_to_baseline(results: dict[str, dict], baseline: dict[str, dict], tolerance: float, exponent_slack: float) -> list[str]:
+    """the regressions of results against a baseline: throughput lower by more than tolerance, or a scaling exponent above baseline + slack"""
+    regressions = []
+    for name, expected in baseline.items():
+        if name not in results:
+            continue
+        observed = results[name]
+        if observed["overall_mb_per_s"] < expected["overall_mb_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {observed['overall_mb_per_s']:.2f} MB/s is below baseline {expected['overall_mb_per_s']:.2f} MB/s"
+            )
+        if observed["exponent"] > expected["exponent"] + exponent_slack:
+            regressions.append(f"{name}: scaling exponent {observed['exponent']:.2f} is above baseline {expected['exponent']:.2f}")
+    return regressions
+
+
+def format_report(results: dict[str, dict]) -> str:
+    lines = []
+    for name, result in results.items():
+        scaled_by = "pattern_counts" if "pattern_counts" in result else "sizes"
+        lines.append(f"{name} (time ~ {scaled_by[:-1]}^{result['exponent']:.2f})")
+        for scale, seconds, tokens_per_s, mb_per_s in zip(result[scaled_by], result["seconds"], result["tokens_per_s"], result["mb_per_s"]):
+            lines.append(f"  {scale:>12}  {seconds:10.4f}s  {tokens_per_s:14,.0f} tokens/s  {mb_per_s:8.2f} MB/s")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-size", default="1KB", help="the smallest generated source (default 1KB)")
+    parser.add_argument("--max-size", default="4MB", help="the largest generated source, up to 100MB or more (default 4MB)")
+    parser.add_argument("--pattern-counts", default="0,50,200,1000", help="numbers of extra keyword patterns to lex with")
+    parser.add_argument("--pattern-size", default="64KB", help="the size of the source used for the pattern count benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timings per measurement, the best is kept (1 above 1MB)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="fail if the results regress against this baseline file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="the allowed relative drop in throughput (default 0.5)")
+    parser.add_argument("--exponent-slack", type=float, default=0.2, help="the allowed rise in a scaling exponent (default 0.2)")
+    args = parser.parse_args(argv)
+
+    sizes = []
+    size = parse_size(args.min_size)
+    while size <= parse_size(args.max_size):
+        sizes.append(size)
+        size *= 4
+    pattern_counts = [int(count) for count in args.pattern_counts.split(",")]
+
+    results = run_size_benchmarks(sizes, args.repeat)
+    results.update(run_pattern_benchmarks(pattern_counts, parse_size(args.pattern_size), args.repeat))
+    print(format_report(results))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(
+                {name: {"overall_mb_per_s": result["overall_mb_per_s"], "exponent": result["exponent"]} for name, result in results.items()},
+                file,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_to_baseline(results, json.load(file), args.tolerance, args.exponent_slack)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,11 +33,12 @@ if __name__ == "__main__":
         TokenTag("identifier"): lambda string: str(string),
     }
 
-    lexemes = find_lexemes(source_code, regex_to_tokentype)
-    tokens = construct_tokens(lexemes, tokentype_to_data_extraction)
+    tokens = TokenBuffer.from_source(
+        source_code, regex_to_tokentype, tokentype_to_data_extraction
+    )
     # clear white space
-    tokens = [token for token in tokens if token.tag != TokenTag("white_space")]
-    print(tokens)
+    tokens = tokens.without_tags(TokenTag("white_space"))
+    print(tokens.to_tokens())
 
     # Grammar:
     # 1. S -> Statement S | epsilon
@@ -107,7 +108,7 @@ if __name__ == "__main__":
     print("\nTABLE")
     print(table)
 
-    derivation_sequence = get_LL1_derivation_seq(tokens.copy(), test_grammar, table)
+    derivation_sequence = get_LL1_derivation_seq(tokens, test_grammar, table)
     print("Derivations:")
     print(derivation_sequence)
 
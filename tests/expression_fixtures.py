@@ -0,0 +1,38 @@
+# tests/expression_fixtures.py
+# the expression lexer and grammar shared by the parser, parallel and instrumentation tests
+import re
+
+from LangChisel.lex import TokenTag
+from LangChisel.parse import CFGrammar, CFProduction, CFSymbol
+
+regex_to_tokentype = {
+    re.compile(r"\s+"): TokenTag("white_space"),
+    re.compile(r"\+"): TokenTag("+"),
+    re.compile(r"\*"): TokenTag("*"),
+    re.compile(r"\("): TokenTag("("),
+    re.compile(r"\)"): TokenTag(")"),
+    re.compile(r"\w+"): TokenTag("id"),
+}
+
+tokentype_to_data_extraction = {TokenTag("id"): lambda substr: str(substr)}
+
+# E -> T E'
+# E' -> + T E' | eps
+# T -> F T'
+# T' -> * F T' | eps
+# F -> ( E ) | id
+expression_grammar = CFGrammar(
+    [
+        CFProduction(CFSymbol("E"), [CFSymbol("T"), CFSymbol("E'")]),
+        CFProduction(CFSymbol("E'"), [CFSymbol(TokenTag("+")), CFSymbol("T"), CFSymbol("E'")]),
+        CFProduction(CFSymbol("E'"), [CFSymbol(None)]),
+        CFProduction(CFSymbol("T"), [CFSymbol("F"), CFSymbol("T'")]),
+        CFProduction(CFSymbol("T'"), [CFSymbol(TokenTag("*")), CFSymbol("F"), CFSymbol("T'")]),
+        CFProduction(CFSymbol("T'"), [CFSymbol(None)]),
+        CFProduction(CFSymbol("F"), [CFSymbol(TokenTag("(")), CFSymbol("E"), CFSymbol(TokenTag(")"))]),
+        CFProduction(CFSymbol("F"), [CFSymbol(TokenTag("id"))]),
+    ],
+    CFSymbol("E"),
+    CFSymbol(None),
+    CFSymbol("$"),
+)
@@ -0,0 +1,28 @@
+# tests/test_benchmarks.py
+import sys
+import os
+import pytest
+
+# Add the package root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.bench_lexer import *
+
+
+def test_fit_exponent():
+    sizes = [1, 2, 4, 8]
+    assert abs(fit_exponent(sizes, [size * 3 for size in sizes]) - 1) < 1e-9
+    assert abs(fit_exponent(sizes, [size**2 for size in sizes]) - 2) < 1e-9
+
+
+def test_benchmarks_flag_regressions():
+    results = run_size_benchmarks([1 << 10, 1 << 12], repeat=1)
+    results.update(run_pattern_benchmarks([0, 20], 1 << 12, repeat=1))
+    assert set(results) == {"find_lexemes", "construct_tokens", "token_buffer", "pattern_count_scaling"}
+    assert all(result["overall_mb_per_s"] > 0 for result in results.values())
+
+    baseline = {name: {"overall_mb_per_s": result["overall_mb_per_s"], "exponent": result["exponent"]} for name, result in results.items()}
+    assert compare_to_baseline(results, baseline, 0.3, 0.15) == []
+    baseline["find_lexemes"]["overall_mb_per_s"] *= 10
+    baseline["token_buffer"]["exponent"] -= 1
+    assert len(compare_to_baseline(results, baseline, 0.3, 0.15)) == 2
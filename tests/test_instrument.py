@@ -0,0 +1,106 @@
+# tests/test_instrument.py
+import sys
+import os
+import json
+import re
+import pytest
+
+# Add the package root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import LangChisel.lex as lex
+import LangChisel.parallel as parallel
+import LangChisel.parse as parse
+from LangChisel.lex import *
+from LangChisel.parse import *
+from LangChisel.instrument import *
+from tests.expression_fixtures import *
+
+
+def run_pipeline(source):
+    # called through the packages, as names imported into this module are not swapped
+    lexemes = [lexeme for lexeme in lex.find_lexemes(source, regex_to_tokentype) if lexeme[1] != TokenTag("white_space")]
+    tokens = lex.construct_tokens(lexemes, {})
+    first_sets = parse.extract_LL1_first_sets(expression_grammar)
+    follow_sets = parse.extract_LL1_follow_sets(expression_grammar, first_sets)
+    table = parse.build_LL1_table(expression_grammar, first_sets, follow_sets)
+    derivation = parse.get_LL1_derivation_seq(tokens, expression_grammar, table)
+    tree = parse.generate_syntax_tree_symbols(derivation, expression_grammar)
+    parse.tokenise_syntax_tree_terminals(tree, tokens, expression_grammar)
+    return derivation, tree
+
+
+def test_instrumentation(tmp_path):
+    source = "a * (b + (c * d)) + e"
+    original = find_lexemes
+    expected_derivation, expected_tree = run_pipeline(source)
+
+    with Instrumentation() as stats:
+        # only LangChisel's own modules are swapped
+        assert lex.find_lexemes is not original and find_lexemes is original
+        derivation, tree = run_pipeline(source)
+    assert lex.find_lexemes is original
+    assert derivation == expected_derivation and repr(tree) == repr(expected_tree)
+
+    assert set(stats.stages) == {
+        "find_lexemes",
+        "construct_tokens",
+        "extract_LL1_first_sets",
+        "extract_LL1_follow_sets",
+        "build_LL1_table",
+        "get_LL1_derivation_seq",
+        "generate_syntax_tree_symbols",
+        "tokenise_syntax_tree_terminals",
+    }
+    assert all(stage.calls == 1 for stage in stats.stages.values())
+    assert stats.stages["get_LL1_derivation_seq"].tokens == 13 and stats.stages["get_LL1_derivation_seq"].tokens_per_second > 0
+    # 21 lexemes, each scanned for once with every pattern
+    assert set(stats.attempts_by_pattern.values()) == {21}
+    assert stats.matches_by_pattern[re.compile(r"\w+")] == 5 and stats.matches_by_pattern[re.compile(r"\s+")] == 8
+    assert sum(stats.expansions.values()) == len(derivation)
+    assert stats.expansions[CFProduction(CFSymbol("F"), [CFSymbol(TokenTag("id"))])] == 5
+    # the symbols left of each enclosing bracket wait on the stack under the innermost one
+    assert stats.max_stack_depth == 11
+
+    # a compiled table gives the same counters, and nothing is recorded once disabled
+    instrumentation = Instrumentation()
+    instrumentation.enable()
+    with pytest.raises(RuntimeError):
+        Instrumentation().enable()
+    first_sets = extract_LL1_first_sets(expression_grammar)
+    follow_sets = extract_LL1_follow_sets(expression_grammar, first_sets)
+    table = CompiledLL1Table(expression_grammar, build_LL1_table(expression_grammar, first_sets, follow_sets))
+    tokens = TokenBuffer.from_source(source, regex_to_tokentype).without_tags(TokenTag("white_space"))
+    parse.get_LL1_derivation_seq(tokens, expression_grammar, table)
+    instrumentation.disable()
+    run_pipeline(source)
+    assert instrumentation.stats.expansions == stats.expansions and instrumentation.stats.max_stack_depth == 11
+
+    # arguments passed by keyword are counted as well
+    with Instrumentation() as keyword_stats:
+        tree = parse.parse_syntax_tree(tokens=tokens, grammar=expression_grammar, parse_table=table)
+        derivation = parse.get_LL1_derivation_seq(tokens=tokens, grammar=expression_grammar, parse_table=table)
+        tree = parse.generate_syntax_tree_symbols(derivation, expression_grammar)
+        parse.tokenise_syntax_tree_terminals(root_node=tree, tokens=tokens.to_tokens(), grammar=expression_grammar)
+    assert keyword_stats.stages["parse_syntax_tree"].tokens == 13
+    assert keyword_stats.stages["get_LL1_derivation_seq"].tokens == 13
+    assert keyword_stats.stages["tokenise_syntax_tree_terminals"].tokens == 13
+    # the single pass tree builder counts the same expansions as the derivation
+    assert sum(keyword_stats.expansions.values()) == 2 * len(derivation) and keyword_stats.max_stack_depth == 11
+
+    # patterns sharing a tag are counted apart, on every way of lexing
+    keyword = TokenTag("keyword")
+    keywords = {re.compile("if"): keyword, re.compile("else"): keyword, re.compile(r"\s+"): TokenTag("white_space")}
+    with Instrumentation() as lexing_stats:
+        TokenBuffer.from_source("if else if", keywords)
+        list(stream_tokens(["if el", "se"], keywords, {}))
+        parallel.lex_parallel("else if", keywords, r"\s")
+    assert lexing_stats.stages["TokenBuffer.from_source"].tokens == 5 and lexing_stats.stages["lex_parallel"].tokens == 3
+    assert lexing_stats.matches_by_pattern[re.compile("if")] == 4 and lexing_stats.matches_by_pattern[re.compile("else")] == 3
+    assert lexing_stats.attempts_by_pattern[re.compile("else")] >= 8
+
+    path = tmp_path / "trace.json"
+    stats.export_chrome_trace(path)
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [event["name"] for event in events][:2] == ["find_lexemes", "construct_tokens"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
@@ -2,6 +2,7 @@
 import sys
 import os
 import pytest
+from math import isqrt
 
 # Add the package root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -60,3 +61,207 @@ def test_construct_tokens():
     tokens = construct_tokens(lexemes, tokentype_to_data_extraction)
     assert tokens == expected_tokens, f"Expected {expected_tokens}, but got {tokens}"
 
+
+def test_compiled_lexer_matches_find_lexemes():
+    source_code = "my_num = 5"
+    lexer = CompiledLexer(regex_to_tokentype)
+    assert lexer.uses_dfa
+    assert lexer.find_lexemes(source_code) == find_lexemes(source_code, regex_to_tokentype)
+
+
+def test_compiled_lexer_longest_match_and_ties():
+    # the longest lexeme wins even when re would stop at an earlier alternative, and equal lengths go to the first pattern
+    lexer = CompiledLexer({
+        re.compile(r"a|ab"): TokenTag("A"),
+        re.compile(r"ab|abc"): TokenTag("B"),
+        re.compile(r"\w+"): TokenTag("WORD"),
+    })
+    assert lexer.find_lexemes("ab") == [("ab", TokenTag("A"))]
+    assert lexer.find_lexemes("abc") == [("abc", TokenTag("B"))]
+    assert lexer.find_lexemes("abcd") == [("abcd", TokenTag("WORD"))]
+
+
+def test_compiled_lexer_backtracking_fallback():
+    # word boundaries have no DFA equivalent, so the lexer keeps the original search
+    lexer = CompiledLexer({re.compile(r"\bab"): TokenTag("AB"), re.compile(r"\w"): TokenTag("CHAR")})
+    assert not lexer.uses_dfa
+    assert lexer.find_lexemes("ab") == [("ab", TokenTag("AB"))]
+
+
+def test_stream_tokens_matches_construct_tokens():
+    source_code = "my_num = 5\nother = my_num"
+    expected_tokens = construct_tokens(find_lexemes(source_code, regex_to_tokentype), tokentype_to_data_extraction)
+
+    chunks = [source_code[i:i + 3] for i in range(0, len(source_code), 3)]
+    tokens = list(stream_tokens(chunks, regex_to_tokentype, tokentype_to_data_extraction))
+    assert tokens == expected_tokens
+
+
+def test_stream_lexer_keeps_only_unfinished_tail():
+    stream_lexer = StreamLexer(regex_to_tokentype)
+    assert stream_lexer.feed("my_nu") == []
+    assert stream_lexer.feed("m = 5") == [("my_num", TokenTag("IDENTIFIER")), (" ", TokenTag("WHITE_SPACE")), ("=", TokenTag("ASSIGN")), (" ", TokenTag("WHITE_SPACE"))]
+    assert stream_lexer.offset == 9
+    assert stream_lexer.finish() == [("5", TokenTag("NUM"))]
+
+
+def test_stream_lexer_bounds_backtracking_fallback():
+    pattern_to_type = {re.compile(r"[a-z]+\b"): TokenTag("WORD"), re.compile(r"\s+"): TokenTag("WHITE_SPACE")}
+    source_code = "lorem ipsum dolor sit amet " * 40
+    stream_lexer = StreamLexer(pattern_to_type, lookahead=16)
+    assert not stream_lexer.lexer.uses_dfa
+
+    lexemes = []
+    for i in range(0, len(source_code), 7):
+        lexemes.extend(stream_lexer.feed(source_code[i:i + 7]))
+        assert len(stream_lexer._tail) < 16 + 7
+    assert lexemes  # emitted before the end of the input
+    lexemes.extend(stream_lexer.finish())
+    assert lexemes == find_lexemes(source_code, pattern_to_type)
+
+
+def test_lexeme_spans_over_mapped_file(tmp_path):
+    source_code = "my_num = 5"
+    path = tmp_path / "source.txt"
+    path.write_bytes(source_code.encode("utf-8"))
+
+    with map_source_file(str(path)) as buffer:
+        spans = find_lexeme_spans(buffer, regex_to_tokentype)
+        assert spans == find_lexeme_spans(source_code, regex_to_tokentype)
+        assert [source_text(buffer, start, end) for start, end, _ in spans] == [lexeme for lexeme, _ in find_lexemes(source_code, regex_to_tokentype)]
+
+        tokens = construct_tokens_from_spans(buffer, spans, tokentype_to_data_extraction)
+        assert tokens == construct_tokens(find_lexemes(source_code, regex_to_tokentype), tokentype_to_data_extraction)
+
+
+def test_lexeme_spans_use_byte_offsets_for_buffers():
+    lexer = CompiledLexer(regex_to_tokentype)
+    assert list(lexer.iter_lexeme_spans("é = 5".encode("utf-8"))) == [
+        (0, 2, TokenTag("IDENTIFIER")),
+        (2, 3, TokenTag("WHITE_SPACE")),
+        (3, 4, TokenTag("ASSIGN")),
+        (4, 5, TokenTag("WHITE_SPACE")),
+        (5, 6, TokenTag("NUM")),
+    ]
+
+
+def test_token_buffer_lazy_values_and_filter():
+    source_code = "my_num = 5"
+    calls = []
+    extractors = {
+        TokenTag("IDENTIFIER"): lambda substr: calls.append(substr) or str(substr),
+        TokenTag("NUM"): lambda substr: int(substr),
+    }
+    buffer = TokenBuffer.from_source(source_code, regex_to_tokentype, extractors)
+    assert len(buffer) == 5
+    assert calls == []
+
+    assert buffer[0] == Token(TokenTag("IDENTIFIER"), "my_num")
+    assert buffer[0] == Token(TokenTag("IDENTIFIER"), "my_num")
+    assert calls == ["my_num"]
+
+    filtered = buffer.without_tags(TokenTag("WHITE_SPACE"))
+    assert filtered.tag_list() == [TokenTag("IDENTIFIER"), TokenTag("ASSIGN"), TokenTag("NUM")]
+    assert filtered.to_tokens() == [
+        token for token in construct_tokens(find_lexemes(source_code, regex_to_tokentype), tokentype_to_data_extraction)
+        if token.tag != TokenTag("WHITE_SPACE")
+    ]
+
+
+def test_token_tags_are_interned():
+    import pickle
+
+    tag = TokenTag("IDENTIFIER")
+    assert tag is TokenTag("IDENTIFIER")
+    assert TokenTag.from_id(tag.id) is tag
+    assert pickle.loads(pickle.dumps(tag)) is tag
+    assert TokenTag("IDENTIFIER") != TokenTag("NUM")
+
+    buffer = TokenBuffer.from_source("x = 5", regex_to_tokentype)
+    assert list(buffer.tag_ids) == [tag.id for tag in buffer.tag_list()]
+
+
+def test_token_tags_are_interned_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    identifiers = [f"THREADED_{i}" for i in range(200)]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: [TokenTag(identifier) for identifier in identifiers], range(8)))
+    for tags in results:
+        assert all(tag is expected for tag, expected in zip(tags, results[0]))
+    assert all(TokenTag.from_id(tag.id) is tag for tag in results[0])
+
+
+def test_relex_matches_lexing_from_scratch():
+    source_code = "my_num = 5\nother = my_num\n"
+    tokens = TokenBuffer.from_source(source_code, regex_to_tokentype, tokentype_to_data_extraction)
+    edits = [TextEdit(6, 0, "ber"), TextEdit(0, 2, "your"), TextEdit(14, 1, "42 + x"), TextEdit(len(source_code) + 10, 0, "_2")]
+    for edit in edits:
+        source_code = edit.apply(source_code)
+        tokens = relex(tokens, edit, regex_to_tokentype)
+        expected = TokenBuffer.from_source(source_code, regex_to_tokentype, tokentype_to_data_extraction)
+        assert tokens.to_tokens() == expected.to_tokens()
+        assert list(tokens.starts) == list(expected.starts)
+        assert list(tokens.ends) == list(expected.ends)
+
+
+def test_relex_restarts_before_scans_reading_across_tokens():
+    # the scan for '"' reads to the end of the source looking for a closing quote, across every token after it
+    pattern_to_type = {re.compile(p): TokenTag(f"RELEX_{i}") for i, p in enumerate(['"[^"]*"', 'print', '[^a]', 'a|abcd'])}
+    source_code = '"da'
+    tokens = TokenBuffer.from_source(source_code, pattern_to_type)
+    assert [tokens.text(i) for i in range(len(tokens))] == ['"', 'd', 'a']
+
+    edit = TextEdit(3, 0, '")=')
+    tokens = relex(tokens, edit, pattern_to_type)
+    assert [tokens.text(i) for i in range(len(tokens))] == ['"da"', ')', '=']
+    assert tokens.to_tokens() == TokenBuffer.from_source(edit.apply(source_code), pattern_to_type).to_tokens()
+
+
+def test_relex_cost_follows_the_edit_not_the_source(monkeypatch):
+    import LangChisel.lex.token_buffer as token_buffer
+
+    source_code = "x = 5\n" * 5000
+    tokens = TokenBuffer.from_source(source_code, regex_to_tokentype)
+    # the first edit at the end records how far every scan read, after which no edit scans the tokens it does not touch
+    edit = TextEdit(len(source_code) - 2, 1, "7")
+    source_code = edit.apply(source_code)
+    relex(tokens, edit, regex_to_tokentype)
+
+    rewritten = []
+
+    def counted_shifted(offsets, low, high, delta):
+        rewritten.append(high - low)
+        return shifted(offsets, low, high, delta)
+
+    shifted = token_buffer._shifted
+    monkeypatch.setattr(token_buffer, "_shifted", counted_shifted)
+    scans = []
+    lexer = CompiledLexer(regex_to_tokentype)
+    monkeypatch.setattr(lexer, "_scan_extent", lambda *args: scans.append(args) or CompiledLexer._scan_extent(lexer, *args))
+
+    # edits jumping back and forth across the source, each moving every offset after it
+    edits = 400
+    for step in range(edits):
+        offset = source_code.index("5", (step * 7919) % (len(source_code) - 8))
+        edit = TextEdit(offset, 1, "57" if step % 2 else "5 6")
+        source_code = edit.apply(source_code)
+        relex(tokens, edit, lexer)
+    # at most one segment is merged per edit, the shortest, over the starts, ends and reaches
+    limit = isqrt(len(tokens))
+    assert len(tokens._shift_indexes) <= limit
+    assert sum(rewritten) <= edits * 3 * (len(tokens) // limit + 1)
+    assert len(scans) <= edits * 4
+    assert tokens.to_tokens() == TokenBuffer.from_source(source_code, regex_to_tokentype).to_tokens()
+
+
+def test_line_index_positions():
+    source_code = "my_num = 5\nother = my_num\n\nlast"
+    line_index = LineIndex(source_code)
+    assert line_index.position(0) == (1, 1)
+    assert line_index.position(9) == (1, 10)
+    assert line_index.position(source_code.index("other")) == (2, 1)
+    assert line_index.position(source_code.index("last")) == (4, 1)
+
+    tokens = construct_tokens(find_lexemes(source_code, regex_to_tokentype), tokentype_to_data_extraction)
+    assert [token.offset for token in tokens if token.tag == TokenTag("IDENTIFIER")] == [0, 11, 19, 27]
@@ -0,0 +1,211 @@
+# tests/test_parallel.py
+import asyncio
+import sys
+import os
+import re
+import pytest
+
+# Add the package root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from LangChisel.lex import *
+from LangChisel.parse import *
+from LangChisel.parallel import *
+from tests.expression_fixtures import *
+
+first_sets = extract_LL1_first_sets(expression_grammar)
+follow_sets = extract_LL1_follow_sets(expression_grammar, first_sets)
+expression_table = build_LL1_table(expression_grammar, first_sets, follow_sets)
+
+sources = ["a + b * c", "(a + b) * c", "x", "a * (b + (c * d)) + e"]
+
+
+def lex_and_parse(source):
+    tokens = TokenBuffer.from_source(source, regex_to_tokentype).without_tags(TokenTag("white_space"))
+    return get_LL1_derivation_seq(tokens, expression_grammar, expression_table)
+
+
+def test_lex_many(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_text(sources[-1])
+
+    buffers = lex_many(sources + [path], regex_to_tokentype, tokentype_to_data_extraction, max_workers=2)
+    for source, tokens in zip(sources + [sources[-1]], buffers):
+        expected = TokenBuffer.from_source(source, regex_to_tokentype, tokentype_to_data_extraction)
+        assert tokens.to_tokens() == expected.to_tokens()
+
+
+def test_lex_many_files_beyond_descriptor_limit(tmp_path):
+    import resource
+
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    file_count = 300
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(256, hard_limit), hard_limit))
+    try:
+        paths = []
+        for i in range(file_count):
+            path = tmp_path / f"source_{i}.txt"
+            path.write_text(sources[i % len(sources)])
+            paths.append(path)
+
+        buffers = lex_many(paths, regex_to_tokentype, tokentype_to_data_extraction, max_workers=2)
+
+        async def lex_all(pool):
+            return await asyncio.gather(*(pool.lex_async(path, tokentype_to_data_extraction) for path in paths))
+
+        with BatchPool(regex_to_tokentype, max_workers=2) as pool:
+            async_buffers = asyncio.run(lex_all(pool))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+    for i, tokens in enumerate(buffers + async_buffers):
+        with tokens:
+            expected = TokenBuffer.from_source(sources[i % len(sources)], regex_to_tokentype, tokentype_to_data_extraction)
+            assert tokens.to_tokens() == expected.to_tokens()
+
+
+def test_lex_many_reads_files_once(tmp_path, monkeypatch):
+    from LangChisel.parallel import batch
+
+    path = tmp_path / "source.txt"
+    path.write_text(sources[-1])
+    with BatchPool(regex_to_tokentype, max_workers=1) as pool:
+        pool.lex_many([sources[0]])
+
+        # the worker is running, so only the caller is kept from opening files
+        def no_open(*args, **kwargs):
+            raise AssertionError("the caller read a file the worker had read")
+
+        monkeypatch.setattr(batch, "open", no_open, raising=False)
+        (tokens,) = pool.lex_many([path], tokentype_to_data_extraction)
+    assert tokens.source == sources[-1].encode()
+    expected = TokenBuffer.from_source(sources[-1], regex_to_tokentype, tokentype_to_data_extraction)
+    assert tokens.to_tokens() == expected.to_tokens()
+
+
+def test_parse_many(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_text(sources[0])
+
+    derivations = parse_many(
+        sources + [path], regex_to_tokentype, expression_grammar, expression_table, [TokenTag("white_space")], max_workers=2
+    )
+    assert derivations == [lex_and_parse(source) for source in sources + [sources[0]]]
+
+
+def test_parse_many_reports_errors():
+    with pytest.raises(ParseError) as error:
+        parse_many(["a +\n+ b"], regex_to_tokentype, expression_grammar, expression_table, [TokenTag("white_space")], max_workers=1)
+    assert error.value.position == (2, 1)
+
+
+def test_lex_parallel_matches_sequential_lexing(tmp_path):
+    statement_lexer = {
+        re.compile(r'"[^"]*"'): TokenTag("string"),
+        re.compile(r";"): TokenTag("line_break"),
+        re.compile(r"\s+"): TokenTag("white_space"),
+        re.compile(r"\w+"): TokenTag("identifier"),
+    }
+    # the string literals contain the sync pattern, so some cuts land inside a lexeme
+    source = 'print "a;b"; x; y;\n' * 50 + 'last "unterminated; string'
+    expected = TokenBuffer.from_source(source, statement_lexer)
+
+    tokens = lex_parallel(source, statement_lexer, ";", chunk_size=16, max_workers=2)
+    assert list(tokens.tag_ids) == list(expected.tag_ids)
+    assert list(tokens.starts) == list(expected.starts)
+    assert list(tokens.ends) == list(expected.ends)
+
+    path = tmp_path / "source.txt"
+    path.write_text(source)
+    tokens = lex_parallel(path, statement_lexer, ";", chunk_size=64, max_workers=2)
+    assert tokens.tag_list() == expected.tag_list()
+    assert [tokens.text(i) for i in range(len(tokens))] == [expected.text(i) for i in range(len(expected))]
+
+
+
+def test_lex_parallel_fallback_lexer_lexes_sequentially(monkeypatch):
+    from LangChisel.parallel import split_lexer
+
+    fallback = CompiledLexer({re.compile(r"[a-z]+\b"): TokenTag("id"), re.compile(r"[;\s]+"): TokenTag("white_space")})
+    assert not fallback.uses_dfa
+    source = "lorem ipsum; dolor sit;\n" * 40
+    expected = TokenBuffer.from_source(source, fallback)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a pool was started for a lexer whose chunks cannot be trusted")
+
+    monkeypatch.setattr(split_lexer, "ProcessPoolExecutor", no_pool)
+    tokens = lex_parallel(source, fallback, ";", chunk_size=64, max_workers=2)
+    assert list(tokens.tag_ids) == list(expected.tag_ids)
+    assert list(tokens.starts) == list(expected.starts)
+    assert list(tokens.ends) == list(expected.ends)
+
+def test_async_parse():
+    def reader_of(source):
+        reader = asyncio.StreamReader()
+        reader.feed_data(source.encode())
+        reader.feed_eof()
+        return reader
+
+    async def tokens_of(source, chunk_size):
+        tokens = async_stream_tokens(reader_of(source), regex_to_tokentype, tokentype_to_data_extraction, chunk_size=chunk_size)
+        return [token async for token in tokens]
+
+    # reads that split a character or a lexeme give the same tokens
+    source = "été + (b * ça)"
+    expected = list(stream_tokens([source], regex_to_tokentype, tokentype_to_data_extraction))
+    assert asyncio.run(tokens_of(source, 1)) == expected
+    assert asyncio.run(tokens_of(source, 1 << 12)) == expected
+
+    # a lexer on the backtracking fallback lexes away from the loop's thread
+    import threading
+
+    fallback = CompiledLexer({re.compile(r"[a-z]+\b"): TokenTag("id"), re.compile(r"\s+"): TokenTag("white_space")})
+    assert not fallback.uses_dfa
+    scanning_threads = set()
+    scan = fallback._scan
+    fallback._scan = lambda *args: scanning_threads.add(threading.get_ident()) or scan(*args)
+
+    async def fallback_tokens_of(source):
+        return [token async for token in async_stream_tokens(reader_of(source), fallback, chunk_size=64)]
+
+    source = "lorem ipsum dolor sit amet " * 100
+    expected = list(stream_tokens([source], fallback, {}))
+    scanning_threads.clear()
+    assert asyncio.run(fallback_tokens_of(source)) == expected
+    assert scanning_threads and threading.get_ident() not in scanning_threads
+
+    skip = [TokenTag("white_space")]
+
+    async def parse(source, **options):
+        return await async_parse(reader_of(source), regex_to_tokentype, expression_grammar, expression_table, skip, **options)
+
+    for source in sources:
+        assert asyncio.run(parse(source)) == lex_and_parse(source)
+    with pytest.raises(ParseError):
+        asyncio.run(parse("a + + b"))
+
+    # a large source takes turns with the small ones, rather than holding them up until it is done
+    large = "a + " * 20000 + "a"
+    finished = []
+
+    async def serve(name, source, **options):
+        derivation = await parse(source, **options)
+        finished.append(name)
+        return derivation
+
+    async def serve_all(**options):
+        return await asyncio.gather(serve("large", large, **options), *(serve(source, source, **options) for source in sources))
+
+    derivations = asyncio.run(serve_all(chunk_size=256, yield_every=64))
+    assert derivations == [lex_and_parse(source) for source in [large] + sources]
+    assert finished[-1] == "large"
+
+    # or is offloaded to a shared pool of processes
+    with BatchPool(regex_to_tokentype, expression_grammar, expression_table, skip, max_workers=1) as pool:
+        finished.clear()
+        derivations = asyncio.run(serve_all(pool=pool, offload_size=1 << 10))
+        assert derivations == [lex_and_parse(source) for source in [large] + sources]
+        assert finished[-1] == "large"
+        tokens = asyncio.run(pool.lex_async(sources[0], tokentype_to_data_extraction))
+        expected = TokenBuffer.from_source(sources[0], regex_to_tokentype, tokentype_to_data_extraction).without_tags(*skip)
+        assert tokens.to_tokens() == expected.to_tokens()
@@ -7,6 +7,7 @@ import pytest
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from LangChisel.parse import *
+from tests.expression_fixtures import regex_to_tokentype
 
 
 # E -> T E'
@@ -283,6 +284,28 @@ expected_table_2 = {
 }
 
 
+# E -> E + T
+# E -> T
+# T -> T * F
+# T -> F
+# F -> ( E )
+# F -> id
+# (the same language as test_grammar_1, left-recursive as it stands, so not LL(1))
+test_grammar_3 = CFGrammar(
+    [
+        CFProduction(CFSymbol("E"), [CFSymbol("E"), CFSymbol(TokenTag("+")), CFSymbol("T")]),
+        CFProduction(CFSymbol("E"), [CFSymbol("T")]),
+        CFProduction(CFSymbol("T"), [CFSymbol("T"), CFSymbol(TokenTag("*")), CFSymbol("F")]),
+        CFProduction(CFSymbol("T"), [CFSymbol("F")]),
+        CFProduction(CFSymbol("F"), [CFSymbol(TokenTag("(")), CFSymbol("E"), CFSymbol(TokenTag(")"))]),
+        CFProduction(CFSymbol("F"), [CFSymbol(TokenTag("id"))]),
+    ],
+    CFSymbol("E"),
+    CFSymbol(None),
+    CFSymbol("$"),
+)
+
+
 def test_first_1():
     first_sets = extract_LL1_first_sets(test_grammar_1)
 
@@ -370,4 +393,435 @@ def test_table_2():
             )
 
 
-    
\ No newline at end of file
+    
+def test_parse_token_buffer_1():
+    buffer = TokenBuffer("")
+    for i, token in enumerate(test_token_seq_1):
+        buffer.append(i, i + 1, token.tag)
+    derivation_seq = get_LL1_derivation_seq(buffer, test_grammar_1, expected_table_1)
+    assert derivation_seq == expected_derivations_1
+
+
+def test_symbols_are_interned():
+    assert CFSymbol("E") is CFSymbol("E")
+    assert CFSymbol(TokenTag("id")) is CFSymbol(TokenTag("id"))
+    assert CFSymbol(TokenTag("id")) is not CFSymbol("id")
+    assert CFSymbol.from_id(CFSymbol("E").id) is CFSymbol("E")
+    assert is_terminal(CFSymbol(TokenTag("id"))) and not is_terminal(CFSymbol("id"))
+
+
+def test_parse_error_reports_position():
+    buffer = TokenBuffer.from_source("a + b\n  * + c", regex_to_tokentype).without_tags(TokenTag("white_space"))
+    with pytest.raises(ParseError) as error:
+        get_LL1_derivation_seq(buffer, test_grammar_1, expected_table_1)
+    assert error.value.token.tag == TokenTag("+")
+    assert error.value.position == (2, 5)
+    assert str(error.value).endswith("at line 2, column 5")
+
+
+def test_follow_mutually_recursive():
+    # S -> A x ; A -> B ; A -> a ; B -> A ; B -> eps
+    # A and B derive each other, which sends a recursive First/Follow computation round in circles
+    a, x = CFSymbol(TokenTag("a")), CFSymbol(TokenTag("x"))
+    grammar = CFGrammar(
+        [
+            CFProduction(CFSymbol("S"), [CFSymbol("A"), x]),
+            CFProduction(CFSymbol("A"), [CFSymbol("B")]),
+            CFProduction(CFSymbol("A"), [a]),
+            CFProduction(CFSymbol("B"), [CFSymbol("A")]),
+            CFProduction(CFSymbol("B"), [CFSymbol(None)]),
+        ],
+        CFSymbol("S"),
+        CFSymbol(None),
+        CFSymbol("$"),
+    )
+    analysis = GrammarAnalysis(grammar)
+    assert analysis.nullable == {CFSymbol(None), CFSymbol("A"), CFSymbol("B")}
+    first_sets = extract_LL1_first_sets(grammar)
+    assert set(first_sets[CFSymbol("B")]) == {a, CFSymbol(None)}
+    assert set(first_sets[CFSymbol("S")]) == {a, x}
+    follow_sets = extract_LL1_follow_sets(grammar, first_sets)
+    assert set(follow_sets[CFSymbol("A")]) == {x}
+    assert set(follow_sets[CFSymbol("B")]) == {x}
+    assert set(follow_sets[CFSymbol("S")]) == {CFSymbol("$")}
+
+
+def test_terminal_set():
+    plus, star, epsilon = CFSymbol(TokenTag("+")), CFSymbol(TokenTag("*")), CFSymbol(None)
+    first = TerminalSet([plus, epsilon])
+    assert epsilon in first and star not in first
+    assert first.without(epsilon) == TerminalSet([plus])
+    assert set(first | TerminalSet([star])) == {plus, star, epsilon}
+    assert (first - TerminalSet([plus])) == TerminalSet([epsilon])
+    assert TerminalSet([plus]) <= first and not first <= TerminalSet([plus])
+    assert len(first) == 2 and not TerminalSet()
+    assert isinstance(extract_LL1_first_sets(test_grammar_1)[CFSymbol("E")], TerminalSet)
+
+    # the sets of a grammar are numbered by its own terminals, however many other symbols exist
+    [CFSymbol(f"unused_{i}") for i in range(1000)]
+    columns = TerminalColumns.of_grammar(test_grammar_1)
+    first_sets = extract_LL1_first_sets(test_grammar_1)
+    assert all(first_set.columns is columns for first_set in first_sets.values())
+    assert columns.symbols[0] == test_grammar_1.end_of_string and len(columns) == 7
+    assert max(first_set.bits.bit_length() for first_set in first_sets.values()) <= len(columns)
+    assert first_sets[CFSymbol("E")] == TerminalSet(first_sets[CFSymbol("E")])
+
+    # comparing with (or combining with) symbols the grammar does not have leaves its columns alone
+    with_foreign = TerminalSet([*first_sets[CFSymbol("E")], CFSymbol(TokenTag("not_in_grammar"))])
+    assert first_sets[CFSymbol("E")] != with_foreign and not with_foreign <= first_sets[CFSymbol("E")]
+    assert first_sets[CFSymbol("E")] <= with_foreign and set(first_sets[CFSymbol("E")] | with_foreign) == set(with_foreign)
+    assert len(columns) == 7
+    # sets are immutable, so their hash never changes
+    with pytest.raises(AttributeError):
+        first.bits = 0
+    assert {first: 1}[TerminalSet([epsilon, plus])] == 1
+
+
+def test_compiled_table_matches_dict_table():
+    import pickle
+
+    table = pickle.loads(pickle.dumps(CompiledLL1Table(test_grammar_1, expected_table_1)))
+    assert get_LL1_derivation_seq(test_token_seq_1, test_grammar_1, table) == expected_derivations_1
+    assert [test_grammar_1.productions[index] for index in table.derive_indexes(test_token_seq_1)] == expected_derivations_1
+
+    for broken in (test_token_seq_1[:-1], test_token_seq_1[:3] + test_token_seq_1[4:]):
+        with pytest.raises(ParseError) as expected:
+            get_LL1_derivation_seq(broken, test_grammar_1, expected_table_1)
+        with pytest.raises(ParseError) as compiled:
+            get_LL1_derivation_seq(broken, test_grammar_1, table)
+        assert compiled.value.token is expected.value.token
+
+
+def test_grammar_cache(tmp_path):
+    built = load_grammar_tables(test_grammar_1, tmp_path)
+    (cache_file,) = tmp_path.iterdir()
+    assert cache_file.name == f"{grammar_fingerprint(test_grammar_1)}.lcgt"
+
+    loaded = read_grammar_tables(test_grammar_1, cache_file)
+    assert loaded is not None
+    assert loaded.first_sets == built.first_sets and loaded.follow_sets == built.follow_sets
+    assert loaded.parse_table == expected_table_1
+    assert get_LL1_derivation_seq(test_token_seq_1, test_grammar_1, loaded.compiled_table) == expected_derivations_1
+
+    # another grammar never reads this file, and a damaged file is rebuilt
+    assert read_grammar_tables(test_grammar_2, cache_file) is None
+    damaged = bytearray(cache_file.read_bytes())
+    damaged[len(damaged) // 2] ^= 1
+    cache_file.write_bytes(damaged)
+    assert read_grammar_tables(test_grammar_1, cache_file) is None
+    assert load_grammar_tables(test_grammar_1, tmp_path).parse_table == expected_table_1
+    assert read_grammar_tables(test_grammar_1, cache_file) is not None
+
+
+def test_generated_parser(tmp_path):
+    import importlib.util
+
+    path = tmp_path / "expression_parser.py"
+    write_LL1_parser(test_grammar_1, expected_table_1, path)
+    spec = importlib.util.spec_from_file_location("expression_parser", path)
+    parser = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(parser)
+
+    assert parser.FINGERPRINT == grammar_fingerprint(test_grammar_1)
+    assert parser.derive(test_token_seq_1, test_grammar_1) == expected_derivations_1
+    with pytest.raises(ParseError) as expected:
+        get_LL1_derivation_seq(test_token_seq_1[:-1], test_grammar_1, expected_table_1)
+    with pytest.raises(ParseError) as generated:
+        parser.derive(test_token_seq_1[:-1], test_grammar_1)
+    assert generated.value.token is expected.value.token
+
+
+def test_streaming_parser():
+    import io
+    from LangChisel.lex import stream_tokens
+
+    read = []
+
+    def tokens():
+        for token in test_token_seq_1:
+            read.append(token)
+            yield token
+
+    derivation = iter_LL1_derivation(tokens(), test_grammar_1, expected_table_1)
+    # E -> T E', T -> F T' and F -> id are chosen as soon as the first token is seen
+    assert [next(derivation) for _ in range(3)] == expected_derivations_1[:3]
+    assert len(read) == 1
+    assert expected_derivations_1[:3] + list(derivation) == expected_derivations_1
+
+    source = io.StringIO("(a+b*c)+" * 1000 + "d")
+    streamed = list(iter_LL1_derivation(stream_tokens(source, regex_to_tokentype, {}, chunk_size=64), test_grammar_1, expected_table_1))
+    buffer = TokenBuffer.from_source("(a+b*c)+" * 1000 + "d", regex_to_tokentype)
+    assert streamed == get_LL1_derivation_seq(buffer, test_grammar_1, expected_table_1)
+
+    parser = LL1StreamParser(test_grammar_1, expected_table_1)
+    parser.feed(test_token_seq_1[0])
+    with pytest.raises(ParseError) as error:
+        parser.feed(test_token_seq_1[0])
+    assert error.value.token is test_token_seq_1[0]
+
+
+def flatten_syntax_tree(node):
+    # (depth, symbol, token) of every node in pre-order
+    nodes, stack = [], [(node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        nodes.append((depth, node.symbol, node.token))
+        stack.extend((child, depth + 1) for child in reversed(node.children))
+    return nodes
+
+
+def test_parse_syntax_tree_matches_pipeline():
+    expected = generate_syntax_tree_symbols(expected_derivations_1, test_grammar_1)
+    tokenise_syntax_tree_terminals(expected, test_token_seq_1, test_grammar_1)
+    fused = parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1)
+    assert flatten_syntax_tree(fused) == flatten_syntax_tree(expected)
+    assert all(token is not None for _, symbol, token in flatten_syntax_tree(fused) if is_terminal(symbol))
+
+    with pytest.raises(ParseError):
+        parse_syntax_tree(test_token_seq_1[:-1], test_grammar_1, expected_table_1)
+
+
+def test_compact_syntax_tree():
+    expected = parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1)
+    tree = parse_compact_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1)
+    assert flatten_syntax_tree(tree.root) == flatten_syntax_tree(expected)
+    assert flatten_syntax_tree(tree.to_syntax_node()) == flatten_syntax_tree(expected)
+    assert [node.token for node in tree.iter_terminals()] == test_token_seq_1
+    assert tree.count(CFSymbol("T")) == sum(symbol == CFSymbol("T") for _, symbol, _ in flatten_syntax_tree(expected))
+    assert repr(tree) == repr(expected)
+
+    with pytest.raises(ParseError):
+        parse_compact_syntax_tree(test_token_seq_1[:-1], test_grammar_1, expected_table_1)
+
+    # leaves no longer share one children list
+    leaf, other = SyntaxNode(CFSymbol("T")), SyntaxNode(CFSymbol("T"))
+    leaf.children.append(other)
+    assert other.children == []
+
+
+def test_syntax_tree_traversal():
+    tree = parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1)
+    preorder = list(iter_preorder(tree))
+    assert preorder[0] is tree and len(preorder) == len(list(iter_postorder(tree)))
+    assert list(iter_postorder(tree))[-1] is tree
+    assert [node.token for node in iter_terminals(tree)] == test_token_seq_1
+    assert extract_terminal_children(tree) == list(iter_terminals(tree))
+
+    class Counter(Visitor):
+        def __init__(self):
+            self.entered, self.left = [], []
+
+        @visits(CFSymbol("T"), CFSymbol("F"))
+        def enter_term(self, node):
+            self.entered.append(node.symbol)
+
+        @leaves(CFSymbol("E"))
+        def leave_expression(self, node):
+            self.left.append(node)
+
+    counter = Counter()
+    counter.visit(tree)
+    assert counter.entered == [node.symbol for node in preorder if node.symbol in (CFSymbol("T"), CFSymbol("F"))]
+    assert counter.left == [node for node in iter_postorder(tree) if node.symbol == CFSymbol("E")]
+
+    class Pruned(Counter):
+        @visits(CFSymbol("T"))
+        def skip(self, node):
+            return False
+
+    pruned = Pruned()
+    pruned.visit(tree)
+    assert pruned.entered == [] and pruned.left == [tree]  # every other E is inside a T (F -> ( E ))
+    assert Counter._enter_table[CFSymbol("T")] is Counter.enter_term
+
+    # overriding a marked method by name, without marking it again, still dispatches to the override
+    class Overridden(Counter):
+        def enter_term(self, node):
+            self.entered.append(None)
+
+    overridden = Overridden()
+    overridden.visit(tree)
+    assert overridden.entered == [None] * len(counter.entered) and overridden.left == counter.left
+
+    # a right-recursive chain far deeper than the recursion limit
+    program, statement = CFSymbol("Program"), CFSymbol(TokenTag("statement"))
+    root = node = SyntaxNode(program)
+    for _ in range(50000):
+        node.children = [SyntaxNode(statement), SyntaxNode(program)]
+        node = node.children[1]
+    assert len(extract_terminal_children(root)) == 50000
+    assert sum(1 for _ in iter_postorder(root)) == 100001
+    # (each line of a repr is indented by its depth, so keep this one shallower)
+    root = node = SyntaxNode(program)
+    for _ in range(3000):
+        node.children = [SyntaxNode(program)]
+        node = node.children[0]
+    assert len(repr(root).splitlines()) == 3001
+
+
+def test_parse_with_recovery():
+    tree, errors = parse_with_recovery(test_token_seq_1, test_grammar_1, expected_table_1, expected_follow_1)
+    assert errors == [] and repr(tree) == repr(parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1))
+
+    tokens = [Token(TokenTag(tag), None) for tag in ["id", "+", "*", "id", "+", "(", "id", "id", ")", "+", "id"]]
+    tree, errors = parse_with_recovery(tokens, test_grammar_1, expected_table_1, expected_follow_1)
+    assert [error.token for error in errors] == [tokens[2], tokens[7]]
+    # the rest of the tokens are still parsed
+    assert [node.token for node in iter_terminals(tree) if node.token is not None] == tokens[:2] + tokens[3:7] + tokens[8:]
+
+    tree, errors = parse_with_recovery(tokens, test_grammar_1, expected_table_1, max_errors=1)
+    assert [error.token for error in errors] == [tokens[2]]
+
+    # a missing terminal at the end of the tokens
+    tokens = [Token(TokenTag(tag), None) for tag in ["(", "id", "+", "id"]]
+    tree, errors = parse_with_recovery(tokens, test_grammar_1, expected_table_1)
+    assert len(errors) == 1 and errors[0].token is None and errors[0].message == "Expected Token: )"
+
+
+def test_reparse_syntax_tree():
+    def shape(node):
+        return [(node.symbol, node.token, node.token_count) for node in iter_preorder(node)]
+
+    def tokens_of(tags):
+        return [Token(TokenTag(tag), None) for tag in tags]
+
+    old_tokens = tokens_of(["id", "+", "(", "id", "*", "id", ")", "+", "id"])
+    old_tree = parse_syntax_tree(old_tokens, test_grammar_1, expected_table_1)
+    assert count_syntax_tree_tokens(old_tree) == len(old_tokens)
+
+    # replace "id * id" in the brackets with "id + id + id"
+    new_tokens = old_tokens[:3] + tokens_of(["id", "+", "id", "+", "id"]) + old_tokens[6:]
+    new_tree = reparse_syntax_tree(old_tree, old_tokens, new_tokens, (3, 6), test_grammar_1, expected_table_1)
+    expected = parse_syntax_tree(new_tokens, test_grammar_1, expected_table_1)
+    count_syntax_tree_tokens(expected)
+    assert shape(new_tree) == shape(expected)
+    # the first term is reused as it was, and the old tree is left as it was
+    assert new_tree.children[0] is old_tree.children[0]
+    assert count_syntax_tree_tokens(old_tree) == len(old_tokens)
+
+    # an insertion, then a deletion, of the new tree
+    newer_tokens = new_tokens[:1] + tokens_of(["*", "id"]) + new_tokens[1:]
+    newer_tree = reparse_syntax_tree(new_tree, new_tokens, newer_tokens, (1, 1), test_grammar_1, expected_table_1)
+    assert shape(newer_tree) == shape(reparse_syntax_tree(old_tree, old_tokens, newer_tokens, (0, 9), test_grammar_1, expected_table_1))
+    assert shape(reparse_syntax_tree(newer_tree, newer_tokens, new_tokens, (1, 3), test_grammar_1, expected_table_1)) == shape(expected)
+
+    with pytest.raises(ParseError):
+        reparse_syntax_tree(old_tree, old_tokens, old_tokens[:3] + old_tokens[4:], (3, 4), test_grammar_1, expected_table_1)
+    with pytest.raises(ValueError):
+        reparse_syntax_tree(old_tree, old_tokens, new_tokens, (6, 3), test_grammar_1, expected_table_1)
+
+
+def test_lalr1_parser():
+    E, T, F = CFSymbol("E"), CFSymbol("T"), CFSymbol("F")
+    plus, name = CFSymbol(TokenTag("+")), CFSymbol(TokenTag("id"))
+    grammar = test_grammar_3
+    table = LALR1Table(grammar)
+    derivation = table.derive(test_token_seq_1)
+    assert derivation[-1] == CFProduction(E, [E, plus, T]) and derivation[0] == CFProduction(F, [name])
+    assert len(derivation) < len(expected_derivations_1)
+
+    def depth(root):
+        return max(depth for depth, _, _ in flatten_syntax_tree(root))
+
+    tree = parse_LALR1_syntax_tree(test_token_seq_1, grammar, table)
+    assert [node.token for node in iter_terminals(tree)] == test_token_seq_1
+    assert depth(tree) < depth(parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1))
+
+    # on an LL(1) grammar, the tree is the same as the LL(1) parser gives
+    ll_tree = parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1)
+    lr_tree = parse_LALR1_syntax_tree(test_token_seq_1, test_grammar_1, LALR1Table(test_grammar_1))
+    assert repr(lr_tree) == repr(ll_tree)
+
+    with pytest.raises(ParseError):
+        table.derive(test_token_seq_1[:-1])
+    with pytest.raises(ValueError):
+        LALR1Table(CFGrammar([CFProduction(E, [E, plus, E]), CFProduction(E, [name])], E, CFSymbol(None), CFSymbol("$")))
+    with pytest.raises(ValueError, match="B"):
+        LALR1Table(CFGrammar([CFProduction(E, [name, CFSymbol("B")])], E, CFSymbol(None), CFSymbol("$")))
+    with pytest.raises(ValueError, match="E"):
+        LALR1Table(CFGrammar([], E, CFSymbol(None), CFSymbol("$")))
+
+
+def test_grammar_transforms():
+    plus, times, left, name = (CFSymbol(TokenTag(tag)) for tag in ["+", "*", "(", "id"])
+    grammar = test_grammar_3
+    lr_tree = parse_LALR1_syntax_tree(test_token_seq_1, grammar, LALR1Table(grammar))
+
+    def LL1_tree(transform):
+        analysis = GrammarAnalysis(transform.grammar)
+        table = build_LL1_table(transform.grammar, analysis.first_sets, analysis.follow_sets)
+        return parse_syntax_tree(test_token_seq_1, transform.grammar, table)
+
+    # without left recursion the grammar is LL(1), and its trees restore to the left-deep trees of the original
+    assert LL1_conflicts(grammar)
+    transform = eliminate_left_recursion(grammar)
+    assert LL1_conflicts(transform.grammar) == []
+    assert repr(transform.restore(LL1_tree(transform))) == repr(lr_tree)
+    chain = transform_grammar(grammar)
+    assert repr(chain.restore(LL1_tree(chain))) == repr(lr_tree)
+
+    # left factoring removes the conflict of productions starting the same way
+    S, B = CFSymbol("S"), CFSymbol("B")
+    factorable = CFGrammar(
+        [CFProduction(S, [name, plus, B]), CFProduction(S, [name, plus, left]), CFProduction(S, [name]), CFProduction(B, [times])],
+        S,
+        CFSymbol(None),
+        CFSymbol("$"),
+    )
+    transform = left_factor(factorable)
+    assert LL1_conflicts(factorable) and LL1_conflicts(transform.grammar) == []
+    tokens = [Token(TokenTag(tag), None) for tag in ["id", "+", "*"]]
+    analysis = GrammarAnalysis(transform.grammar)
+    table = build_LL1_table(transform.grammar, analysis.first_sets, analysis.follow_sets)
+    restored = transform.restore(parse_syntax_tree(tokens, transform.grammar, table))
+    assert repr(restored) == repr(parse_LALR1_syntax_tree(tokens, factorable, LALR1Table(factorable)))
+
+    # collapsing S -> A takes a step off every derivation
+    transform = collapse_unit_productions(test_grammar_2)
+    first_sets = extract_LL1_first_sets(transform.grammar)
+    table = build_LL1_table(transform.grammar, first_sets, extract_LL1_follow_sets(transform.grammar, first_sets))
+    assert len(get_LL1_derivation_seq(test_token_seq_1, transform.grammar, table)) < len(
+        get_LL1_derivation_seq(test_token_seq_1, test_grammar_2, expected_table_2)
+    )
+    restored = transform.restore(parse_syntax_tree(test_token_seq_1, transform.grammar, table))
+    assert repr(restored) == repr(parse_syntax_tree(test_token_seq_1, test_grammar_2, expected_table_2))
+
+    # without productions to epsilon, an LR parse takes fewer steps, and restores the derivations of nothing
+    transform = inline_epsilon_productions(test_grammar_1)
+    table = LALR1Table(transform.grammar)
+    assert len(table.derive(test_token_seq_1)) < len(LALR1Table(test_grammar_1).derive(test_token_seq_1))
+    restored = transform.restore(parse_LALR1_syntax_tree(test_token_seq_1, transform.grammar, table))
+    assert repr(restored) == repr(parse_syntax_tree(test_token_seq_1, test_grammar_1, expected_table_1))
+
+    # left recursion through a nullable symbol is not eliminated
+    A = CFSymbol("A")
+    with pytest.raises(ValueError):
+        eliminate_left_recursion(
+            CFGrammar(
+                [CFProduction(S, [A, S, name]), CFProduction(S, [name]), CFProduction(A, [CFSymbol(None)]), CFProduction(A, [times])],
+                S,
+                CFSymbol(None),
+                CFSymbol("$"),
+            )
+        )
+
+
+def test_LL1_conflicts_agree_with_build_LL1_table():
+    P, S, A = CFSymbol("P"), CFSymbol("S"), CFSymbol("A")
+    a, b, epsilon = CFSymbol(TokenTag("a")), CFSymbol(TokenTag("b")), CFSymbol(None)
+
+    def agree(productions):
+        grammar = CFGrammar(productions, productions[0].from_symbol, epsilon, CFSymbol("$"))
+        conflicts = LL1_conflicts(grammar)
+        analysis = GrammarAnalysis(grammar)
+        if not conflicts:
+            build_LL1_table(grammar, analysis.first_sets, analysis.follow_sets)
+        else:
+            with pytest.raises(ValueError, match="Conflict in LL\\(1\\) table"):
+                build_LL1_table(grammar, analysis.first_sets, analysis.follow_sets)
+        return conflicts
+
+    # A is nullable but b is not, so S -> A b never takes Follow(S)
+    assert agree([CFProduction(P, [S, a]), CFProduction(S, [A, b]), CFProduction(A, [epsilon]), CFProduction(A, [a, b])]) == []
+    # A -> eps takes Follow(A) = {a}, which A -> a already holds
+    assert agree([CFProduction(S, [A, a]), CFProduction(A, [a]), CFProduction(A, [epsilon])]) == [(A, a)]